@@ -179,6 +179,7 @@ class configuration(object):
 
             ('inp_feat_dir', self.def_inp_dir, 'Paths', 'inp_feat'),
             ('out_feat_dir', self.def_out_dir, 'Paths', 'out_feat'),
+            ('packed_corpus_dir', 'None', 'Paths', 'packed_corpus'),
 
             ('model_dir', self.model_dir, 'Paths', 'models'),
             ('stats_dir', self.stats_dir, 'Paths', 'stats'),
@@ -236,6 +237,10 @@ class configuration(object):
             ('silence_pattern'    , ['*-#+*']                                             ,    'Labels', 'silence_pattern'),
             ('subphone_feats'     , 'full'                                                ,    'Labels', 'subphone_feats'),
             ('additional_features', {}                                                    ,    'Labels', 'additional_features'),
+            ('label_cache_size'   , 100000                                                ,    'Labels', 'label_cache_size'),
+            ('label_cache_dir'    , 'None'                                                ,    'Labels', 'label_cache_dir'),
+            ('label_cache_memory' , 64                                                    ,    'Labels', 'label_cache_memory'),
+            ('label_normalisation_workers', 1                                             ,    'Labels', 'label_normalisation_workers'),
 
             ('xpath_file_name',      os.path.join(self.work_dir, 'data/xml_labels/xpaths.txt'), 'Labels', 'xpath_file_name'),
 
@@ -253,6 +258,13 @@ class configuration(object):
             ('appended_input_dim'   ,  0                   ,  'Labels'       ,  'appended_input_dim'),
 
             ('buffer_size', 200000, 'Data', 'buffer_size'),
+            ('normalisation_workers', 1, 'Data', 'normalisation_workers'),
+            ('silence_removal_workers', 1, 'Data', 'silence_removal_workers'),
+            ('prefetch_partitions', 0, 'Data', 'prefetch_partitions'),
+            ('prefetch_memory_budget', 0, 'Data', 'prefetch_memory_budget'),
+            ('shuffle_seed', 271639, 'Data', 'shuffle_seed'),
+            ('shuffle_pool_size', 0, 'Data', 'shuffle_pool_size'),
+            ('use_packed_corpus', False, 'Data', 'use_packed_corpus'),
 
             ('train_file_number', impossible_int, 'Data','train_file_number'),
             ('valid_file_number', impossible_int, 'Data','valid_file_number'),
@@ -300,6 +312,15 @@ class configuration(object):
             ('merge_size'   ,   1, 'Architecture', 'merge_size'),
             ('seq_length'   , 200, 'Architecture', 'seq_length'),
             ('bucket_range' , 100, 'Architecture', 'bucket_range'),
+            ('batch_frames' ,   0, 'Architecture', 'batch_frames'),
+            ('training_workers', 1, 'Architecture', 'training_workers'),
+            ## minutes between training checkpoints (0 = none); --resume carries on from the last one
+            ('checkpoint_interval', 0, 'Architecture', 'checkpoint_interval'),
+            ('resume_training', False, 'Architecture', 'resume_training'),
+            ## 'pickle' saves the whole model object; 'npz' saves only the weights and architecture, which load faster
+            ('model_file_format', 'pickle', 'Architecture', 'model_file_format'),
+            ## 'theano' or 'numpy': how DNNGEN runs the trained network
+            ('inference_engine', 'theano', 'Architecture', 'inference_engine'),
 
             # Data
             ('shuffle_data', True, 'Data', 'shuffle_data'),
@@ -352,6 +373,7 @@ class configuration(object):
             ('delta_win'        , [-0.5, 0.0, 0.5]  , 'Outputs', 'delta_win'),
             ('acc_win'          , [1.0, -2.0, 1.0]  , 'Outputs', 'acc_win'),
             ('do_MLPG'          , True              , 'Outputs', 'do_MLPG'),
+            ('parameter_generation_workers', 1      , 'Outputs', 'parameter_generation_workers'),
 
 
             ## for GlottHMM
@@ -394,6 +416,10 @@ class configuration(object):
             ('use_cep_ap'       ,True                  ,'Waveform'  , 'use_cep_ap'),
             ('do_post_filtering',True                  ,'Waveform'  , 'do_post_filtering'),
             ('apply_GV'         ,False                 ,'Waveform'  , 'apply_GV'),
+            ## the streams enhanced by apply_GV, whose statistics GENGV computes
+            ('gv_streams'       ,['mgc']               ,'Waveform'  , 'gv_streams'),
+            ## number of utterances vocoded at once (0 = one per CPU)
+            ('wavgen_workers'   ,1                     ,'Waveform'  , 'wavgen_workers'),
             ('test_synth_dir'   ,'test_synthesis/wav'  ,'Waveform'  , 'test_synth_dir'),
 
             ('DurationModel'        , False, 'Processes', 'DurationModel'),
@@ -406,8 +432,10 @@ class configuration(object):
             ('MAKEDUR'         , False, 'Processes', 'MAKEDUR'),
             ('MAKECMP'         , False, 'Processes', 'MAKECMP'),
             ('NORMCMP'         , False, 'Processes', 'NORMCMP'),
+            ('PACKDATA'        , False, 'Processes', 'PACKDATA'),
             ('TRAINDNN'        , False, 'Processes', 'TRAINDNN'),
             ('DNNGEN'          , False, 'Processes', 'DNNGEN'),
+            ('GENGV'           , False, 'Processes', 'GENGV'),
             ('GENWAV'          , False, 'Processes', 'GENWAV'),
             ('CALMCD'          , False, 'Processes', 'CALMCD'),
             ('NORMSTEP'        , False, 'Processes', 'NORMSTEP'),
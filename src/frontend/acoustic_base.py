@@ -138,27 +138,39 @@ class   AcousticBase(object):
         ip_data = data
 
         frame_number = data.size
-        last_value = 0.0
-        for i in range(frame_number):
-            if data[i] <= 0.0:
-                j = i+1
-                for j in range(i+1, frame_number):
-                    if data[j] > 0.0:
-                        break
-                if j < frame_number-1:
-                    if last_value > 0.0:
-                        step = (data[j] - data[i-1]) / float(j - i + 1)
-                        for k in range(i, j):
-                            ip_data[k] = data[i-1] + step * (k - i + 1)
-                    else:
-                        for k in range(i, j):
-                            ip_data[k] = data[j]
-                else:
-                    for k in range(i, frame_number):
-                        ip_data[k] = last_value
-            else:
-                ip_data[i] = data[i]
-                last_value = data[i]
+        f0 = data[:, 0]
+
+        ## the voiced frames the gaps are filled from; a voiced last frame that ends a gap is not one of them:
+        ## that gap, like any gap reaching the end, is filled with the last voiced value before it
+        voiced = f0 > 0.0
+        if frame_number > 1 and voiced[-1] and not voiced[-2]:
+            voiced[-1] = False
+
+        voiced_index = numpy.nonzero(voiced)[0]
+        unvoiced_index = numpy.nonzero(~voiced)[0]
+
+        if voiced_index.size == 0:
+            ip_data[:, 0] = 0.0
+            return  ip_data, vuv_vector
+
+        ## for each unvoiced frame, the voiced frames on either side of its gap
+        next_position = numpy.searchsorted(voiced_index, unvoiced_index)
+        leading  = next_position == 0
+        trailing = next_position == voiced_index.size
+        inner    = ~(leading | trailing)
+
+        ip_values = numpy.empty(unvoiced_index.size, dtype=f0.dtype)
+        ip_values[leading]  = f0[voiced_index[0]]
+        ip_values[trailing] = f0[voiced_index[-1]]
+
+        ## linear interpolation, in the precision of the data and in the same order of operations as a frame loop
+        left_index  = voiced_index[next_position[inner] - 1]
+        right_index = voiced_index[next_position[inner]]
+        left_value  = f0[left_index]
+        step = (f0[right_index] - left_value) / (right_index - left_index).astype(f0.dtype)
+        ip_values[inner] = left_value + step * (unvoiced_index[inner] - left_index).astype(f0.dtype)
+
+        ip_data[unvoiced_index, 0] = ip_values
 
         return  ip_data, vuv_vector
 
@@ -168,28 +180,23 @@ class   AcousticBase(object):
 
         vector = numpy.reshape(vector, (frame_number, 1))
 
-        win_length = len(dynamic_win)
-        win_width = int(win_length/2)
-        temp_vector = numpy.zeros((frame_number + 2 * win_width, 1))
-        delta_vector = numpy.zeros((frame_number, 1))
+        return  self.compute_dynamic_matrix(vector, dynamic_win, frame_number, 1)
 
-        temp_vector[win_width:frame_number+win_width] = vector
-        for w in range(win_width):
-            temp_vector[w, 0] = vector[0, 0]
-            temp_vector[frame_number+win_width+w, 0] = vector[frame_number-1, 0]
+    ### compute dynamic features for a data matrix
+    def compute_dynamic_matrix(self, data_matrix, dynamic_win, frame_number, dimension):
 
-        for i in range(frame_number):
-            for w in range(win_length):
-                delta_vector[i] += temp_vector[i+w, 0] * dynamic_win[w]
+        win_length = len(dynamic_win)
+        win_width = int(win_length/2)
 
-        return  delta_vector
+        ### the edge frames are repeated win_width times at either end
+        temp_matrix = numpy.zeros((frame_number + 2 * win_width, dimension))
+        temp_matrix[win_width:frame_number+win_width] = data_matrix[:, 0:dimension]
+        temp_matrix[0:win_width] = temp_matrix[win_width]
+        temp_matrix[frame_number+win_width:] = temp_matrix[frame_number+win_width-1]
 
-    ### compute dynamic features for a data matrix
-    def compute_dynamic_matrix(self, data_matrix, dynamic_win, frame_number, dimension):
+        ### correlate the window along the time axis, all dimensions at once
         dynamic_matrix = numpy.zeros((frame_number, dimension))
-
-        ###compute dynamic feature dimension by dimension
-        for dim in range(dimension):
-            dynamic_matrix[:, dim:dim+1] = self.compute_dynamic_vector(data_matrix[:, dim], dynamic_win, frame_number)
+        for w in range(win_length):
+            dynamic_matrix += temp_matrix[w:w+frame_number] * dynamic_win[w]
 
         return  dynamic_matrix
@@ -40,9 +40,59 @@
 
 import numpy
 from io_funcs.binary_io import BinaryIOCollection
+from multiprocessing.pool import ThreadPool
 
 import logging
 
+
+def affine_normalise(features, shift, scale, offset, exclude_columns=None):
+    '''
+    compute (features - shift) * scale + offset in place, in float32, broadcasting the (1, dimension) vectors
+    (or scalars) over the frames; the columns in exclude_columns keep their original values
+    '''
+    if exclude_columns:
+        kept_columns = features[:, exclude_columns].copy()
+
+    features -= numpy.reshape(numpy.asarray(shift, dtype=numpy.float32), (1, -1))
+    features *= numpy.reshape(numpy.asarray(scale, dtype=numpy.float32), (1, -1))
+    features += numpy.reshape(numpy.asarray(offset, dtype=numpy.float32), (1, -1))
+
+    if exclude_columns:
+        features[:, exclude_columns] = kept_columns
+
+    return  features
+
+def affine_normalise_files(in_file_list, out_file_list, dimension, shift, scale, offset, exclude_columns=None, num_workers=1):
+    '''
+    apply affine_normalise to every file of in_file_list, writing out_file_list (which may be the same list);
+    the files are independent, so with more than one worker they are processed in a pool of threads
+    '''
+    logger = logging.getLogger('feature_normalisation')
+
+    try:
+        assert len(in_file_list) == len(out_file_list)
+    except  AssertionError:
+        logger.critical('The input and output file numbers are not the same! %d vs %d' %(len(in_file_list), len(out_file_list)))
+        raise
+
+    io_funcs = BinaryIOCollection()
+
+    def _normalise_file(i):
+        features, frame_number = io_funcs.load_binary_file_frame(in_file_list[i], dimension)
+        affine_normalise(features, shift, scale, offset, exclude_columns)
+        io_funcs.array_to_binary_file(features, out_file_list[i])
+
+    if num_workers <= 1:
+        for i in range(len(in_file_list)):
+            _normalise_file(i)
+    else:
+        pool = ThreadPool(num_workers)
+        try:
+            pool.map(_normalise_file, range(len(in_file_list)))
+        finally:
+            pool.close()
+            pool.join()
+
 class FeatureNormBase(object):
     '''
     to normalise feature into specific range
@@ -72,19 +122,7 @@ class FeatureNormBase(object):
         mean_vector = self.compute_mean(in_file_list, 0, feature_dimension)
         std_vector = self.compute_std(in_file_list, mean_vector, 0, feature_dimension)
 
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
-
-        for i in range(file_number):
-
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
-
-            mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
-
-            norm_features = (features - mean_matrix) / std_matrix
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, mean_vector, 1.0 / std_vector, 0.0)
 
         return  mean_vector, std_vector
 
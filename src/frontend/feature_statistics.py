@@ -0,0 +1,157 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+
+
+import numpy
+import logging
+from multiprocessing import Pool
+from io_funcs.binary_io import BinaryIOCollection
+
+
+class FeatureStatistics(object):
+    '''
+    accumulates the frame count, mean, sum of squared deviations, min and max of each feature dimension in a single
+    pass over the data; batches are combined with the pairwise update of Chan et al., which stays numerically stable
+    where summing the squares does not, and partial statistics of different shards of the data can be merged
+    '''
+    def __init__(self, feature_dimension):
+
+        self.feature_dimension = feature_dimension
+
+        self.frame_number = 0
+        self.mean = numpy.zeros(feature_dimension)
+        self.m2 = numpy.zeros(feature_dimension)
+        self.min = numpy.empty(feature_dimension)
+        self.min.fill(numpy.inf)
+        self.max = numpy.empty(feature_dimension)
+        self.max.fill(-numpy.inf)
+
+    def accumulate(self, features):
+
+        features = numpy.reshape(features, (-1, self.feature_dimension))
+        frame_number = features.shape[0]
+        if frame_number == 0:
+            return
+
+        features_64 = numpy.asarray(features, dtype=numpy.float64)
+        batch_mean = numpy.mean(features_64, axis=0)
+        batch_m2 = numpy.sum((features_64 - batch_mean) ** 2, axis=0)
+
+        self.merge_moments(frame_number, batch_mean, batch_m2)
+
+        self.min = numpy.minimum(self.min, numpy.amin(features, axis=0))
+        self.max = numpy.maximum(self.max, numpy.amax(features, axis=0))
+
+    def merge_moments(self, frame_number, mean, m2):
+
+        all_frame_number = self.frame_number + frame_number
+        if all_frame_number == 0:
+            return
+
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (frame_number / float(all_frame_number))
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.frame_number * float(frame_number) / all_frame_number)
+        self.frame_number = all_frame_number
+
+    def merge(self, other):
+
+        assert self.feature_dimension == other.feature_dimension
+
+        self.merge_moments(other.frame_number, other.mean, other.m2)
+        self.min = numpy.minimum(self.min, other.min)
+        self.max = numpy.maximum(self.max, other.max)
+
+    def accumulate_files(self, file_list):
+
+        io_funcs = BinaryIOCollection()
+        for file_name in file_list:
+            features = io_funcs.load_binary_file(file_name, self.feature_dimension)
+            self.accumulate(features)
+
+    def mean_vector(self):
+        return  numpy.reshape(self.mean, (1, self.feature_dimension))
+
+    def std_vector(self):
+        ## the population standard deviation, as the normalisers have always used
+        return  numpy.reshape((self.m2 / float(self.frame_number)) ** 0.5, (1, self.feature_dimension))
+
+    def min_vector(self):
+        return  numpy.reshape(self.min, (1, self.feature_dimension))
+
+    def max_vector(self):
+        return  numpy.reshape(self.max, (1, self.feature_dimension))
+
+
+def _accumulate_file_shard(shard):
+    (feature_dimension, file_list) = shard
+    statistics = FeatureStatistics(feature_dimension)
+    statistics.accumulate_files(file_list)
+    return  statistics
+
+def compute_feature_statistics(file_list, feature_dimension, num_workers=1, shards_per_worker=4):
+    '''
+    compute the statistics of all the files in file_list; with more than one worker, contiguous shards of the list
+    are accumulated in a pool of processes and merged in list order, so the result does not depend on scheduling
+    '''
+    logger = logging.getLogger('feature_normalisation')
+
+    if num_workers <= 1 or len(file_list) < 2:
+        statistics = FeatureStatistics(feature_dimension)
+        statistics.accumulate_files(file_list)
+    else:
+        shard_number = min(len(file_list), num_workers * shards_per_worker)
+        shard_size = (len(file_list) + shard_number - 1) // shard_number
+        shard_list = [(feature_dimension, file_list[start:start+shard_size]) for start in range(0, len(file_list), shard_size)]
+
+        pool = Pool(num_workers)
+        try:
+            shard_statistics = pool.map(_accumulate_file_shard, shard_list)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        statistics = FeatureStatistics(feature_dimension)
+        for partial_statistics in shard_statistics:
+            statistics.merge(partial_statistics)
+
+    logger.info('accumulated statistics of dimension %d over %d frames of %d files' % (feature_dimension, statistics.frame_number, len(file_list)))
+
+    return  statistics
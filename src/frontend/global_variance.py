@@ -0,0 +1,170 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+from io_funcs.binary_io import BinaryIOCollection
+import  logging
+import  os
+import  numpy
+
+## lf0 marks unvoiced frames with -1.0e+10
+UNVOICED_FLOOR = -1.0e+9
+
+def utterance_gv(features, voiced_only=False):
+    '''
+    the global variance of one utterance, taken as the standard deviation of each dimension over its frames
+    '''
+    if voiced_only:
+        features = features[features[:, 0] > UNVOICED_FLOOR]
+    if features.shape[0] == 0:
+        return  None
+
+    return  numpy.std(features, axis=0)
+
+
+def compute_gv_statistics(file_list, dimension, voiced_only=False):
+    '''
+    mean and standard deviation over utterances of the utterance GV, in one pass holding one utterance at a time
+    '''
+    logger = logging.getLogger('global_variance')
+
+    io_funcs = BinaryIOCollection()
+
+    gv_sum = numpy.zeros(dimension)
+    gv_square_sum = numpy.zeros(dimension)
+    utterance_number = 0
+    for file_name in file_list:
+        features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
+        gv = utterance_gv(numpy.asarray(features, dtype=numpy.float64), voiced_only)
+        if gv is None:
+            continue
+        gv_sum += gv
+        gv_square_sum += gv ** 2
+        utterance_number += 1
+
+    if utterance_number == 0:
+        logger.critical('no frames to compute the global variance from, in %d files' % len(file_list))
+        raise ValueError('no frames to compute the global variance from')
+
+    gv_mean = gv_sum / utterance_number
+    gv_std = numpy.sqrt(numpy.maximum(gv_square_sum / utterance_number - gv_mean ** 2, 0.0))
+
+    return  gv_mean, gv_std
+
+
+class   GlobalVariance(object):
+    '''
+    GV enhancement of generated features: the GV statistics (mean and standard deviation of the utterance GV)
+    of natural (reference) and generated features map the GV of each generated utterance towards the natural one.
+    For lf0, only voiced frames are used and changed.
+    '''
+
+    def __init__(self, ref_gv_mean, ref_gv_std, gen_gv_mean, gen_gv_std, voiced_only=False):
+
+        self.ref_gv_mean = numpy.ravel(ref_gv_mean).astype(numpy.float64)
+        self.ref_gv_std  = numpy.ravel(ref_gv_std).astype(numpy.float64)
+        self.gen_gv_mean = numpy.ravel(gen_gv_mean).astype(numpy.float64)
+        self.gen_gv_std  = numpy.ravel(gen_gv_std).astype(numpy.float64)
+        self.voiced_only = voiced_only
+
+    @staticmethod
+    def file_names(gv_dir, stream):
+        ## mgc keeps the names used before GV was available for other streams
+        prefix = '' if stream == 'mgc' else stream + '_'
+        return  [os.path.join(gv_dir, prefix + name) for name in ['ref_gv.mean', 'ref_gv.std', 'gen_gv.mean', 'gen_gv.std']]
+
+    @classmethod
+    def compute(cls, ref_file_list, gen_file_list, dimension, voiced_only=False):
+
+        logger = logging.getLogger('global_variance')
+        logger.info('computing GV statistics of %d reference and %d generated files' % (len(ref_file_list), len(gen_file_list)))
+
+        (ref_gv_mean, ref_gv_std) = compute_gv_statistics(ref_file_list, dimension, voiced_only)
+        (gen_gv_mean, gen_gv_std) = compute_gv_statistics(gen_file_list, dimension, voiced_only)
+
+        return  cls(ref_gv_mean, ref_gv_std, gen_gv_mean, gen_gv_std, voiced_only)
+
+    @classmethod
+    def load(cls, gv_dir, stream, dimension):
+
+        io_funcs = BinaryIOCollection()
+
+        stats = []
+        for file_name in cls.file_names(gv_dir, stream):
+            values, frame_number = io_funcs.load_binary_file_frame(file_name, 1)
+            if frame_number != dimension:
+                raise ValueError('%s has %d values, but the %s stream has %d dimensions' % (file_name, frame_number, stream, dimension))
+            stats.append(values)
+
+        return  cls(*stats, voiced_only=(stream == 'lf0'))
+
+    def save(self, gv_dir, stream):
+
+        io_funcs = BinaryIOCollection()
+
+        for file_name, values in zip(self.file_names(gv_dir, stream), [self.ref_gv_mean, self.ref_gv_std, self.gen_gv_mean, self.gen_gv_std]):
+            io_funcs.array_to_binary_file(values.reshape((-1, 1)), file_name)
+
+    def enhance(self, features):
+        '''
+        :param features: generated features of one utterance, of shape (frames, dimension)
+        :returns: the features with their GV mapped towards that of natural speech
+        '''
+        features = numpy.asarray(features, dtype=numpy.float64)
+
+        frame_index = slice(None)
+        if self.voiced_only:
+            frame_index = features[:, 0] > UNVOICED_FLOOR
+        frames = features[frame_index]
+        if frames.shape[0] == 0:
+            return  features
+
+        gen_mu  = numpy.mean(frames, axis=0)
+        gen_std = numpy.std(frames, axis=0)
+
+        local_gv = (self.ref_gv_std / self.gen_gv_std) * (gen_std - self.gen_gv_mean) + self.ref_gv_mean
+
+        ## constant dimensions are left as they are
+        scale = numpy.ones_like(gen_std)
+        numpy.divide(local_gv, gen_std, out=scale, where=gen_std > 0)
+
+        enhanced = features.copy()
+        enhanced[frame_index] = (frames - gen_mu) * scale + gen_mu
+
+        return  enhanced
@@ -1,9 +1,12 @@
 
 import os
 import numpy, re, sys
+import hashlib
+import multiprocessing
 from multiprocessing import Pool
 from io_funcs.binary_io import BinaryIOCollection
 from .linguistic_base import LinguisticBase
+from .question_matcher import QuestionSetMatcher, LabelVectorCache
 
 import matplotlib.mlab as mlab
 import math
@@ -11,6 +14,22 @@ import math
 import logging
 # from logplot.logging_plotting import LoggerPlotter #, MultipleTimeSeriesPlot, SingleWeightMatrixPlot
 
+## the label normaliser of a worker process, built once per worker by _init_normalisation_worker
+_worker_normaliser = None
+
+def _init_normalisation_worker(normaliser_class, normaliser_args):
+    global _worker_normaliser
+    _worker_normaliser = normaliser_class(**normaliser_args)
+
+def _normalise_file_chunk(chunk):
+    (method_name, job_list) = chunk
+    extract_features = getattr(_worker_normaliser, method_name)
+    for job in job_list:
+        extract_features(*job)
+    ## hand the newly seen contexts back, so that the parent can add them to the persistent label cache
+    return  len(job_list), _worker_normaliser.label_vector_cache.take_new_entries()
+
+
 class LabelNormalisation(LinguisticBase):
 
     # this class only knows how to deal with a single style of labels (XML or HTS)
@@ -64,21 +83,44 @@ class HTSLabelNormalisation(LabelNormalisation):
 
     # this subclass support HTS labels, which include time alignments
 
-    def __init__(self, question_file_name=None, add_frame_features=True, subphone_feats='full', continuous_flag=True):
+    def __init__(self, question_file_name=None, add_frame_features=True, subphone_feats='full', continuous_flag=True, label_cache_size=100000, label_cache_dir=None, num_workers=1, label_cache_memory=64):
 
         logger = logging.getLogger("labels")
 
+        ## the arguments needed to rebuild this normaliser in a worker process
+        self.normaliser_args = {'question_file_name': question_file_name, 'add_frame_features': add_frame_features,
+                                'subphone_feats': subphone_feats, 'continuous_flag': continuous_flag,
+                                'label_cache_size': label_cache_size, 'label_cache_dir': label_cache_dir,
+                                'label_cache_memory': label_cache_memory}
+
+        ## with more than one worker, files are normalised in a pool of processes instead of threads
+        if num_workers == 0:
+            num_workers = multiprocessing.cpu_count()
+        self.num_workers = num_workers
+
         self.question_dict = {}
         self.ori_question_dict = {}
         self.dict_size = 0
         self.continuous_flag = continuous_flag
         try:
 #            self.question_dict, self.ori_question_dict = self.load_question_set(question_file_name)
-            self.discrete_dict, self.continuous_dict = self.load_question_set_continous(question_file_name)
+            self.discrete_dict, self.continuous_dict, self.discrete_question_dict = self.load_question_set_continous(question_file_name)
         except:
             logger.critical('error whilst loading HTS question set')
             raise
 
+        ## the whole question set compiled into one matcher: this is what the label loaders use
+        ## (pattern_matching_binary and pattern_matching_continous_position are kept as the reference regex path)
+        self.question_matcher = QuestionSetMatcher(self.discrete_question_dict, self.continuous_dict, self.wildcards2regex)
+
+        ## label vectors of already seen contexts, shared by all the files normalised with this instance
+        ## (persisted in label_cache_dir, if given, under a name derived from the question file content)
+        question_set_key = None
+        if label_cache_dir:
+            question_set_key = self.compute_question_set_key(question_file_name)
+        self.label_vector_cache = LabelVectorCache(self.question_matcher, max_size=label_cache_size, cache_dir=label_cache_dir, question_set_key=question_set_key,
+                                                   max_memory=label_cache_memory)
+
         ###self.dict_size = len(self.question_dict)
 
         self.dict_size = len(self.discrete_dict) + len(self.continuous_dict)
@@ -113,6 +155,64 @@ class HTSLabelNormalisation(LabelNormalisation):
 
         logger.debug('HTS-derived input feature dimension is %d + %d = %d' % (self.dict_size, self.frame_feature_size, self.dimension) )
 
+    def compute_question_set_key(self, qs_file_name):
+        fid = open(qs_file_name, 'rb')
+        question_set_key = hashlib.md5(fid.read()).hexdigest()
+        fid.close()
+        return  question_set_key
+
+    def perform_normalisation(self, ori_file_list, output_file_list, label_type="state_align", dur_file_list=None):
+        if self.num_workers <= 1:
+            super(HTSLabelNormalisation, self).perform_normalisation(ori_file_list, output_file_list, label_type, dur_file_list)
+        else:
+            logger = logging.getLogger("perform_normalisation")
+            logger.info('perform linguistic feature extraction with %d processes' %(self.num_workers))
+            self.utterance_num = len(ori_file_list)
+            if self.utterance_num != len(output_file_list):
+                logger.error('the number of input and output linguistic files should be the same!\n')
+                sys.exit(1)
+
+            if not dur_file_list:
+                job_list = [(ori_file_list[i], output_file_list[i], label_type) for i in range(self.utterance_num)]
+            else:
+                job_list = [(ori_file_list[i], output_file_list[i], label_type, dur_file_list[i]) for i in range(self.utterance_num)]
+            self.run_in_process_pool('extract_linguistic_features', job_list, ori_file_list)
+
+        self.label_vector_cache.save()
+
+    def run_in_process_pool(self, method_name, job_list, file_list, chunks_per_worker=8):
+        '''
+        call method_name(*job) for every job in a pool of num_workers processes, each holding its own copy
+        of this normaliser; file_list gives the input file of each job, used to schedule the largest files first
+        '''
+        logger = logging.getLogger("labels")
+
+        job_number = len(job_list)
+        if job_number == 0:
+            return
+
+        ## the largest files are handed out first, so that long utterances do not straggle at the end
+        file_size_list = [os.path.getsize(file_name) for file_name in file_list]
+        job_order = sorted(range(job_number), key=lambda i: (-file_size_list[i], i))
+
+        chunk_size = max(1, job_number // (self.num_workers * chunks_per_worker))
+        chunk_list = [(method_name, [job_list[i] for i in job_order[start:start+chunk_size]]) for start in range(0, job_number, chunk_size)]
+
+        ## every job writes its own output file, so the results do not depend on the order chunks finish in
+        pool = Pool(self.num_workers, _init_normalisation_worker, (self.__class__, self.normaliser_args))
+        try:
+            done_number = 0
+            for (chunk_job_number, new_entries) in pool.imap_unordered(_normalise_file_chunk, chunk_list):
+                self.label_vector_cache.merge(new_entries)
+                done_number += chunk_job_number
+                logger.info('processed %d of %d files' %(done_number, job_number))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
     def prepare_dur_data(self, ori_file_list, output_file_list, label_type="state_align", feature_type=None, unit_size=None, feat_size=None):
         '''
         extracting duration binary features or numerical features.
@@ -144,8 +244,14 @@ class HTSLabelNormalisation(LabelNormalisation):
             logger.critical("Unknown feature type: %s \n Please use one of the following: binary, numerical\n" %(feature_type))
             sys.exit(1)
 
-        for i in range(utt_number):
-            self.extract_dur_features(ori_file_list[i], output_file_list[i], label_type, feature_type, unit_size, feat_size)
+        if self.num_workers <= 1:
+            for i in range(utt_number):
+                self.extract_dur_features(ori_file_list[i], output_file_list[i], label_type, feature_type, unit_size, feat_size)
+        else:
+            job_list = [(ori_file_list[i], output_file_list[i], label_type, feature_type, unit_size, feat_size) for i in range(utt_number)]
+            self.run_in_process_pool('extract_dur_features', job_list, ori_file_list)
+
+        self.label_vector_cache.save()
 
     def extract_dur_features(self, in_file_name, out_file_name=None, label_type="state_align", feature_type=None, unit_size=None, feat_size=None):
         logger = logging.getLogger("dur")
@@ -220,8 +326,8 @@ class HTSLabelNormalisation(LabelNormalisation):
                 word_duration+=phone_duration
 
                 ### for syllable and word positional information ###
-                label_binary_vector = self.pattern_matching_binary(full_label)
-                label_continuous_vector = self.pattern_matching_continous_position(full_label)
+                label_vector = self.label_vector_cache.get(full_label)
+                label_continuous_vector = label_vector[:, self.question_matcher.binary_size:]
 
                 ### syllable ending information ###
                 syl_end = 0        
@@ -384,10 +490,8 @@ class HTSLabelNormalisation(LabelNormalisation):
         else:
             assert self.dimension == self.dict_size
 
-        label_feature_matrix = numpy.empty((100000, self.dimension))
-
-        ph_count=0
-        label_feature_index = 0
+        ## first pass: parse the alignment, so that the label matrix can be allocated with its final size
+        phone_list = []
         with open(file_name) as fid:
             all_data = fid.readlines()
         for line in all_data:
@@ -407,38 +511,47 @@ class HTSLabelNormalisation(LabelNormalisation):
                 # to do - support different frame shift - currently hardwired to 5msec
                 # currently under beta testing: support different frame shift
                 if dur_file_name:
-                    frame_number = manual_dur_data[ph_count]
+                    frame_number = int(manual_dur_data[len(phone_list)])
                 else:
                     frame_number = int(end_time/50000) - int(start_time/50000)
 
-                if self.subphone_feats == "coarse_coding":
-                    cc_feat_matrix = self.extract_coarse_coding_features_relative(frame_number)
+            phone_list.append((frame_number, full_label))
+
+        ph_count = len(phone_list)
+
+        if self.add_frame_features:
+            matrix_size = sum([phone[0] for phone in phone_list])
+        elif self.subphone_feats == 'none':
+            matrix_size = ph_count
+        else:
+            matrix_size = 0
 
-            ph_count = ph_count+1
-            #label_binary_vector = self.pattern_matching(full_label)
-            label_binary_vector = self.pattern_matching_binary(full_label)
+        label_feature_matrix = numpy.empty((matrix_size, self.dimension))
 
-            # if there is no CQS question, the label_continuous_vector will become to empty
-            label_continuous_vector = self.pattern_matching_continous_position(full_label)
-            label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
+        label_feature_index = 0
+        for (frame_number, full_label) in phone_list:
+
+            # if there is no CQS question, only the binary answers are returned
+            label_vector = self.label_vector_cache.get(full_label)
 
             if self.add_frame_features:
-                current_block_binary_array = numpy.zeros((frame_number, self.dict_size+self.frame_feature_size))
-                for i in range(frame_number):
-                    current_block_binary_array[i, 0:self.dict_size] = label_vector
+                current_block_binary_array = label_feature_matrix[label_feature_index:label_feature_index+frame_number, ]
+                current_block_binary_array[:, 0:self.dict_size] = label_vector
+
+                if frame_number > 0:
+                    frame_index = numpy.arange(frame_number, dtype=numpy.float64)
 
                     if self.subphone_feats == 'minimal_phoneme':
                         ## features which distinguish frame position in phoneme
-                        current_block_binary_array[i, self.dict_size] = float(i+1)/float(frame_number) # fraction through phone forwards
-                        current_block_binary_array[i, self.dict_size+1] = float(frame_number - i)/float(frame_number) # fraction through phone backwards
-                        current_block_binary_array[i, self.dict_size+2] = float(frame_number) # phone duration
+                        current_block_binary_array[:, self.dict_size] = (frame_index + 1) / float(frame_number) # fraction through phone forwards
+                        current_block_binary_array[:, self.dict_size+1] = (frame_number - frame_index) / float(frame_number) # fraction through phone backwards
+                        current_block_binary_array[:, self.dict_size+2] = float(frame_number) # phone duration
 
                     elif self.subphone_feats == 'coarse_coding':
                         ## features which distinguish frame position in phoneme using three continous numerical features
-                        current_block_binary_array[i, self.dict_size+0] = cc_feat_matrix[i, 0]
-                        current_block_binary_array[i, self.dict_size+1] = cc_feat_matrix[i, 1]
-                        current_block_binary_array[i, self.dict_size+2] = cc_feat_matrix[i, 2]
-                        current_block_binary_array[i, self.dict_size+3] = float(frame_number)
+                        cc_feat_matrix = self.extract_coarse_coding_features_relative(frame_number)
+                        current_block_binary_array[:, self.dict_size:self.dict_size+3] = cc_feat_matrix
+                        current_block_binary_array[:, self.dict_size+3] = float(frame_number)
 
                     elif self.subphone_feats == 'none':
                         pass
@@ -446,15 +559,13 @@ class HTSLabelNormalisation(LabelNormalisation):
                     else:
                         sys.exit('unknown subphone_feats type')
 
-                label_feature_matrix[label_feature_index:label_feature_index+frame_number,] = current_block_binary_array
                 label_feature_index = label_feature_index + frame_number
 
             elif self.subphone_feats == 'none':
-                current_block_binary_array = label_vector
-                label_feature_matrix[label_feature_index:label_feature_index+1,] = current_block_binary_array
+                label_feature_matrix[label_feature_index:label_feature_index+1,] = label_vector
                 label_feature_index = label_feature_index + 1
 
-        label_feature_matrix = label_feature_matrix[0:label_feature_index,]
+        assert label_feature_index == matrix_size
 
         logger.info('loaded %s, %3d labels' % (file_name, ph_count) )
         logger.debug('made label matrix of %d frames x %d labels' % label_feature_matrix.shape )
@@ -473,23 +584,17 @@ class HTSLabelNormalisation(LabelNormalisation):
         else:
             assert self.dimension == self.dict_size
 
-        # label_feature_matrix = numpy.empty((100000, self.dict_size+self.frame_feature_size))
-        label_feature_matrix = numpy.empty((100000, self.dimension))
-
-        label_feature_index = 0
-
         state_number = 5
 
-        lab_binary_vector = numpy.zeros((1, self.dict_size))
         fid = open(file_name)
         utt_labels = fid.readlines()
         fid.close()
-        current_index = 0
         label_number = len(utt_labels)
         logger.info('loaded %s, %3d labels' % (file_name, label_number) )
 
-        phone_duration = 0
-        state_duration_base = 0
+        ## first pass: parse the alignment, so that the label matrix can be allocated with its final size
+        ## each state is (frame number, state index, duration, full label); states of labels without timing have index 0
+        state_list = []
         for line in utt_labels:
             line = line.strip()
 
@@ -498,118 +603,129 @@ class HTSLabelNormalisation(LabelNormalisation):
             temp_list = re.split('\s+', line)
 
             if len(temp_list)==1:
-                frame_number = 0
-                state_index = 1
-                full_label = temp_list[0]
+                state_list.append((0, 0, 0, temp_list[0]))
             else:
                 start_time = int(temp_list[0])
                 end_time = int(temp_list[1])
                 frame_number = int(end_time/50000) - int(start_time/50000)
+                state_duration = int((end_time - start_time)/50000)
                 full_label = temp_list[2]
-            
+
                 full_label_length = len(full_label) - 3  # remove state information [k]
-                state_index = full_label[full_label_length + 1]
+                state_index = int(full_label[full_label_length + 1]) - 1
+                state_list.append((frame_number, state_index, state_duration, full_label[0:full_label_length]))
+
+        if self.add_frame_features:
+            matrix_size = sum([state[0] for state in state_list])
+        elif self.subphone_feats == 'state_only':
+            matrix_size = state_number * len([state for state in state_list if state[1] in (0, state_number)])
+        elif self.subphone_feats == 'none':
+            matrix_size = len([state for state in state_list if state[1] in (0, state_number)])
+        else:
+            matrix_size = 0
 
-                state_index = int(state_index) - 1
-                state_index_backward = 6 - state_index
-                full_label = full_label[0:full_label_length]
+        label_feature_matrix = numpy.empty((matrix_size, self.dimension))
 
-            if state_index == 1:
+        label_feature_index = 0
+
+        phone_duration = 0
+        state_duration_base = 0
+        current_frame_number = 0
+        cc_feat_matrix = None
+        for (current_index, (frame_number, state_index, state_duration, full_label)) in enumerate(state_list):
+
+            if state_index <= 1:
                 current_frame_number = 0
                 phone_duration = frame_number
                 state_duration_base = 0
 
-#                label_binary_vector = self.pattern_matching(full_label)
-                label_binary_vector = self.pattern_matching_binary(full_label)
+                # if there is no CQS question, only the binary answers are returned
+                label_vector = self.label_vector_cache.get(full_label)
 
-                # if there is no CQS question, the label_continuous_vector will become to empty
-                label_continuous_vector = self.pattern_matching_continous_position(full_label)
-                label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
-
-                if len(temp_list)==1:
+                if state_index == 0:
                     state_index = state_number
                 else:
                     for i in range(state_number - 1):
-                        line = utt_labels[current_index + i + 1].strip()
-                        temp_list = re.split('\s+', line)
-                        phone_duration += int((int(temp_list[1]) - int(temp_list[0]))/50000)
+                        phone_duration += state_list[current_index + i + 1][2]
 
                     if self.subphone_feats == "coarse_coding":
                         cc_feat_matrix = self.extract_coarse_coding_features_relative(phone_duration)
 
             if self.add_frame_features:
-                current_block_binary_array = numpy.zeros((frame_number, self.dict_size+self.frame_feature_size))
-                for i in range(frame_number):
-                    current_block_binary_array[i, 0:self.dict_size] = label_vector
-
-                    if self.subphone_feats == 'full':
-                        ## Zhizheng's original 9 subphone features:
-                        current_block_binary_array[i, self.dict_size] = float(i+1) / float(frame_number)   ## fraction through state (forwards)
-                        current_block_binary_array[i, self.dict_size+1] = float(frame_number - i) / float(frame_number)  ## fraction through state (backwards)
-                        current_block_binary_array[i, self.dict_size+2] = float(frame_number)  ## length of state in frames
-                        current_block_binary_array[i, self.dict_size+3] = float(state_index)   ## state index (counting forwards)
-                        current_block_binary_array[i, self.dict_size+4] = float(state_index_backward) ## state index (counting backwards)
-
-                        current_block_binary_array[i, self.dict_size+5] = float(phone_duration)   ## length of phone in frames
-                        current_block_binary_array[i, self.dict_size+6] = float(frame_number) / float(phone_duration)   ## fraction of the phone made up by current state
-                        current_block_binary_array[i, self.dict_size+7] = float(phone_duration - i - state_duration_base) / float(phone_duration) ## fraction through phone (backwards)
-                        current_block_binary_array[i, self.dict_size+8] = float(state_duration_base + i + 1) / float(phone_duration)  ## fraction through phone (forwards)
-
-                    elif self.subphone_feats == 'state_only':
-                        ## features which only distinguish state:
-                        current_block_binary_array[i, self.dict_size] = float(state_index)   ## state index (counting forwards)
-
-                    elif self.subphone_feats == 'frame_only':
-                        ## features which distinguish frame position in phoneme:
-                        current_frame_number += 1
-                        current_block_binary_array[i, self.dict_size] = float(current_frame_number) / float(phone_duration)   ## fraction through phone (counting forwards)
-
-                    elif self.subphone_feats == 'uniform_state':
-                        ## features which distinguish frame position in phoneme:
-                        current_frame_number += 1
-                        current_block_binary_array[i, self.dict_size] = float(current_frame_number) / float(phone_duration)   ## fraction through phone (counting forwards)
-                        new_state_index = max(1, round(float(current_frame_number)/float(phone_duration)*5))
-                        current_block_binary_array[i, self.dict_size+1] = float(new_state_index)   ## state index (counting forwards)
-
-                    elif self.subphone_feats == "coarse_coding":
-                        ## features which distinguish frame position in phoneme using three continous numerical features
-                        current_block_binary_array[i, self.dict_size+0] = cc_feat_matrix[current_frame_number, 0]
-                        current_block_binary_array[i, self.dict_size+1] = cc_feat_matrix[current_frame_number, 1]
-                        current_block_binary_array[i, self.dict_size+2] = cc_feat_matrix[current_frame_number, 2]
-                        current_block_binary_array[i, self.dict_size+3] = float(phone_duration)
-                        current_frame_number += 1
-
-                    elif self.subphone_feats == 'minimal_frame':
-                        ## features which distinguish state and minimally frame position in state:
-                        current_block_binary_array[i, self.dict_size] = float(i+1) / float(frame_number)   ## fraction through state (forwards)
-                        current_block_binary_array[i, self.dict_size+1] = float(state_index)   ## state index (counting forwards)
-                    elif self.subphone_feats == 'none':
-                        pass
-                    else:
-                        sys.exit('unknown subphone_feats type')
-
-                label_feature_matrix[label_feature_index:label_feature_index+frame_number,] = current_block_binary_array
+                current_block_binary_array = label_feature_matrix[label_feature_index:label_feature_index+frame_number, ]
+                current_block_binary_array[:, 0:self.dict_size] = label_vector
+                if frame_number > 0:
+                    self.compute_state_frame_features(current_block_binary_array[:, self.dict_size:], state_index, state_number, \
+                                                      phone_duration, state_duration_base, current_frame_number, cc_feat_matrix)
                 label_feature_index = label_feature_index + frame_number
+                current_frame_number += frame_number
             elif self.subphone_feats == 'state_only' and state_index == state_number:
-                current_block_binary_array = numpy.zeros((state_number, self.dict_size+self.frame_feature_size))
-                for i in range(state_number):
-                    current_block_binary_array[i, 0:self.dict_size] = label_vector
-                    current_block_binary_array[i, self.dict_size] = float(i+1)   ## state index (counting forwards)
-                label_feature_matrix[label_feature_index:label_feature_index+state_number,] = current_block_binary_array
+                current_block_binary_array = label_feature_matrix[label_feature_index:label_feature_index+state_number, ]
+                current_block_binary_array[:, 0:self.dict_size] = label_vector
+                current_block_binary_array[:, self.dict_size] = numpy.arange(1, state_number+1)   ## state index (counting forwards)
                 label_feature_index = label_feature_index + state_number
             elif self.subphone_feats == 'none' and state_index == state_number:
-                current_block_binary_array = label_vector
-                label_feature_matrix[label_feature_index:label_feature_index+1,] = current_block_binary_array
+                label_feature_matrix[label_feature_index:label_feature_index+1,] = label_vector
                 label_feature_index = label_feature_index + 1
 
             state_duration_base += frame_number
 
-            current_index += 1
-
-        label_feature_matrix = label_feature_matrix[0:label_feature_index,]
+        assert label_feature_index == matrix_size
         logger.debug('made label matrix of %d frames x %d labels' % label_feature_matrix.shape )
         return  label_feature_matrix
 
+    def compute_state_frame_features(self, frame_feature_block, state_index, state_number, phone_duration, state_duration_base, current_frame_number, cc_feat_matrix=None):
+        '''
+        fill the (frame_number, frame_feature_size) block of subphone features of all the frames of one state
+        current_frame_number is the number of frames of the phone before this state
+        '''
+        frame_number = frame_feature_block.shape[0]
+        frame_index = numpy.arange(frame_number, dtype=numpy.float64)
+        state_index_backward = state_number + 1 - state_index
+
+        if self.subphone_feats == 'full':
+            ## Zhizheng's original 9 subphone features:
+            frame_feature_block[:, 0] = (frame_index + 1) / float(frame_number)   ## fraction through state (forwards)
+            frame_feature_block[:, 1] = (frame_number - frame_index) / float(frame_number)  ## fraction through state (backwards)
+            frame_feature_block[:, 2] = float(frame_number)  ## length of state in frames
+            frame_feature_block[:, 3] = float(state_index)   ## state index (counting forwards)
+            frame_feature_block[:, 4] = float(state_index_backward) ## state index (counting backwards)
+
+            frame_feature_block[:, 5] = float(phone_duration)   ## length of phone in frames
+            frame_feature_block[:, 6] = float(frame_number) / float(phone_duration)   ## fraction of the phone made up by current state
+            frame_feature_block[:, 7] = (phone_duration - frame_index - state_duration_base) / float(phone_duration) ## fraction through phone (backwards)
+            frame_feature_block[:, 8] = (state_duration_base + frame_index + 1) / float(phone_duration)  ## fraction through phone (forwards)
+
+        elif self.subphone_feats == 'state_only':
+            ## features which only distinguish state:
+            frame_feature_block[:, 0] = float(state_index)   ## state index (counting forwards)
+
+        elif self.subphone_feats == 'frame_only':
+            ## features which distinguish frame position in phoneme:
+            frame_feature_block[:, 0] = (current_frame_number + frame_index + 1) / float(phone_duration)   ## fraction through phone (counting forwards)
+
+        elif self.subphone_feats == 'uniform_state':
+            ## features which distinguish frame position in phoneme:
+            frame_feature_block[:, 0] = (current_frame_number + frame_index + 1) / float(phone_duration)   ## fraction through phone (counting forwards)
+            new_state_index = numpy.maximum(1, numpy.round((current_frame_number + frame_index + 1) / float(phone_duration) * 5))
+            frame_feature_block[:, 1] = new_state_index   ## state index (counting forwards)
+
+        elif self.subphone_feats == "coarse_coding":
+            ## features which distinguish frame position in phoneme using three continous numerical features
+            frame_feature_block[:, 0:3] = cc_feat_matrix[current_frame_number:current_frame_number+frame_number, 0:3]
+            frame_feature_block[:, 3] = float(phone_duration)
+
+        elif self.subphone_feats == 'minimal_frame':
+            ## features which distinguish state and minimally frame position in state:
+            frame_feature_block[:, 0] = (frame_index + 1) / float(frame_number)   ## fraction through state (forwards)
+            frame_feature_block[:, 1] = float(state_index)   ## state index (counting forwards)
+
+        elif self.subphone_feats == 'none':
+            pass
+
+        else:
+            sys.exit('unknown subphone_feats type')
+
     def extract_durational_features(self, dur_file_name=None, dur_data=None):
 
         if dur_file_name:
@@ -683,14 +799,15 @@ class HTSLabelNormalisation(LabelNormalisation):
 
     def extract_coarse_coding_features_relative(self, phone_duration):
         dur = int(phone_duration)
+        if dur <= 0:
+            return numpy.zeros((0, 3))
 
-        cc_feat_matrix = numpy.zeros((dur, 3))
+        rel_indx = ((200/float(dur)) * numpy.arange(dur)).astype(int)
 
-        for i in range(dur):
-            rel_indx = int((200/float(dur))*i)
-            cc_feat_matrix[i,0] = self.cc_features[0, 300+rel_indx]
-            cc_feat_matrix[i,1] = self.cc_features[1, 200+rel_indx]
-            cc_feat_matrix[i,2] = self.cc_features[2, 100+rel_indx]
+        cc_feat_matrix = numpy.zeros((dur, 3))
+        cc_feat_matrix[:,0] = self.cc_features[0, 300+rel_indx]
+        cc_feat_matrix[:,1] = self.cc_features[1, 200+rel_indx]
+        cc_feat_matrix[:,2] = self.cc_features[2, 100+rel_indx]
 
         return cc_feat_matrix
 
@@ -841,6 +958,7 @@ class HTSLabelNormalisation(LabelNormalisation):
         continuous_qs_index = 0
         binary_dict = {}
         continuous_dict = {}
+        binary_question_dict = {}
         LL=re.compile(re.escape('LL-'))
         LAST_QUESTION = re.compile(re.escape('(\d+)') + '$') # regex for last question
 
@@ -874,13 +992,14 @@ class HTSLabelNormalisation(LabelNormalisation):
                         re_list.append(re.compile(processed_question))
 
                     binary_dict[str(binary_qs_index)] = re_list
+                    binary_question_dict[str(binary_qs_index)] = (question_key, question_list)
                     binary_qs_index = binary_qs_index + 1
                 else:
                     logger.critical('The question set is not defined correctly: %s' %(line))
                     raise Exception
 
 #                question_index = question_index + 1
-        return  binary_dict, continuous_dict
+        return  binary_dict, continuous_dict, binary_question_dict
 
 
     def wildcards2regex(self, question, convert_number_pattern=False):
@@ -923,9 +1042,14 @@ class HTSDurationLabelNormalisation(HTSLabelNormalisation):
     One line of labels is converted into 1 datapoint, that is, the label is not 'unpacked'
     into frames. HTK state index [\d] is not handled in any special way.
     """
-    def __init__(self, question_file_name=None, subphone_feats='full', continuous_flag=True):
+    def __init__(self, question_file_name=None, subphone_feats='full', continuous_flag=True, label_cache_size=100000, label_cache_dir=None, num_workers=1, label_cache_memory=64):
         super(HTSDurationLabelNormalisation, self).__init__(question_file_name=question_file_name, \
-                                    subphone_feats=subphone_feats, continuous_flag=continuous_flag)
+                                    subphone_feats=subphone_feats, continuous_flag=continuous_flag, \
+                                    label_cache_size=label_cache_size, label_cache_dir=label_cache_dir, \
+                                    num_workers=num_workers, label_cache_memory=label_cache_memory)
+        self.normaliser_args = {'question_file_name': question_file_name, 'subphone_feats': subphone_feats,
+                                'continuous_flag': continuous_flag, 'label_cache_size': label_cache_size,
+                                'label_cache_dir': label_cache_dir, 'label_cache_memory': label_cache_memory}
         ## don't use extra features beyond those in questions for duration labels:
         self.dimension = self.dict_size
 
@@ -937,36 +1061,26 @@ class HTSDurationLabelNormalisation(HTSLabelNormalisation):
 
         assert self.dimension == self.dict_size
 
-        label_feature_matrix = numpy.empty((100000, self.dimension))
-
-        label_feature_index = 0
-
-
-        lab_binary_vector = numpy.zeros((1, self.dict_size))
         fid = open(file_name)
         utt_labels = fid.readlines()
         fid.close()
-        current_index = 0
         label_number = len(utt_labels)
         logger.info('loaded %s, %3d labels' % (file_name, label_number) )
 
         ## remove empty lines
         utt_labels = [line for line in utt_labels if line != '']
 
+        label_feature_matrix = numpy.empty((len(utt_labels), self.dimension))
+
         for (line_number, line) in enumerate(utt_labels):
             temp_list = re.split('\s+', line.strip())
             full_label = temp_list[-1]  ## take last entry -- ignore timings if present
 
-            label_binary_vector = self.pattern_matching_binary(full_label)
-
-            # if there is no CQS question, the label_continuous_vector will become to empty
-            label_continuous_vector = self.pattern_matching_continous_position(full_label)
-            label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
+            # if there is no CQS question, only the binary answers are returned
+            label_vector = self.label_vector_cache.get(full_label)
 
             label_feature_matrix[line_number, :] = label_vector[:]
 
-
-        label_feature_matrix = label_feature_matrix[:line_number+1,:]
         logger.debug('made label matrix of %d frames x %d labels' % label_feature_matrix.shape )
         return  label_feature_matrix
 
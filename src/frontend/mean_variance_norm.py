@@ -42,7 +42,8 @@ from io_funcs.binary_io import BinaryIOCollection
 import  logging
 import  numpy
 
-from .feature_normalisation_base import FeatureNormBase
+from .feature_normalisation_base import FeatureNormBase, affine_normalise_files
+from .feature_statistics import compute_feature_statistics
 
 class   MeanVarianceNorm(FeatureNormBase):
     '''
@@ -56,7 +57,7 @@ class   MeanVarianceNorm(FeatureNormBase):
         self.std_vector  = None
         self.feature_dimension = feature_dimension
 
-    def feature_normalisation(self, in_file_list, out_file_list):
+    def feature_normalisation(self, in_file_list, out_file_list, num_workers=1):
         logger = logging.getLogger('feature_normalisation')
 
 #        self.feature_dimension = feature_dimension
@@ -66,28 +67,20 @@ class   MeanVarianceNorm(FeatureNormBase):
             logger.critical('The input and output file numbers are not the same! %d vs %d' %(len(in_file_list), len(out_file_list)))
             raise
 
+        if self.mean_vector is None and self.std_vector is None:
+            self.compute_mean_std(in_file_list, 0, self.feature_dimension)
         if self.mean_vector is None:
             self.mean_vector = self.compute_mean(in_file_list, 0, self.feature_dimension)
         if self.std_vector  is None:
             self.std_vector = self.compute_std(in_file_list, self.mean_vector, 0, self.feature_dimension)
 
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
-        for i in range(file_number):
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
-
-            mean_matrix = numpy.tile(self.mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(self.std_vector, (current_frame_number, 1))
-
-            norm_features = (features - mean_matrix) / std_matrix
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, self.mean_vector, 1.0 / self.std_vector, 0.0, num_workers=num_workers)
 
         return  self.mean_vector, self.std_vector
 
-    def feature_denormalisation(self, in_file_list, out_file_list, mean_vector, std_vector):
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
+    def feature_denormalisation(self, in_file_list, out_file_list, mean_vector, std_vector, num_workers=1):
+        logger = logging.getLogger('feature_normalisation')
+
         try:
             assert len(in_file_list) == len(out_file_list)
         except  AssertionError:
@@ -100,15 +93,7 @@ class   MeanVarianceNorm(FeatureNormBase):
             logger.critical('the dimensionalities of the mean and standard derivation vectors are not the same as the dimensionality of the feature')
             raise
 
-        for i in range(file_number):
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
-
-            mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
-
-            norm_features = features * std_matrix + mean_matrix
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, 0.0, std_vector, mean_vector, num_workers=num_workers)
 
     def load_mean_std_values(self, acoustic_norm_file):
 
@@ -123,6 +108,25 @@ class   MeanVarianceNorm(FeatureNormBase):
         logger.info('Loaded mean std values from the trained data for feature dimension of %d' % self.feature_dimension)
         return self.mean_vector, self.std_vector
 
+    def compute_mean_std(self, file_list, start_index, end_index, statistics=None, num_workers=1):
+        '''
+        compute the mean and std vectors in a single pass over file_list, or take them from
+        statistics already accumulated over it (a FeatureStatistics of the full feature dimension)
+        '''
+        logger = logging.getLogger('feature_normalisation')
+
+        if statistics is None:
+            statistics = compute_feature_statistics(file_list, self.feature_dimension, num_workers)
+
+        self.mean_vector = statistics.mean_vector()[:, start_index:end_index]
+        self.std_vector  = statistics.std_vector()[:, start_index:end_index]
+
+        logger.info('computed mean and std vectors of length %d' % self.mean_vector.shape[1] )
+        logger.info(' mean: %s' % self.mean_vector)
+        logger.info('  std: %s' % self.std_vector)
+
+        return  self.mean_vector, self.std_vector
+
     def compute_mean(self, file_list, start_index, end_index):
 
         logger = logging.getLogger('feature_normalisation')
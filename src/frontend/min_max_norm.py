@@ -42,6 +42,9 @@ import numpy
 from io_funcs.binary_io import BinaryIOCollection
 import logging
 
+from .feature_statistics import compute_feature_statistics
+from .feature_normalisation_base import affine_normalise_files
+
 class MinMaxNormalisation(object):
     def __init__(self, feature_dimension, min_value = 0.01, max_value = 0.99, min_vector = 0.0, max_vector = 0.0, exclude_columns=[]):
 
@@ -86,27 +89,18 @@ class MinMaxNormalisation(object):
 
         logger.info('Loaded min max values from the trained data for feature dimension of %d' % self.feature_dimension)
 
-    def find_min_max_values(self, in_file_list):
-
+    def find_min_max_values(self, in_file_list, statistics=None, num_workers=1):
+        '''
+        find the min and max vectors over in_file_list, or take them from statistics already accumulated over it
+        '''
         logger = logging.getLogger("acoustic_norm")
 
         file_number = len(in_file_list)
-        min_value_matrix = numpy.zeros((file_number, self.feature_dimension))
-        max_value_matrix = numpy.zeros((file_number, self.feature_dimension))
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
-
-            temp_min = numpy.amin(features, axis = 0)
-            temp_max = numpy.amax(features, axis = 0)
+        if statistics is None:
+            statistics = compute_feature_statistics(in_file_list, self.feature_dimension, num_workers)
 
-            min_value_matrix[i, ] = temp_min;
-            max_value_matrix[i, ] = temp_max;
-
-        self.min_vector = numpy.amin(min_value_matrix, axis = 0)
-        self.max_vector = numpy.amax(max_value_matrix, axis = 0)
-        self.min_vector = numpy.reshape(self.min_vector, (1, self.feature_dimension))
-        self.max_vector = numpy.reshape(self.max_vector, (1, self.feature_dimension))
+        self.min_vector = statistics.min_vector()
+        self.max_vector = statistics.max_vector()
 
         # po=numpy.get_printoptions()
         # numpy.set_printoptions(precision=2, threshold=20, linewidth=1000, edgeitems=4)
@@ -116,12 +110,14 @@ class MinMaxNormalisation(object):
         # restore the print options
         # numpy.set_printoptions(po)
 
-    def normalise_data(self, in_file_list, out_file_list):
-        file_number = len(in_file_list)
-
+    def compute_scaling_vectors(self):
+        '''
+        return the (1, feature_dimension) ranges of the features and of the target values; a dimension
+        with no range maps its min to the target min value
+        '''
         fea_max_min_diff = self.max_vector - self.min_vector
         diff_value = self.target_max_value - self.target_min_value
-        fea_max_min_diff = numpy.reshape(fea_max_min_diff, (1, self.feature_dimension))
+        fea_max_min_diff = numpy.array(numpy.reshape(fea_max_min_diff, (1, self.feature_dimension)), dtype=numpy.float64)
 
         target_max_min_diff = numpy.zeros((1, self.feature_dimension))
         target_max_min_diff.fill(diff_value)
@@ -129,81 +125,34 @@ class MinMaxNormalisation(object):
         target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
         fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
 
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
+        return  fea_max_min_diff, target_max_min_diff
 
-            frame_number = features.size // self.feature_dimension
-            fea_min_matrix = numpy.tile(self.min_vector, (frame_number, 1))
-            target_min_matrix = numpy.tile(self.target_min_value, (frame_number, self.feature_dimension))
+    def normalise_data(self, in_file_list, out_file_list, num_workers=1):
 
-            fea_diff_matrix = numpy.tile(fea_max_min_diff, (frame_number, 1))
-            diff_norm_matrix = numpy.tile(target_max_min_diff, (frame_number, 1)) / fea_diff_matrix
+        fea_max_min_diff, target_max_min_diff = self.compute_scaling_vectors()
 
-            norm_features = diff_norm_matrix * (features - fea_min_matrix) + target_min_matrix
+        ## the columns in exclude_columns keep their original values
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, self.min_vector, target_max_min_diff / fea_max_min_diff,
+                               self.target_min_value, exclude_columns=list(self.exclude_columns), num_workers=num_workers)
 
-            ## If we are to keep some columns unnormalised, use advanced indexing to
-            ## reinstate original values:
-            m,n = numpy.shape(features)
-            for col in self.exclude_columns:
-                norm_features[list(range(m)),[col]*m] = features[list(range(m)),[col]*m]
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
-
-#            norm_features = numpy.array(norm_features, 'float32')
-#            fid = open(out_file_list[i], 'wb')
-#            norm_features.tofile(fid)
-#            fid.close()
-
-    def denormalise_data(self, in_file_list, out_file_list):
+    def denormalise_data(self, in_file_list, out_file_list, num_workers=1):
 
         logger = logging.getLogger("acoustic_norm")
 
         file_number = len(in_file_list)
         logger.info('MinMaxNormalisation.denormalise_data for %d files' % file_number)
 
-        # print   self.max_vector, self.min_vector
-        fea_max_min_diff = self.max_vector - self.min_vector
-        diff_value = self.target_max_value - self.target_min_value
-        # logger.debug('reshaping fea_max_min_diff from shape %s to (1,%d)' % (fea_max_min_diff.shape, self.feature_dimension) )
-
-        fea_max_min_diff = numpy.reshape(fea_max_min_diff, (1, self.feature_dimension))
-
-        target_max_min_diff = numpy.zeros((1, self.feature_dimension))
-        target_max_min_diff.fill(diff_value)
-
-        target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-        fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
-
-            frame_number = features.size // self.feature_dimension
-            fea_min_matrix = numpy.tile(self.min_vector, (frame_number, 1))
-            target_min_matrix = numpy.tile(self.target_min_value, (frame_number, self.feature_dimension))
+        fea_max_min_diff, target_max_min_diff = self.compute_scaling_vectors()
 
-            fea_diff_matrix = numpy.tile(fea_max_min_diff, (frame_number, 1))
-            diff_norm_matrix = fea_diff_matrix / numpy.tile(target_max_min_diff, (frame_number, 1))
-            norm_features = diff_norm_matrix * (features - target_min_matrix) + fea_min_matrix
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
-
-    def normal_standardization(self, in_file_list, out_file_list):
-        mean_vector = self.compute_mean(in_file_list)
-        std_vector = self.compute_std(in_file_list, mean_vector)
-
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
-            current_frame_number = features.size // self.feature_dimension
-
-            mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, self.target_min_value, fea_max_min_diff / target_max_min_diff,
+                               self.min_vector, num_workers=num_workers)
 
-            norm_features = (features - mean_matrix) / std_matrix
+    def normal_standardization(self, in_file_list, out_file_list, num_workers=1):
+        statistics = compute_feature_statistics(in_file_list, self.feature_dimension)
+        mean_vector = statistics.mean_vector()
+        std_vector = statistics.std_vector()
 
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        affine_normalise_files(in_file_list, out_file_list, self.feature_dimension, mean_vector, 1.0 / std_vector, 0.0, num_workers=num_workers)
 
     def compute_mean(self, file_list):
 
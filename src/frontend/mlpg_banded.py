@@ -0,0 +1,129 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+
+
+## MLPG as a banded linear system: W'DW is symmetric positive definite with a bandwidth of twice the
+## window half-length, so it can be solved by a banded Cholesky factorisation in O(T) time and memory
+import numpy
+import logging
+from scipy.linalg import solveh_banded
+
+
+class MLParameterGenerationBanded(object):
+    def __init__(self, delta_win = [-0.5, 0.0, 0.5], acc_win = [1.0, -2.0, 1.0]):
+        self.delta_win = delta_win
+        self.acc_win   = acc_win
+        ###assume the delta and acc windows have the same length
+        self.win_length = int(len(delta_win)/2)
+
+        ## variance given to the dynamic features of the first and last frames, where the windows are truncated
+        self.boundary_var = 100000000000.0
+
+    def build_banded_system(self, b_frames, tau_frames, windows):
+        '''
+        b_frames and tau_frames hold mean*precision and precision, of shape (number of windows, frames, dimensions);
+        return W'DW in upper banded form, of shape (bandwidth+1, dimensions, frames), and W'DU, of shape (dimensions, frames)
+        '''
+        (num_windows, frame_number, static_dimension) = b_frames.shape
+        bandwidth = 2 * self.win_length
+
+        prec = numpy.zeros((bandwidth+1, static_dimension, frame_number))
+        b    = numpy.zeros((static_dimension, frame_number))
+
+        for (win_index, win_coeff) in enumerate(windows):
+            b_win   = b_frames[win_index].T
+            tau_win = tau_frames[win_index].T
+
+            ## coefficient j1 of the window reads frame t + o1 (o1 = j1 - win_length) into the feature of frame t
+            for (j1, c1) in enumerate(win_coeff):
+                if c1 == 0.0:
+                    continue
+                o1 = j1 - self.win_length
+                start = max(0, o1)
+                stop  = min(frame_number, frame_number + o1)
+                b[:, start:stop] += c1 * b_win[:, start-o1:stop-o1]
+
+                ## W'DW[i, i+k] += c1 * c2 * tau[i-o1], for every coefficient c2 at k frames after c1
+                for j2 in range(j1, len(win_coeff)):
+                    c2 = win_coeff[j2]
+                    if c2 == 0.0:
+                        continue
+                    k = j2 - j1
+                    stop_k = min(frame_number - k, frame_number + o1)
+                    if stop_k <= start:
+                        continue
+                    prec[bandwidth-k, :, start+k:stop_k+k] += c1 * c2 * tau_win[:, start-o1:stop_k-o1]
+
+        return  prec, b
+
+    def generation(self, features, covariance, static_dimension):
+        '''
+        features and covariance (the variance of each frame) are of shape (frames, 3*static_dimension)
+        '''
+        logger = logging.getLogger('param_generation')
+        logger.debug('starting MLParameterGenerationBanded.generation')
+
+        windows = [numpy.array([0.0]*self.win_length + [1.0] + [0.0]*self.win_length),
+                   numpy.array(self.delta_win),
+                   numpy.array(self.acc_win)]
+        num_windows = len(windows)
+
+        frame_number = features.shape[0]
+
+        mu_frames  = numpy.empty((num_windows, frame_number, static_dimension))
+        var_frames = numpy.empty((num_windows, frame_number, static_dimension))
+        for win_index in range(num_windows):
+            mu_frames[win_index]  = features[:, win_index*static_dimension:(win_index+1)*static_dimension]
+            var_frames[win_index] = covariance[:, win_index*static_dimension:(win_index+1)*static_dimension]
+
+        var_frames[1:, 0, :] = self.boundary_var
+        var_frames[1:, frame_number-1, :] = self.boundary_var
+
+        b_frames   = mu_frames / var_frames
+        tau_frames = 1.0 / var_frames
+
+        prec, b = self.build_banded_system(b_frames, tau_frames, windows)
+
+        ## the systems of the static dimensions do not interact, so laying them end to end gives a single
+        ## banded system (the band entries that would couple two dimensions are all zero) solved in one call
+        bandwidth = prec.shape[0]
+        mean_traj = solveh_banded(prec.reshape((bandwidth, static_dimension*frame_number)), b.reshape(-1))
+
+        gen_parameter = mean_traj.reshape((static_dimension, frame_number)).T
+
+        return  gen_parameter
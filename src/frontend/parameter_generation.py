@@ -38,26 +38,48 @@
 ################################################################################
 
 ## Added FAST_MLPG as a variable here, in case someone wants to use the slow version, but perhaps we
-## should always use the bandmat version?
+## should always use a banded version?
 FAST_MLPG = True
 #io_funcs.
 
 from io_funcs.binary_io import  BinaryIOCollection
+from frontend.silence_remover import load_label_segments
 import os, re, numpy
 import logging
+import multiprocessing
+from multiprocessing import Pool
 
+## the banded solvers are O(T); the SciPy one is preferred, as it needs neither bandmat nor theano
 if FAST_MLPG:
-    from .mlpg_fast import MLParameterGenerationFast as MLParameterGeneration
-#    pass
+    try:
+        from .mlpg_banded import MLParameterGenerationBanded as MLParameterGeneration
+    except ImportError:
+        from .mlpg_fast import MLParameterGenerationFast as MLParameterGeneration
 else:
     from .mlpg import MLParameterGeneration
 
+## the parameter generator of a worker process, set once per worker by _init_generation_worker
+_worker_generator = None
+
+def _init_generation_worker(generator):
+    global _worker_generator
+    _worker_generator = generator
+
+def _generate_utterance_job(job):
+    _worker_generator.generate_utterance_file(*job)
+    return  job[0]
+
 class   ParameterGeneration(object):
 
-    def __init__(self, gen_wav_features = ['mgc', 'lf0', 'bap'], enforce_silence=False):
+    def __init__(self, gen_wav_features = ['mgc', 'lf0', 'bap'], enforce_silence=False, num_workers=1):
         self.gen_wav_features = gen_wav_features
         self.enforce_silence  = enforce_silence
 
+        ## with more than one worker, the streams of the utterances are generated in a pool of processes
+        if num_workers == 0:
+            num_workers = multiprocessing.cpu_count()
+        self.num_workers = num_workers
+
         # Debug:
         self.inf_float = -1.0e+10
         #self.inf_float = -50000
@@ -128,9 +150,36 @@ class   ParameterGeneration(object):
 
             dimension_index += out_dimension_dict[feature_name]
 
-        io_funcs = BinaryIOCollection()
+        self.mlpg_algo = MLParameterGeneration()
 
-        mlpg_algo = MLParameterGeneration()
+        if self.enforce_silence:
+            silence_pattern = cfg.silence_pattern
+            label_align_dir = cfg.in_label_align_dir
+        else:
+            silence_pattern = None
+            label_align_dir = None
+
+        stream_args = (dimension, out_dimension_dict, file_extension_dict, stream_start_index, do_MLPG, silence_pattern, label_align_dir)
+
+        if self.num_workers > 1:
+            ## one job per utterance, which loads its features and silence mask once for all the streams;
+            ## at most num_workers utterances are held in memory at any time
+            job_list = [(file_name, ) + stream_args for file_name in in_file_list]
+            logger.info('generating the streams of %d files with %d processes' % (len(job_list), self.num_workers) )
+
+            pool = Pool(self.num_workers, _init_generation_worker, (self,))
+            try:
+                for (findex, file_name) in enumerate(pool.imap_unordered(_generate_utterance_job, job_list)):
+                    logger.debug('generated %4d of %4d files' % (findex+1, len(job_list)) )
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+            return
+
+        io_funcs = BinaryIOCollection()
 
         findex=0
         flen=len(in_file_list)
@@ -138,71 +187,101 @@ class   ParameterGeneration(object):
 
             findex=findex+1
 
-            dir_name = os.path.dirname(file_name)
-            file_id = os.path.splitext(os.path.basename(file_name))[0]
-
             features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
 
             logger.info('processing %4d of %4d: %s' % (findex,flen,file_name) )
 
+            silence_mask = None
+            if self.enforce_silence:
+                silence_mask = self.load_silence_mask(file_name, frame_number, silence_pattern, label_align_dir)
+
             for feature_name in self.gen_wav_features:
+                self.generate_stream(file_name, features, feature_name, out_dimension_dict, file_extension_dict, stream_start_index, do_MLPG, silence_mask)
+
+    def generate_utterance_file(self, file_name, dimension, out_dimension_dict, file_extension_dict, stream_start_index, do_MLPG, silence_pattern, label_align_dir):
+        '''
+        generate all the streams of one utterance, as a job of the process pool
+        '''
+        io_funcs = BinaryIOCollection()
+        features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
+
+        silence_mask = None
+        if self.enforce_silence:
+            silence_mask = self.load_silence_mask(file_name, frame_number, silence_pattern, label_align_dir)
+
+        for feature_name in self.gen_wav_features:
+            self.generate_stream(file_name, features, feature_name, out_dimension_dict, file_extension_dict, stream_start_index, do_MLPG, silence_mask)
+
+    def generate_stream(self, file_name, features, feature_name, out_dimension_dict, file_extension_dict, stream_start_index, do_MLPG, silence_mask=None):
+
+        logger = logging.getLogger('param_generation')
+        logger.debug(' feature: %s' % feature_name)
+
+        io_funcs = BinaryIOCollection()
+
+        dir_name = os.path.dirname(file_name)
+        file_id = os.path.splitext(os.path.basename(file_name))[0]
+
+        frame_number = features.shape[0]
+
+        current_features = features[:, stream_start_index[feature_name]:stream_start_index[feature_name]+out_dimension_dict[feature_name]]
+        if FAST_MLPG:
+            ### fast version wants variance per frame, not single global one:
+            var = self.var[feature_name]
+            var = numpy.transpose(numpy.tile(var,frame_number))
+        else:
+            var = self.var[feature_name]
+
+#        print  var.shape[1]
+        if do_MLPG == False:
+            gen_features = current_features
+        else:
+            gen_features = self.mlpg_algo.generation(current_features, var, out_dimension_dict[feature_name]//3)
+#        else:
+#            self.logger.critical("the dimensions do not match for MLPG: %d vs %d" %(var.shape[1], out_dimension_dict[feature_name]))
+#            raise
+
+        logger.debug(' feature dimensions: %d by %d' %(gen_features.shape[0], gen_features.shape[1]))
+
+        if feature_name in ['lf0', 'F0']:
+            if 'vuv' in stream_start_index:
+                vuv_feature = features[:, stream_start_index['vuv']]
+
+                unvoiced = (vuv_feature < 0.5) | (gen_features[:, 0] < numpy.log(20))
+                gen_features[unvoiced, 0] = self.inf_float
+
+        new_file_name = os.path.join(dir_name, file_id + file_extension_dict[feature_name])
+
+        if silence_mask is not None:
+            if feature_name in ['lf0', 'F0', 'mag']:
+                gen_features[silence_mask, :] = self.inf_float
+            else:
+                gen_features[silence_mask, :] = 0.0
+
+        io_funcs.array_to_binary_file(gen_features, new_file_name)
+        logger.debug(' wrote to file %s' % new_file_name)
+
+    def load_silence_mask(self, file_name, frame_number, silence_pattern, label_align_dir):
+        '''
+        return a boolean vector marking the frames covered by silence labels in the aligned label file of file_name
+        '''
+        file_id = os.path.splitext(os.path.basename(file_name))[0]
+
+        start_time, end_time, full_labels, is_silence = load_label_segments(label_align_dir+'/'+file_id+'.lab', silence_pattern)
+        start_time = start_time[is_silence]
+        end_time   = end_time[is_silence]
+
+        ## times in 100ns units to 5 ms frames, the same way as the per-frame code used to
+        start_time = numpy.clip((start_time*(10**-4)/5).astype(int), 0, frame_number)
+        end_time   = numpy.clip((end_time*(10**-4)/5).astype(int), 0, frame_number)
+        non_empty  = start_time < end_time
+
+        ## +1 where a silence starts and -1 where it ends: frames with a positive running sum are silent
+        boundary = numpy.zeros(frame_number+1, dtype=int)
+        numpy.add.at(boundary, start_time[non_empty], 1)
+        numpy.add.at(boundary, end_time[non_empty], -1)
 
-                logger.debug(' feature: %s' % feature_name)
-
-                current_features = features[:, stream_start_index[feature_name]:stream_start_index[feature_name]+out_dimension_dict[feature_name]]
-                if FAST_MLPG:
-                    ### fast version wants variance per frame, not single global one:
-                    var = self.var[feature_name]
-                    var = numpy.transpose(numpy.tile(var,frame_number))
-                else:
-                    var = self.var[feature_name]
-
-#                print  var.shape[1]
-                if do_MLPG == False:
-                    gen_features = current_features
-                else:
-                    gen_features = mlpg_algo.generation(current_features, var, out_dimension_dict[feature_name]//3)
-#                else:
-#                    self.logger.critical("the dimensions do not match for MLPG: %d vs %d" %(var.shape[1], out_dimension_dict[feature_name]))
-#                    raise
-
-                logger.debug(' feature dimensions: %d by %d' %(gen_features.shape[0], gen_features.shape[1]))
-
-                if feature_name in ['lf0', 'F0']:
-                    if 'vuv' in stream_start_index:
-                        vuv_feature = features[:, stream_start_index['vuv']:stream_start_index['vuv']+1]
-
-                        for i in range(frame_number):
-                            if vuv_feature[i, 0] < 0.5 or gen_features[i, 0] < numpy.log(20):
-                                gen_features[i, 0] = self.inf_float
-
-                new_file_name = os.path.join(dir_name, file_id + file_extension_dict[feature_name])
-
-                if self.enforce_silence:
-                    silence_pattern = cfg.silence_pattern
-                    label_align_dir = cfg.in_label_align_dir
-                    in_f = open(label_align_dir+'/'+file_id+'.lab','r')
-                    for line in in_f.readlines():
-                        line = line.strip()
-
-                        if len(line) < 1:
-                            continue
-                        temp_list  = re.split('\s+', line)
-                        start_time = int(int(temp_list[0])*(10**-4)/5)
-                        end_time   = int(int(temp_list[1])*(10**-4)/5)
-
-                        full_label = temp_list[2]
-
-                        label_binary_flag = self.check_silence_pattern(full_label, silence_pattern)
-
-                        if label_binary_flag:
-                            if feature_name in ['lf0', 'F0', 'mag']:
-                                gen_features[start_time:end_time, :] = self.inf_float
-                            else:
-                                gen_features[start_time:end_time, :] = 0.0
-
-                io_funcs.array_to_binary_file(gen_features, new_file_name)
-                logger.debug(' wrote to file %s' % new_file_name)
+        return  numpy.cumsum(boundary[:frame_number]) > 0
 
 
     def load_covariance(self, var_file_dict, out_dimension_dict):
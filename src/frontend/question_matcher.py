@@ -0,0 +1,375 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+import os
+import re
+import numpy
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+
+def literal_trie_regex(literal_list):
+    '''
+    build a regex matching exactly the given literals, factorised as a prefix tree
+    so that the regex engine never backtracks over a shared prefix
+    '''
+    trie = {}
+    for literal in literal_list:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def _node_regex(node):
+        is_end = '' in node
+        branches = [re.escape(char) + _node_regex(node[char]) for char in sorted(node.keys()) if char != '']
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        node_regex = '(?:%s)' %('|'.join(branches))
+        if is_end:
+            node_regex += '?'
+        return node_regex
+
+    return _node_regex(trie)
+
+
+class QuestionSetMatcher(object):
+    """Compiles a whole HTS question set into a single matching engine.
+
+    Each QS pattern is classified by where its wildcards are (following the same rules as
+    HTSLabelNormalisation.wildcards2regex):
+
+        **contains**: `*abc*`, or a pattern without any `*` at all
+        **prefix**:   `abc*`, or any pattern of an LL- question
+        **suffix**:   `*abc`
+        **exact**:    `abc` anchored at both ends
+
+    Prefix, suffix and exact patterns are looked up in hash tables keyed by the head, tail or
+    whole of the label. Contains patterns are grouped by length, and each group is compiled into
+    a single trie-shaped lookahead regex, so that one scan of the label finds every (possibly
+    overlapping) occurrence of every pattern of that length. Patterns that still contain wildcards
+    after the outer `*` are stripped are joined into one alternation regex per question.
+
+    CQS questions are kept as the pre-compiled regular expressions built by the normaliser.
+    """
+
+    def __init__(self, discrete_questions, continuous_dict, wildcards2regex):
+        '''
+        discrete_questions: dict of question index (as string) -> (question key, list of HTS patterns)
+        continuous_dict:    dict of question index (as string) -> pre-compiled CQS regex
+        wildcards2regex:    function converting an HTS pattern into a regex (used for the fallback patterns)
+        '''
+        logger = logging.getLogger("labels")
+
+        self.binary_size = len(discrete_questions)
+        self.continuous_size = len(continuous_dict)
+
+        contains_tables = {}
+        prefix_tables = {}
+        suffix_tables = {}
+        exact_table = {}
+        regex_questions = []
+
+        LL = re.compile(re.escape('LL-'))
+
+        for i in range(self.binary_size):
+            question_key, question_list = discrete_questions[str(i)]
+            is_LL = LL.search(question_key) is not None
+
+            fallback_list = []
+            fallback_anchored = True
+            for question in question_list:
+                has_wildcard = '*' in question
+                anchor_start = (has_wildcard and not question.startswith('*')) or is_LL
+                anchor_end = has_wildcard and not question.endswith('*')
+                literal = question.strip('*')
+
+                if '*' in literal or '?' in literal:
+                    processed_question = wildcards2regex(question)
+                    if is_LL:
+                        processed_question = '^'+processed_question
+                    fallback_list.append('(?:%s)' %(processed_question))
+                    fallback_anchored = fallback_anchored and anchor_start
+                elif anchor_start and anchor_end:
+                    exact_table.setdefault(literal, set()).add(i)
+                elif anchor_start:
+                    prefix_tables.setdefault(len(literal), {}).setdefault(literal, set()).add(i)
+                elif anchor_end:
+                    suffix_tables.setdefault(len(literal), {}).setdefault(literal, set()).add(i)
+                else:
+                    contains_tables.setdefault(len(literal), {}).setdefault(literal, set()).add(i)
+
+            if fallback_list:
+                ## when every alternative is anchored at the start of the label, trying only position 0 is enough
+                compiled = re.compile('|'.join(fallback_list))
+                if fallback_anchored:
+                    regex_questions.append((i, compiled.match))
+                else:
+                    regex_questions.append((i, compiled.search))
+
+        ## at any position of the label at most one pattern of a given length can match,
+        ## so one scan per pattern length reports all of them
+        self.contains_scanners = []
+        for length in sorted(contains_tables.keys()):
+            table = dict((literal, tuple(sorted(index_set))) for (literal, index_set) in contains_tables[length].items())
+            scanner = re.compile('(?=(%s))' %(literal_trie_regex(list(table.keys()))))
+            self.contains_scanners.append((length, scanner, table))
+
+        self.prefix_tables = self._freeze_tables(prefix_tables)
+        self.suffix_tables = self._freeze_tables(suffix_tables)
+        self.exact_table = dict((literal, tuple(sorted(index_set))) for (literal, index_set) in exact_table.items())
+        self.regex_questions = regex_questions
+
+        self.continuous_list = [continuous_dict[str(i)] for i in range(self.continuous_size)]
+
+        logger.debug('compiled question set: %d contains lengths, %d prefix lengths, %d suffix lengths, %d exact patterns, %d regex questions' \
+                     %(len(self.contains_scanners), len(self.prefix_tables), len(self.suffix_tables), len(self.exact_table), len(self.regex_questions)))
+
+    def _freeze_tables(self, tables):
+        ## list of (pattern length, set of patterns, pattern -> question indices), longest patterns last
+        frozen = []
+        for length in sorted(tables.keys()):
+            table = dict((literal, tuple(sorted(index_set))) for (literal, index_set) in tables[length].items())
+            frozen.append((length, frozenset(table), table))
+        return frozen
+
+    def match_binary_indices(self, label):
+        '''
+        return the sorted list of QS question indices answered 'yes' by this label
+        '''
+        label_size = len(label)
+        hits = set()
+
+        for (length, scanner, table) in self.contains_scanners:
+            if length > label_size:
+                break
+            for literal in scanner.findall(label):
+                hits.update(table[literal])
+
+        for (length, literal_set, table) in self.prefix_tables:
+            if length > label_size:
+                break
+            literal = label[:length]
+            if literal in literal_set:
+                hits.update(table[literal])
+
+        for (length, literal_set, table) in self.suffix_tables:
+            if length > label_size:
+                break
+            literal = label[label_size-length:]
+            if literal in literal_set:
+                hits.update(table[literal])
+
+        if label in self.exact_table:
+            hits.update(self.exact_table[label])
+
+        for (i, regex_search) in self.regex_questions:
+            if i not in hits and regex_search(label) is not None:
+                hits.add(i)
+
+        return sorted(hits)
+
+    def match_binary(self, label):
+
+        lab_binary_vector = numpy.zeros((1, self.binary_size))
+
+        hits = self.match_binary_indices(label)
+        if hits:
+            lab_binary_vector[0, hits] = 1
+
+        return  lab_binary_vector
+
+    def match_continuous(self, label):
+
+        lab_continuous_vector = numpy.zeros((1, self.continuous_size))
+
+        for (i, current_compiled) in enumerate(self.continuous_list):
+            ms = current_compiled.search(label)
+            if ms is not None:
+                lab_continuous_vector[0, i] = float(ms.group(1))
+            else:
+                lab_continuous_vector[0, i] = -1.0
+
+        return  lab_continuous_vector
+
+    def match(self, label):
+        '''
+        return the binary and continuous answers of the whole question set concatenated, as in the label matrix
+        '''
+        return  numpy.concatenate([self.match_binary(label), self.match_continuous(label)], axis = 1)
+
+
+class LabelVectorCache(object):
+    """Memoises the question set answers of full-context label strings.
+
+    The same contexts (silences, pauses, repeated phrases) recur across utterances, so one cache
+    is shared by all the files normalised by a label normaliser. The in-memory layer is an LRU of
+    ready-made float32 label vectors (the label files are float32), bounded both by max_size entries
+    and by max_memory MB, as every worker process holds its own. If cache_dir is given, the answers
+    are also kept in a persistent layer, stored compactly as the indices of the 'yes' QS questions
+    plus the CQS values, and saved to a file named after question_set_key (a hash of the question
+    file), so that a rerun with the same question set only evaluates contexts it has not seen before.
+    """
+
+    def __init__(self, question_matcher, max_size=100000, cache_dir=None, question_set_key=None, max_memory=64):
+
+        self.logger = logging.getLogger("labels")
+
+        self.question_matcher = question_matcher
+        self.max_size = max_size
+        self.max_bytes = int(max_memory * 1024 * 1024)
+
+        self.lru = OrderedDict()
+        self.lru_bytes = 0
+        self.lock = threading.Lock()
+        self.hit_number = 0
+        self.miss_number = 0
+
+        self.persistent = {}
+        self.persistent_file = None
+        self.new_entries = {}
+        if cache_dir:
+            assert question_set_key, 'a question set key is needed to use a persistent label cache'
+            self.persistent_file = os.path.join(cache_dir, 'label_vectors_%s.pkl' %(question_set_key))
+            self.load()
+
+    def load(self):
+        if not os.path.isfile(self.persistent_file):
+            self.logger.debug('no persistent label cache found at %s' %(self.persistent_file))
+            return
+
+        fid = open(self.persistent_file, 'rb')
+        self.persistent = pickle.load(fid)
+        fid.close()
+        self.logger.info('loaded %d cached label contexts from %s' %(len(self.persistent), self.persistent_file))
+
+    def save(self):
+        self.logger.debug('label cache: %d hits, %d misses' %(self.hit_number, self.miss_number))
+
+        if self.persistent_file is None or not self.new_entries:
+            return
+
+        cache_dir = os.path.dirname(self.persistent_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        ## write to a temporary file first, so that an interrupted run never leaves a truncated cache
+        temp_file = self.persistent_file + '.%d.tmp' %(os.getpid())
+        fid = open(temp_file, 'wb')
+        with self.lock:
+            pickle.dump(self.persistent, fid, 2)
+        fid.close()
+        os.rename(temp_file, self.persistent_file)
+
+        self.logger.info('saved %d label contexts (%d new) to %s' %(len(self.persistent), len(self.new_entries), self.persistent_file))
+        self.new_entries = {}
+
+    def take_new_entries(self):
+        '''
+        return the persistent entries added since the last call (or save), and forget about them
+        '''
+        with self.lock:
+            new_entries = self.new_entries
+            self.new_entries = {}
+        return  new_entries
+
+    def merge(self, new_entries):
+        '''
+        add persistent entries computed elsewhere, e.g. by the cache of a worker process
+        '''
+        if self.persistent_file is None:
+            return
+
+        with self.lock:
+            for (label, entry) in new_entries.items():
+                if label not in self.persistent:
+                    self.persistent[label] = entry
+                    self.new_entries[label] = entry
+
+    def expand(self, entry):
+        (binary_indices, continuous_vector) = entry
+        binary_size = self.question_matcher.binary_size
+
+        label_vector = numpy.zeros((1, binary_size + self.question_matcher.continuous_size), dtype=numpy.float32)
+        label_vector[0, binary_indices] = 1
+        label_vector[0, binary_size:] = continuous_vector
+
+        return  label_vector
+
+    def get(self, label):
+        '''
+        return the label vector of a full-context label; the returned array is shared and must not be modified
+        '''
+        with self.lock:
+            label_vector = self.lru.pop(label, None)
+            if label_vector is not None:
+                self.lru[label] = label_vector
+                self.hit_number += 1
+                return  label_vector
+            entry = self.persistent.get(label)
+
+        is_new = entry is None
+        if is_new:
+            binary_indices = numpy.array(self.question_matcher.match_binary_indices(label), dtype=numpy.int32)
+            continuous_vector = numpy.array(self.question_matcher.match_continuous(label)[0], dtype=numpy.float32)
+            entry = (binary_indices, continuous_vector)
+
+        label_vector = self.expand(entry)
+
+        with self.lock:
+            if is_new:
+                self.miss_number += 1
+                if self.persistent_file is not None:
+                    self.persistent[label] = entry
+                    self.new_entries[label] = entry
+            else:
+                self.hit_number += 1
+
+            if label not in self.lru:
+                self.lru_bytes += label_vector.nbytes
+            self.lru[label] = label_vector
+            while self.lru and (len(self.lru) > self.max_size or self.lru_bytes > self.max_bytes):
+                self.lru_bytes -= self.lru.popitem(last=False)[1].nbytes
+
+        return  label_vector
@@ -39,13 +39,27 @@
 
 
 import sys, numpy, re, math
+import logging
+import multiprocessing
 from io_funcs.binary_io import BinaryIOCollection
+from multiprocessing import Pool
 from multiprocessing.dummy import Pool as ThreadPool
 
 
+## the silence remover of a worker process, set once per worker by _init_removal_worker
+_worker_remover = None
+
+def _init_removal_worker(remover):
+    global _worker_remover
+    _worker_remover = remover
+
+def _remove_silence_chunk(job_chunk):
+    return  [_worker_remover.remove_silence_job(job) for job in job_chunk]
+
+
 class SilenceRemover(object):
     def __init__(self, n_cmp, silence_pattern=['*-#+*'], label_type="state_align", remove_frame_features=True,
-                 subphone_feats="none"):
+                 subphone_feats="none", num_workers=1):
         self.silence_pattern = silence_pattern
         self.silence_pattern_size = len(silence_pattern)
         self.label_type = label_type
@@ -53,7 +67,14 @@ class SilenceRemover(object):
         self.subphone_feats = subphone_feats
         self.n_cmp = n_cmp
 
-    def remove_silence(self, in_data_list, in_align_list, out_data_list, dur_file_list=None):
+        ## with more than one worker, the files are processed in a pool of processes instead of threads
+        if num_workers == 0:
+            num_workers = multiprocessing.cpu_count()
+        self.num_workers = num_workers
+
+    def remove_silence(self, in_data_list, in_align_list, out_data_list, dur_file_list=None, chunks_per_worker=8):
+        logger = logging.getLogger("silence_remover")
+
         file_number = len(in_data_list)
         align_file_number = len(in_align_list)
 
@@ -64,37 +85,75 @@ class SilenceRemover(object):
             print("The number of input and output files does not equal!\n")
             sys.exit(1)
 
+        if dur_file_list:
+            job_list = [(in_data_list[i], in_align_list[i], out_data_list[i], dur_file_list[i]) for i in range(file_number)]
+        else:
+            job_list = [(in_data_list[i], in_align_list[i], out_data_list[i], None) for i in range(file_number)]
+
+        if self.num_workers > 1 and file_number > 0:
+            ## each worker parses the alignments and writes the outputs of a chunk of files on its own
+            chunk_size = max(1, file_number // (self.num_workers * chunks_per_worker))
+            chunk_list = [job_list[start:start+chunk_size] for start in range(0, file_number, chunk_size)]
+
+            result_list = []
+            pool = Pool(self.num_workers, _init_removal_worker, (self,))
+            try:
+                for chunk_result in pool.imap_unordered(_remove_silence_chunk, chunk_list):
+                    result_list.extend(chunk_result)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            pool = ThreadPool()
+            result_list = pool.map(self.remove_silence_job, job_list)
+            pool.close()
+            pool.join()
+
+        ## a file which fails is reported with the others at the end, rather than stopping the rest
+        failed_list = [(file_name, error) for (file_name, error) in result_list if error is not None]
+        for (file_name, error) in failed_list:
+            logger.critical('failed to remove silence from %s (%s)' % (file_name, error))
+        if failed_list:
+            raise OSError('silence removal failed for %d of %d files' % (len(failed_list), file_number))
+
+    def remove_silence_job(self, job):
+        '''
+        remove the silence of one file; returns the input file name and the error, or None if there was none
+        '''
+        try:
+            self.remove_silence_file(*job)
+        except Exception as error:
+            return  (job[0], repr(error))
+        return  (job[0], None)
+
+    def remove_silence_file(self, in_data_file, in_align_file, out_data_file, dur_file_name=None):
         io_funcs = BinaryIOCollection()
 
-        def _remove_silence(i):
-            if self.label_type == "phone_align":
-                if dur_file_list:
-                    dur_file_name = dur_file_list[i]
-                else:
-                    dur_file_name = None
-                nonsilence_indices = self.load_phone_alignment(in_align_list[i], dur_file_name)
-            else:
-                nonsilence_indices = self.load_alignment(in_align_list[i])
-
-            ori_cmp_data = io_funcs.load_binary_file(in_data_list[i], self.n_cmp)
+        if self.label_type == "phone_align":
+            nonsilence_mask = self.load_phone_alignment(in_align_file, dur_file_name)
+        else:
+            nonsilence_mask = self.load_alignment(in_align_file)
 
-            frame_number = ori_cmp_data.size / self.n_cmp
+        ori_cmp_data = io_funcs.load_binary_file(in_data_file, self.n_cmp)
 
-            if len(nonsilence_indices) == frame_number:
-                print('WARNING: no silence found!')
-                # previsouly: continue -- in fact we should keep non-silent data!
+        frame_number = ori_cmp_data.shape[0]
 
-            ## if labels have a few extra frames than audio, this can break the indexing, remove them:
-            nonsilence_indices = [ix for ix in nonsilence_indices if ix < frame_number]
+        if numpy.count_nonzero(nonsilence_mask) == frame_number:
+            print('WARNING: no silence found!')
+            # previsouly: continue -- in fact we should keep non-silent data!
 
-            new_cmp_data = ori_cmp_data[nonsilence_indices,]
+        ## if labels have a few extra frames than audio, this can break the indexing, remove them;
+        ## frames of audio not covered by the labels are dropped
+        keep_mask = numpy.zeros(frame_number, dtype=bool)
+        covered_frame_number = min(frame_number, len(nonsilence_mask))
+        keep_mask[:covered_frame_number] = nonsilence_mask[:covered_frame_number]
 
-            io_funcs.array_to_binary_file(new_cmp_data, out_data_list[i])
+        new_cmp_data = ori_cmp_data[keep_mask, ]
 
-        pool = ThreadPool()
-        pool.map(_remove_silence, range(file_number))
-        pool.close()
-        pool.join()
+        io_funcs.array_to_binary_file(new_cmp_data, out_data_file)
 
     ## OSW: rewrote above more succintly
     def check_silence_pattern(self, label):
@@ -105,95 +164,88 @@ class SilenceRemover(object):
         return 0
 
     def load_phone_alignment(self, alignment_file_name, dur_file_name=None):
-
-        if dur_file_name:
-            io_funcs = BinaryIOCollection()
-            dur_dim = 1  ## hard coded for now
-            manual_dur_data = io_funcs.load_binary_file(dur_file_name, dur_dim)
-
-        ph_count = 0
-        base_frame_index = 0
-        nonsilence_frame_index_list = []
-        fid = open(alignment_file_name)
-        for line in fid.readlines():
-            line = line.strip()
-            if len(line) < 1:
-                continue
-            temp_list = re.split('\s+', line)
-
-            if len(temp_list) == 1:
-                full_label = temp_list[0]
+        '''
+        return a boolean vector which is True for the non-silent frames (or labels, without frame features)
+        '''
+        start_time, end_time, full_labels, is_silence = load_label_segments(alignment_file_name, self.silence_pattern)
+
+        if self.remove_frame_features:
+            if dur_file_name:
+                io_funcs = BinaryIOCollection()
+                dur_dim = 1  ## hard coded for now
+                manual_dur_data = io_funcs.load_binary_file(dur_file_name, dur_dim)
+                ## one duration for each label with times
+                frame_number = numpy.zeros(len(full_labels), dtype=int)
+                timed = start_time >= 0
+                frame_number[timed] = manual_dur_data[:numpy.count_nonzero(timed), 0]
             else:
-                start_time = int(temp_list[0])
-                end_time = int(temp_list[1])
-                full_label = temp_list[2]
-
-                # to do - support different frame shift - currently hardwired to 5msec
-                # currently under beta testing: supports different frame shift
-                if dur_file_name:
-                    frame_number = manual_dur_data[ph_count]
-                    ph_count = ph_count + 1
-                else:
-                    frame_number = int((end_time - start_time) / 50000)
-
-            label_binary_flag = self.check_silence_pattern(full_label)
-
-            if self.remove_frame_features:
-                if label_binary_flag == 0:
-                    for frame_index in range(frame_number):
-                        nonsilence_frame_index_list.append(base_frame_index + frame_index)
-                base_frame_index = base_frame_index + frame_number
-            elif self.subphone_feats == 'none':
-                if label_binary_flag == 0:
-                    nonsilence_frame_index_list.append(base_frame_index)
-                base_frame_index = base_frame_index + 1
-
-        fid.close()
-
-        return nonsilence_frame_index_list
+                frame_number = segment_frame_number(start_time, end_time)
+            return numpy.repeat(~is_silence, frame_number)
+        elif self.subphone_feats == 'none':
+            return ~is_silence
 
-    def load_alignment(self, alignment_file_name, dur_file_name=None):
+        return numpy.zeros(0, dtype=bool)
 
+    def load_alignment(self, alignment_file_name, dur_file_name=None):
+        '''
+        return a boolean vector which is True for the non-silent frames (or states, or phones, without frame features)
+        '''
         state_number = 5
-        base_frame_index = 0
-        nonsilence_frame_index_list = []
-        fid = open(alignment_file_name)
-        for line in fid.readlines():
-            line = line.strip()
-            if len(line) < 1:
-                continue
-            temp_list = re.split('\s+', line)
-            if len(temp_list) == 1:
-                state_index = state_number
-                full_label = temp_list[0]
-            else:
-                start_time = int(temp_list[0])
-                end_time = int(temp_list[1])
-                full_label = temp_list[2]
-                full_label_length = len(full_label) - 3  # remove state information [k]
-                state_index = full_label[full_label_length + 1]
-                state_index = int(state_index) - 1
-                frame_number = int((end_time - start_time) / 50000)
-
-            label_binary_flag = self.check_silence_pattern(full_label)
-
-            if self.remove_frame_features:
-                if label_binary_flag == 0:
-                    for frame_index in range(frame_number):
-                        nonsilence_frame_index_list.append(base_frame_index + frame_index)
-                base_frame_index = base_frame_index + frame_number
-            elif self.subphone_feats == 'state_only':
-                if label_binary_flag == 0:
-                    nonsilence_frame_index_list.append(base_frame_index)
-                base_frame_index = base_frame_index + 1
-            elif self.subphone_feats == 'none' and state_index == state_number:
-                if label_binary_flag == 0:
-                    nonsilence_frame_index_list.append(base_frame_index)
-                base_frame_index = base_frame_index + 1
-
-        fid.close()
-
-        return nonsilence_frame_index_list
+        start_time, end_time, full_labels, is_silence = load_label_segments(alignment_file_name, self.silence_pattern)
+
+        if self.remove_frame_features:
+            return numpy.repeat(~is_silence, segment_frame_number(start_time, end_time))
+        elif self.subphone_feats == 'state_only':
+            return ~is_silence
+        elif self.subphone_feats == 'none':
+            ## labels without times are whole phones; the others end in the state information [k]
+            state_index = numpy.array([int(full_label[-2]) - 1 if start >= 0 else state_number
+                                       for (full_label, start) in zip(full_labels, start_time)], dtype=int)
+            return ~is_silence[state_index == state_number]
+
+        return numpy.zeros(0, dtype=bool)
+
+
+def load_label_segments(alignment_file_name, silence_pattern):
+    '''
+    Parse an aligned label file into one entry per label:
+        start_time, end_time: integer arrays of times in 100ns units (-1 for labels without times)
+        full_labels: list of the labels
+        is_silence: boolean array, True for labels matching one of silence_pattern
+    '''
+    patterns = [current_pattern.strip('*') for current_pattern in silence_pattern]
+
+    start_list = []
+    end_list = []
+    full_labels = []
+    fid = open(alignment_file_name)
+    for line in fid.readlines():
+        line = line.strip()
+        if len(line) < 1:
+            continue
+        temp_list = re.split('\s+', line)
+        if len(temp_list) == 1:
+            start_list.append(-1)
+            end_list.append(-1)
+            full_labels.append(temp_list[0])
+        else:
+            start_list.append(int(temp_list[0]))
+            end_list.append(int(temp_list[1]))
+            full_labels.append(temp_list[2])
+    fid.close()
+
+    is_silence = numpy.array([any(current_pattern in full_label for current_pattern in patterns)
+                              for full_label in full_labels], dtype=bool)
+
+    return numpy.array(start_list, dtype=numpy.int64), numpy.array(end_list, dtype=numpy.int64), full_labels, is_silence
+
+
+def segment_frame_number(start_time, end_time, frame_shift=50000):
+    '''
+    number of frames of each segment; labels without times cover no frames
+    '''
+    # to do - support different frame shift - currently hardwired to 5msec
+    return numpy.maximum((end_time - start_time) // frame_shift, 0)
 
 
 # def load_binary_file(self, file_name, dimension):
@@ -223,7 +275,8 @@ def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
     for (infile, outfile, label_file) in zip(in_list, out_list, label_list):
 
         data = io_funcs.load_binary_file(infile, in_dimension)
-        label = io_funcs.load_binary_file(label_file, label_dimension)
+        ## only the silence column of the labels is needed, so map them instead of reading them
+        label = io_funcs.load_binary_file_mmap(label_file, label_dimension)
 
         audio_label_difference = data.shape[0] - label.shape[0]
         assert math.fabs(audio_label_difference) < 3, '%s and %s contain different numbers of frames: %s %s' % (
@@ -250,15 +303,14 @@ def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
                 'dimension %s of %s contains values other than 0 and 1' % (silence_feature_index, infile)
         print('Remove %d%% of frames (%s frames) as silence... ' % (
             100 * numpy.sum(silence_flag / float(len(silence_flag))), int(numpy.sum(silence_flag))))
-        non_silence_indices = numpy.nonzero(
-            silence_flag == 0)  ## get the indices where silence_flag == 0 is True (i.e. != 0)
+        keep_mask = (silence_flag == 0)  ## boolean mask of the frames to keep: no index array is built
         if percent_to_keep != 0:
             assert type(percent_to_keep) == int and percent_to_keep > 0
             # print silence_flag
             silence_indices = numpy.nonzero(silence_flag == 1)
             ## nonzero returns a tuple of arrays, one for each dimension of input array
             silence_indices = silence_indices[0]
-            every_nth = 100 / percent_to_keep
+            every_nth = 100 // percent_to_keep
             silence_indices_to_keep = silence_indices[::every_nth]  ## every_nth used +as step value in slice
             ## -1 due to weird error with STRAIGHT features at line 144:
             ## IndexError: index 445 is out of bounds for axis 0 with size 445
@@ -270,10 +322,9 @@ def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
             ## Append to end of utt -- same function used for labels and audio
             ## means that violation of temporal order doesn't matter -- will be consistent.
             ## Later, frame shuffling will disperse silent frames evenly across minibatches:
-            non_silence_indices = (numpy.hstack([non_silence_indices[0], silence_indices_to_keep]))
-            ##  ^---- from tuple and back (see nonzero note above)
-
-        trimmed_data = data[non_silence_indices, :]  ## advanced integer indexing
+            trimmed_data = numpy.vstack([data[keep_mask, :], data[silence_indices_to_keep, :]])
+        else:
+            trimmed_data = data[keep_mask, :]
         io_funcs.array_to_binary_file(trimmed_data, outfile)
 
 
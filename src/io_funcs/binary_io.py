@@ -39,6 +39,7 @@
 
 
 
+import os
 import numpy
 
 class   BinaryIOCollection(object):
@@ -54,7 +55,10 @@ class   BinaryIOCollection(object):
         return  features
 
     def array_to_binary_file(self, data, output_file_name):
-        data = numpy.array(data, 'float32')
+        ## only convert (and copy) data that is not float32 already; memory-mapped data is still copied,
+        ## as it may be mapped from the very file about to be truncated
+        if not (isinstance(data, numpy.ndarray) and data.dtype == numpy.float32) or isinstance(data, numpy.memmap):
+            data = numpy.array(data, 'float32')
 
         fid = open(output_file_name, 'wb')
         data.tofile(fid)
@@ -70,3 +74,64 @@ class   BinaryIOCollection(object):
         features = features.reshape((-1, dimension))
 
         return  features, frame_number
+
+    def get_frame_number(self, file_name, dimension):
+        return  os.path.getsize(file_name) // (4 * dimension)
+
+    def load_binary_file_mmap(self, file_name, dimension):
+        '''
+        return a read-only (frames, dimension) view of the file mapped into memory: only the frames that are
+        accessed are read from disk. The view must not be kept while the file itself is being rewritten
+        '''
+        frame_number = self.get_frame_number(file_name, dimension)
+        if frame_number == 0:
+            ## an empty file cannot be mapped
+            return  numpy.empty((0, dimension), dtype=numpy.float32)
+
+        return  numpy.memmap(file_name, dtype=numpy.float32, mode='r', shape=(frame_number, dimension))
+
+    def load_binary_file_frames(self, file_name, dimension, start_frame, end_frame):
+        '''
+        read only the frames start_frame to end_frame (exclusive) of the file
+        '''
+        fid = open(file_name, 'rb')
+        fid.seek(4 * dimension * start_frame)
+        features = numpy.fromfile(fid, dtype=numpy.float32, count=dimension * max(0, end_frame - start_frame))
+        fid.close()
+
+        return  features.reshape((-1, dimension))
+
+    def open_binary_file(self, file_name, dimension):
+        '''
+        return a BinaryFrameReader, which reads the frames it is sliced with, e.g. reader[a:b]
+        '''
+        return  BinaryFrameReader(file_name, dimension)
+
+
+class   BinaryFrameReader(object):
+
+    def __init__(self, file_name, dimension):
+        self.file_name = file_name
+        self.dimension = dimension
+
+        self.io_funcs = BinaryIOCollection()
+        self.frame_number = self.io_funcs.get_frame_number(file_name, dimension)
+        self.shape = (self.frame_number, dimension)
+
+    def __len__(self):
+        return  self.frame_number
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            (start_frame, end_frame, step) = index.indices(self.frame_number)
+            if step == 1:
+                return  self.io_funcs.load_binary_file_frames(self.file_name, self.dimension, start_frame, end_frame)
+            if step > 0:
+                return  self.io_funcs.load_binary_file_frames(self.file_name, self.dimension, start_frame, end_frame)[::step]
+            return  self.io_funcs.load_binary_file_frames(self.file_name, self.dimension, 0, self.frame_number)[index]
+
+        if index < 0:
+            index += self.frame_number
+        if not 0 <= index < self.frame_number:
+            raise IndexError('frame %d out of range for %s (%d frames)' % (index, self.file_name, self.frame_number))
+        return  self.io_funcs.load_binary_file_frames(self.file_name, self.dimension, index, index + 1)[0]
@@ -0,0 +1,166 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import os
+import json
+import logging
+
+import numpy
+
+
+class PackedCorpus(object):
+    '''
+    A split of the training data (input and output features of every utterance) packed in a single
+    float32 file, with an index file holding the dimensions and the offset and frame numbers of each
+    utterance. The data file is mapped into memory, so an utterance is found and sliced in constant
+    time and only the frames used are read from disk.
+
+    Utterances are named as elsewhere in Merlin, by the base name of their feature files.
+    '''
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, corpus_file):
+        self.logger = logging.getLogger("PackedCorpus")
+
+        self.corpus_file = corpus_file
+
+        with open(self.index_file_name(corpus_file), 'r') as fid:
+            header = json.load(fid)
+
+        if header['version'] != self.FORMAT_VERSION:
+            self.logger.critical('packed corpus %s has format version %s, expected %d' % (corpus_file, header['version'], self.FORMAT_VERSION))
+            raise ValueError('unsupported packed corpus version')
+
+        self.n_ins = header['n_ins']
+        self.n_outs = header['n_outs']
+
+        ## name -> (offset in float32 values, input frames, output frames)
+        self.utterances = {}
+        self.utt_list = []
+        for (utt_name, offset, in_frame_number, out_frame_number) in header['utterances']:
+            self.utterances[utt_name] = (offset, in_frame_number, out_frame_number)
+            self.utt_list.append(utt_name)
+
+        if os.path.getsize(corpus_file) > 0:
+            self.data = numpy.memmap(corpus_file, dtype=numpy.float32, mode='r')
+        else:
+            self.data = numpy.empty(0, dtype=numpy.float32)
+
+        self.logger.debug('opened %d utterances in %s' % (len(self.utt_list), corpus_file))
+
+    @staticmethod
+    def index_file_name(corpus_file):
+        return  corpus_file + '.idx'
+
+    @staticmethod
+    def utterance_name(file_name):
+        return  os.path.basename(file_name).split('.')[0]
+
+    def __len__(self):
+        return  len(self.utt_list)
+
+    def __contains__(self, utt_name):
+        return  utt_name in self.utterances
+
+    def get_frame_numbers(self, utt_name):
+        '''
+        return the number of input and output frames of an utterance
+        '''
+        offset, in_frame_number, out_frame_number = self.utterances[utt_name]
+        return  in_frame_number, out_frame_number
+
+    def load_utterance(self, utt_name):
+        '''
+        return read-only (frames, n_ins) and (frames, n_outs) views of the features of an utterance
+        '''
+        offset, in_frame_number, out_frame_number = self.utterances[utt_name]
+
+        in_end = offset + in_frame_number * self.n_ins
+        out_end = in_end + out_frame_number * self.n_outs
+
+        in_features = self.data[offset:in_end].reshape((in_frame_number, self.n_ins))
+        out_features = self.data[in_end:out_end].reshape((out_frame_number, self.n_outs))
+
+        return  in_features, out_features
+
+
+def pack_corpus(in_file_list, out_file_list, n_ins, n_outs, corpus_file):
+    '''
+    write the features of the utterances in the two lists to a packed corpus
+    '''
+    logger = logging.getLogger("PackedCorpus")
+
+    assert len(in_file_list) == len(out_file_list)
+
+    corpus_dir = os.path.dirname(corpus_file)
+    if corpus_dir and not os.path.exists(corpus_dir):
+        os.makedirs(corpus_dir)
+
+    ## the old index no longer describes the data once it is being overwritten
+    index_file = PackedCorpus.index_file_name(corpus_file)
+    if os.path.exists(index_file):
+        os.remove(index_file)
+
+    utterances = []
+    offset = 0
+
+    fid = open(corpus_file, 'wb')
+    for in_file_name, out_file_name in zip(in_file_list, out_file_list):
+        ## the files are copied as they are: any mismatch in frame numbers is handled by the readers
+        in_features = numpy.fromfile(in_file_name, dtype=numpy.float32)
+        in_features = in_features[:(n_ins * (in_features.size // n_ins))]
+        out_features = numpy.fromfile(out_file_name, dtype=numpy.float32)
+        out_features = out_features[:(n_outs * (out_features.size // n_outs))]
+
+        in_features.tofile(fid)
+        out_features.tofile(fid)
+
+        utterances.append([PackedCorpus.utterance_name(in_file_name), offset, in_features.size // n_ins, out_features.size // n_outs])
+        offset += in_features.size + out_features.size
+    fid.close()
+
+    header = {'version': PackedCorpus.FORMAT_VERSION, 'n_ins': n_ins, 'n_outs': n_outs, 'utterances': utterances}
+
+    ## the index is written last, so that a half written corpus is never opened
+    with open(index_file + '.tmp', 'w') as fid:
+        json.dump(header, fid)
+    os.rename(index_file + '.tmp', index_file)
+
+    logger.info('packed %d utterances (%d values) into %s' % (len(utterances), offset, corpus_file))
@@ -45,6 +45,7 @@ import numpy as np
 from sklearn import preprocessing
 
 from io_funcs.binary_io import BinaryIOCollection
+from io_funcs.packed_corpus import PackedCorpus
 
 ############################
 ##### Memory variables #####
@@ -54,7 +55,7 @@ UTT_BUFFER_SIZE   =   10000
 FRAME_BUFFER_SIZE = 3000000
 
 
-def read_data_from_file_list(inp_file_list, out_file_list, inp_dim, out_dim, sequential_training=True):
+def read_data_from_file_list(inp_file_list, out_file_list, inp_dim, out_dim, sequential_training=True, packed_corpus=None):
     io_funcs = BinaryIOCollection()
 
     num_of_utt = len(inp_file_list)
@@ -73,8 +74,14 @@ def read_data_from_file_list(inp_file_list, out_file_list, inp_dim, out_dim, seq
     for i in range(num_of_utt):
         inp_file_name = inp_file_list[i]
         out_file_name = out_file_list[i]
-        inp_features, inp_frame_number = io_funcs.load_binary_file_frame(inp_file_name, inp_dim)
-        out_features, out_frame_number = io_funcs.load_binary_file_frame(out_file_name, out_dim)
+        if packed_corpus is not None:
+            ## copy the features out of the mapped corpus, as they are normalised in place later
+            inp_features, out_features = [np.array(features) for features in packed_corpus.load_utterance(PackedCorpus.utterance_name(inp_file_name))]
+            inp_frame_number = inp_features.shape[0]
+            out_frame_number = out_features.shape[0]
+        else:
+            inp_features, inp_frame_number = io_funcs.load_binary_file_frame(inp_file_name, inp_dim)
+            out_features, out_frame_number = io_funcs.load_binary_file_frame(out_file_name, out_dim)
 
         base_file_name = os.path.basename(inp_file_name).split(".")[0]
 
@@ -43,6 +43,11 @@ class DeepRecurrentNetwork(object):
 
         logger = logging.getLogger("DNN initialization")
 
+        ## the arguments needed to rebuild the network around a set of saved weights
+        self.architecture = {'n_in': int(n_in), 'hidden_layer_size': [int(size) for size in hidden_layer_size], 'n_out': int(n_out),
+                             'L1_reg': L1_reg, 'L2_reg': L2_reg, 'hidden_layer_type': list(hidden_layer_type), 'output_type': output_type,
+                             'dropout_rate': dropout_rate, 'optimizer': optimizer, 'loss_function': loss_function, 'rnn_batch_training': rnn_batch_training}
+
         self.n_in = int(n_in)
         self.n_out = int(n_out)
 
@@ -184,19 +189,19 @@ class DeepRecurrentNetwork(object):
         return T.nnet.relu(rest - corrects + delta).mean()
 
 
-    def build_finetune_functions(self, train_shared_xy, valid_shared_xy, use_lhuc=False, layer_index=0):
+    def build_finetune_functions(self, train_shared_xy, valid_shared_xy, use_lhuc=False, layer_index=0, minibatch_slices=False, train_shared_index=None):
         """ This function is to build finetune functions and to update gradients
 
         :param train_shared_xy: theano shared variable for input and output training data
         :type train_shared_xy: tuple of shared variable
         :param valid_shared_xy: theano shared variable for input and output development data
         :type valid_shared_xy: tuple of shared variable
+        :param minibatch_slices: if True, the training function takes the start and end of a minibatch within the shared training data as two more inputs, so that a whole partition can be uploaded at once
+        :param train_shared_index: optional theano shared variable with the order in which to take the frames of the training data. The minibatch bounds then refer to it.
         :returns: finetune functions for training and development
 
         """
 
-        logger = logging.getLogger("DNN initialization")
-
         (train_set_x, train_set_y) = train_shared_xy
         (valid_set_x, valid_set_y) = valid_shared_xy
 
@@ -205,6 +210,48 @@ class DeepRecurrentNetwork(object):
 
         cost = self.finetune_cost #+ self.L2_reg * self.L2_sqr
         
+        params = self.get_finetune_params(use_lhuc)
+        gparams = T.grad(cost, params)
+
+        updates = self.build_optimizer_updates(params, gparams, lr, mom, layer_index)
+
+        if minibatch_slices:
+            ## the minibatch is sliced out of the partition on the device, without a copy from the host
+            start = T.lscalar('start')
+            end = T.lscalar('end')
+            if train_shared_index is not None:
+                minibatch = train_shared_index[start:end]
+            else:
+                minibatch = slice(start, end)
+            train_model = theano.function(inputs = [lr, mom, start, end],
+                                          outputs = self.errors,
+                                          updates = updates,
+                                          givens = {self.x: train_set_x[minibatch],
+                                                    self.y: train_set_y[minibatch],
+                                                    self.is_train: np.cast['int32'](1)}, on_unused_input='ignore')
+        else:
+            train_model = theano.function(inputs = [lr, mom],  #index, batch_size
+                                          outputs = self.errors,
+                                          updates = updates,
+                                          givens = {self.x: train_set_x, #[index*batch_size:(index + 1)*batch_size]
+                                                    self.y: train_set_y,
+                                                    self.is_train: np.cast['int32'](1)}, on_unused_input='ignore')
+
+
+        valid_model = theano.function(inputs = [],
+                                      outputs = self.errors,
+                                      givens = {self.x: valid_set_x,
+                                                self.y: valid_set_y,
+                                                self.is_train: np.cast['int32'](0)}, on_unused_input='ignore')
+
+        return  train_model, valid_model
+
+    def get_finetune_params(self, use_lhuc=False):
+        """ This function is to choose the parameters updated during fine-tuning
+
+        :param use_lhuc: if True, only the LHUC scaling parameters are updated
+        :returns: list of theano shared variables
+        """
         ## added for LHUC
         if use_lhuc:
             # In lhuc the parameters are only scaling parameters which have the name 'c'
@@ -212,12 +259,22 @@ class DeepRecurrentNetwork(object):
             for p in self.params:
                 if p.name == 'c':
                     self.lhuc_params.append(p)
-            params = self.lhuc_params
-            gparams = T.grad(cost, params)
-        else:
-            params = self.params
-            gparams = T.grad(cost, params)
+            return  self.lhuc_params
 
+        return  self.params
+
+    def build_optimizer_updates(self, params, gparams, lr, mom, layer_index=0):
+        """ This function is to build the updates of the optimizer from the gradients
+
+        :param params: parameters to update
+        :param gparams: gradients of the cost with respect to the parameters. Either symbolic, or theano shared variables holding gradients computed elsewhere.
+        :param lr: learning rate
+        :param mom: momentum
+        :param layer_index: the parameters of the layers below this one are not updated
+        :returns: theano updates
+        """
+
+        logger = logging.getLogger("DNN initialization")
 
         freeze_params = 0
         for layer in range(layer_index):
@@ -245,21 +302,82 @@ class DeepRecurrentNetwork(object):
             logger.critical("This optimizer: %s is not supported right now! \n Please use one of the following: sgd, adam, rprop\n" %(self.optimizer))
             sys.exit(1)
 
-        train_model = theano.function(inputs = [lr, mom],  #index, batch_size
-                                      outputs = self.errors,
-                                      updates = updates,
-                                      givens = {self.x: train_set_x, #[index*batch_size:(index + 1)*batch_size]
-                                                self.y: train_set_y,
-                                                self.is_train: np.cast['int32'](1)}, on_unused_input='ignore')
+        ## the variables the optimizer keeps between updates (e.g. momentum, Adam moments), for training checkpoints
+        param_ids = set(id(param) for param in params)
+        self.optimizer_state = [variable for variable in updates if id(variable) not in param_ids]
 
+        return  updates
 
-        valid_model = theano.function(inputs = [],
-                                      outputs = self.errors,
-                                      givens = {self.x: valid_set_x,
-                                                self.y: valid_set_y,
-                                                self.is_train: np.cast['int32'](0)}, on_unused_input='ignore')
+    def get_training_state_variables(self):
+        """ This function is to find the state of training besides the parameters: the optimizer state of the last built training function, and the random streams used for dropout
 
-        return  train_model, valid_model
+        :returns: list of theano shared variables
+        """
+        random_states = [variable for variable in theano.gof.graph.inputs([self.finetune_cost])
+                         if isinstance(variable, theano.compile.SharedVariable) and getattr(variable, 'default_update', None) is not None]
+
+        return  getattr(self, 'optimizer_state', []) + random_states
+
+    def get_training_state(self):
+        return  [variable.get_value() for variable in self.get_training_state_variables()]
+
+    def set_training_state(self, training_state):
+        for variable, value in zip(self.get_training_state_variables(), training_state):
+            variable.set_value(value)
+
+    def __getstate__(self):
+        ## the optimizer state belongs in training checkpoints rather than in the saved model, and the prediction function is compiled again when needed
+        state = self.__dict__.copy()
+        state.pop('optimizer_state', None)
+        state.pop('predict_fn', None)
+        return  state
+
+    def build_gradient_function(self, train_shared_xy, use_lhuc=False, train_shared_index=None):
+        """ This function is to build a function computing the error and the gradients of a minibatch, without updating the parameters
+
+        :param train_shared_xy: theano shared variable for input and output training data
+        :type train_shared_xy: tuple of shared variable
+        :param train_shared_index: optional theano shared variable with the order in which to take the frames of the training data
+        :returns: function of the start and end of the minibatch, returning the error followed by the gradient of each parameter
+        """
+
+        (train_set_x, train_set_y) = train_shared_xy
+
+        params = self.get_finetune_params(use_lhuc)
+        gparams = T.grad(self.finetune_cost, params)
+
+        start = T.lscalar('start')
+        end = T.lscalar('end')
+        if train_shared_index is not None:
+            minibatch = train_shared_index[start:end]
+        else:
+            minibatch = slice(start, end)
+
+        gradient_model = theano.function(inputs = [start, end],
+                                         outputs = [self.errors] + gparams,
+                                         givens = {self.x: train_set_x[minibatch],
+                                                   self.y: train_set_y[minibatch],
+                                                   self.is_train: np.cast['int32'](1)}, on_unused_input='ignore')
+
+        return  gradient_model
+
+    def build_gradient_update_function(self, use_lhuc=False, layer_index=0):
+        """ This function is to build a function applying the optimizer to gradients computed elsewhere (e.g. by data-parallel workers)
+
+        :returns: update function of the learning rate and momentum, and the theano shared variables to put the gradients in before calling it
+        """
+
+        lr = T.scalar('lr', dtype = theano.config.floatX)
+        mom = T.scalar('mom', dtype = theano.config.floatX)  # momentum
+
+        params = self.get_finetune_params(use_lhuc)
+        gradients = [theano.shared(np.zeros(param.get_value(borrow = True).shape, dtype = theano.config.floatX), name = 'gradient') for param in params]
+
+        updates = self.build_optimizer_updates(params, gradients, lr, mom, layer_index)
+
+        update_model = theano.function(inputs = [lr, mom], outputs = [], updates = updates, on_unused_input='ignore')
+
+        return  update_model, gradients
 
     def parameter_prediction(self, test_set_x):  #, batch_size
         """ This function is to predict the output of NN
@@ -271,12 +389,12 @@ class DeepRecurrentNetwork(object):
         """
 
 
-        n_test_set_x = test_set_x.shape[0]
-
-        test_out = theano.function([], self.final_layer.output,
-              givens={self.x: test_set_x, self.is_train: np.cast['int32'](0)}, on_unused_input='ignore')
+        ## compiled once, on first use, rather than for every sentence
+        if getattr(self, 'predict_fn', None) is None:
+            self.predict_fn = theano.function([self.x], self.final_layer.output,
+                  givens={self.is_train: np.cast['int32'](0)}, on_unused_input='ignore', allow_input_downcast=True)
 
-        predict_parameter = test_out()
+        predict_parameter = self.predict_fn(test_set_x)
 
         return predict_parameter
     
@@ -69,6 +69,12 @@ class DNN(object):
 
         logger = logging.getLogger("DNN initialization")
 
+        ## the arguments needed to rebuild the network around a set of saved weights
+        self.architecture = {'n_ins': int(n_ins), 'n_outs': int(n_outs), 'l1_reg': l1_reg, 'l2_reg': l2_reg,
+                             'hidden_layers_sizes': [int(size) for size in hidden_layers_sizes],
+                             'hidden_activation': hidden_activation, 'output_activation': output_activation,
+                             'use_rprop': use_rprop, 'rprop_init_update': rprop_init_update}
+
         self.sigmoid_layers = []
         self.params = []
         self.delta_params   = []
@@ -231,15 +237,19 @@ class DNN(object):
 
     def parameter_prediction(self, test_set_x):  #, batch_size
 
-        n_test_set_x = test_set_x.get_value(borrow=True).shape[0]
-
-        test_out = theano.function([], self.final_layer.output,
-              givens={self.x: test_set_x[0:n_test_set_x]})
+        ## compiled once, on first use, rather than for every sentence
+        if getattr(self, 'predict_fn', None) is None:
+            self.predict_fn = theano.function([self.x], self.final_layer.output, allow_input_downcast=True)
 
-        predict_parameter = test_out()
+        predict_parameter = self.predict_fn(test_set_x.get_value(borrow=True))
 
         return predict_parameter
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('predict_fn', None)
+        return  state
+
     ## the function to output activations at a hidden layer
     def generate_top_hidden_layer(self, test_set_x, bn_layer_index):
 
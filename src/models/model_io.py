@@ -0,0 +1,113 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import json
+import pickle
+import zipfile
+
+import numpy
+
+
+def save_model_weights(dnn_model, file_name):
+    '''
+    save a network as an npz file of its parameters, named in order, together with the architecture needed to rebuild it (as JSON).
+    Unlike a pickle of the model, the file holds no theano objects.
+    '''
+    architecture = {'class': type(dnn_model).__name__, 'arguments': dnn_model.architecture}
+
+    weights = {}
+    for i, param in enumerate(dnn_model.params):
+        weights['param_%03d_%s' % (i, param.name)] = param.get_value()
+
+    ## a file object, as numpy adds the .npz extension to file names
+    with open(file_name, 'wb') as fid:
+        numpy.savez(fid, architecture=numpy.array(json.dumps(architecture)), **weights)
+
+
+def read_model_weights(file_name):
+    '''
+    read the architecture and the list of (parameter name, value) saved by save_model_weights, without building the network
+    '''
+    with numpy.load(file_name) as data:
+        architecture = json.loads(str(data['architecture']))
+        ## param_<index>_<name>
+        weight_names = sorted(name for name in data.files if name.startswith('param_'))
+        weights = [(name.split('_', 2)[2], data[name]) for name in weight_names]
+
+    return  architecture, weights
+
+
+def load_model_weights(file_name):
+    '''
+    rebuild a network saved by save_model_weights
+    '''
+    ## the models are only imported here so that theano is not needed to save or inspect a file
+    from models.deep_rnn import DeepRecurrentNetwork
+    from models.dnn import DNN
+
+    (architecture, weights) = read_model_weights(file_name)
+    weights = [value for (name, value) in weights]
+
+    arguments = architecture['arguments']
+    if architecture['class'] == 'DeepRecurrentNetwork':
+        dnn_model = DeepRecurrentNetwork(**arguments)
+    elif architecture['class'] == 'DNN':
+        dnn_model = DNN(numpy.random.RandomState(123), **arguments)
+    else:
+        raise ValueError('%s: unknown model class %s' % (file_name, architecture['class']))
+
+    if len(weights) != len(dnn_model.params):
+        raise ValueError('%s has %d parameters, but the network has %d' % (file_name, len(weights), len(dnn_model.params)))
+    for param, value in zip(dnn_model.params, weights):
+        if param.get_value(borrow=True).shape != value.shape:
+            raise ValueError('%s: parameter %s has shape %s, but the network expects %s' % (file_name, param.name, value.shape, param.get_value(borrow=True).shape))
+        param.set_value(numpy.asarray(value, dtype=param.dtype))
+
+    return  dnn_model
+
+
+def load_model(file_name):
+    '''
+    load a network from either a weights file written by save_model_weights or a pickled model
+    '''
+    if zipfile.is_zipfile(file_name):
+        return  load_model_weights(file_name)
+
+    with open(file_name, 'rb') as fid:
+        return  pickle.load(fid)
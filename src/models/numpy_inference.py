@@ -0,0 +1,363 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+## Forward passes of trained networks with numpy only, for generation without theano.
+## The layers follow layers/layers.py and layers/gating.py at test time.
+
+import logging
+import zipfile
+
+import numpy
+
+from models.model_io import read_model_weights, load_model
+
+
+## the parameters of each hidden layer type, in the order the model lists them
+FEEDFORWARD_PARAMS = ['W', 'b']
+LSTM_PARAMS = {'LSTM'     : ['W_xi', 'W_hi', 'w_ci', 'W_xf', 'W_hf', 'w_cf', 'W_xo', 'W_ho', 'w_co', 'W_xc', 'W_hc', 'b_i', 'b_f', 'b_o', 'b_c'],
+               'LSTM_NFG' : ['W_xi', 'W_hi', 'w_ci', 'W_xo', 'W_ho', 'w_co', 'W_xc', 'W_hc', 'b_i', 'b_o', 'b_c'],
+               'LSTM_NIG' : ['W_xf', 'W_hf', 'w_cf', 'W_xo', 'W_ho', 'w_co', 'W_xc', 'W_hc', 'b_f', 'b_o', 'b_c'],
+               'LSTM_NOG' : ['W_xi', 'W_hi', 'w_ci', 'W_xf', 'W_hf', 'w_cf', 'W_xc', 'W_hc', 'b_i', 'b_f', 'b_c'],
+               'LSTM_NPH' : ['W_xi', 'W_hi', 'W_xf', 'W_hf', 'W_xo', 'W_ho', 'W_xc', 'W_hc', 'b_i', 'b_f', 'b_o', 'b_c']}
+SLSTM_PARAMS = ['W_xf', 'W_hf', 'W_xc', 'W_hc', 'b_f', 'b_c']
+SGRU_PARAMS = ['W_xf', 'W_hf', 'w_cf', 'W_xc', 'W_hc', 'b_f', 'b_c']
+GRU_PARAMS = ['W_xz', 'W_hz', 'W_xr', 'W_hr', 'W_xh', 'W_hh', 'b_z', 'b_r', 'b_h']
+RNN_PARAMS = ['W_xi', 'W_hi', 'b_i']
+
+
+def sigmoid(x, out=None):
+    ## written with tanh, which does not overflow
+    out = numpy.multiply(x, 0.5, out=out)
+    numpy.tanh(out, out=out)
+    out *= 0.5
+    out += 0.5
+    return  out
+
+
+def activate(x, activation):
+    ## the activation functions of layers.layers.GeneralLayer, in place
+    if activation == 'sigmoid':
+        sigmoid(x, out=x)
+    elif activation == 'tanh':
+        numpy.tanh(x, out=x)
+    elif activation == 'relu':
+        numpy.maximum(x, 0.0, out=x)
+    elif activation == 'resu':
+        numpy.logaddexp(0.0, x, out=x)
+    elif activation == 'softmax':
+        x -= x.max(axis=-1, keepdims=True)
+        numpy.exp(x, out=x)
+        x /= x.sum(axis=-1, keepdims=True)
+    elif activation != 'linear':
+        raise ValueError('activation %s is not supported' % (activation))
+    return  x
+
+
+class FeedForwardLayer(object):
+
+    def __init__(self, weights, activation='linear'):
+        self.W = weights['W']
+        self.b = weights['b']
+        self.activation = activation
+
+    def __call__(self, x):
+        output = numpy.dot(x, self.W)
+        output += self.b
+        return  activate(output, self.activation)
+
+
+class RecurrentLayer(object):
+    '''
+    base class of the recurrent layers: the input projections of all the time steps are computed
+    with one matrix product, and the recurrence runs over the first axis with preallocated buffers
+    '''
+
+    def __init__(self, W_x, W_h, b, n_h):
+        ## the input weights and biases of all the gates side by side
+        self.W_x = numpy.ascontiguousarray(numpy.concatenate(W_x, axis=1))
+        self.W_h = numpy.ascontiguousarray(numpy.concatenate(W_h, axis=1))
+        self.b = numpy.concatenate(b)
+        self.n_h = n_h
+
+    def __call__(self, x, reverse=False):
+        xw = numpy.dot(x, self.W_x)
+        xw += self.b
+
+        n_steps = x.shape[0]
+        state_shape = x.shape[1:-1] + (self.n_h,)
+        output = numpy.empty((n_steps,) + state_shape, dtype=numpy.float32)
+        h = numpy.zeros(state_shape, dtype=numpy.float32)
+        c = numpy.zeros(state_shape, dtype=numpy.float32)
+        hw = numpy.empty(x.shape[1:-1] + (self.W_h.shape[1],), dtype=numpy.float32)
+
+        steps = range(n_steps - 1, -1, -1) if reverse else range(n_steps)
+        for t in steps:
+            numpy.dot(h, self.W_h, out=hw)
+            h, c = self.step(xw[t], hw, h, c)
+            output[t] = h
+
+        return  output
+
+    def gate(self, z, index):
+        return  z[..., index*self.n_h:(index+1)*self.n_h]
+
+
+class LstmLayer(RecurrentLayer):
+    '''
+    the LSTM variants of layers.gating: VanillaLstm, LstmNFG, LstmNIG, LstmNOG and LstmNoPeepholes
+    '''
+
+    def __init__(self, weights):
+        self.gates = [gate for gate in ['i', 'f', 'o'] if 'W_x' + gate in weights] + ['c']
+        self.peepholes = dict((gate, weights.get('w_c' + gate)) for gate in ['i', 'f', 'o'])
+        RecurrentLayer.__init__(self, [weights['W_x' + gate] for gate in self.gates], [weights['W_h' + gate] for gate in self.gates],
+                                [weights['b_' + gate] for gate in self.gates], weights['W_hc'].shape[0])
+
+    def step(self, xw_t, hw, h_tm1, c_tm1):
+        z = hw
+        z += xw_t
+        gates = dict((gate, self.gate(z, index)) for index, gate in enumerate(self.gates))
+
+        for gate in ['i', 'f']:
+            if gate in gates:
+                if self.peepholes[gate] is not None:
+                    gates[gate] += self.peepholes[gate] * c_tm1
+                sigmoid(gates[gate], out=gates[gate])
+
+        c_t = numpy.tanh(gates['c'])
+        if 'i' in gates:
+            c_t *= gates['i']
+        if 'f' in gates:
+            c_t += gates['f'] * c_tm1
+        else:
+            c_t += c_tm1
+
+        h_t = numpy.tanh(c_t)
+        if 'o' in gates:
+            o_t = gates['o']
+            if self.peepholes['o'] is not None:
+                o_t += self.peepholes['o'] * c_t
+            h_t *= sigmoid(o_t, out=o_t)
+
+        return  h_t, c_t
+
+
+class SimplifiedLstmLayer(RecurrentLayer):
+
+    def __init__(self, weights):
+        RecurrentLayer.__init__(self, [weights['W_xf'], weights['W_xc']], [weights['W_hf'], weights['W_hc']],
+                                [weights['b_f'], weights['b_c']], weights['W_hc'].shape[0])
+
+    def step(self, xw_t, hw, h_tm1, c_tm1):
+        z = hw
+        z += xw_t
+        f_t = sigmoid(self.gate(z, 0))
+        c_t = f_t * c_tm1
+        c_t += (1.0 - f_t) * numpy.tanh(self.gate(z, 1))
+
+        return  numpy.tanh(c_t), c_t
+
+
+class SimplifiedGruLayer(RecurrentLayer):
+
+    def __init__(self, weights):
+        RecurrentLayer.__init__(self, [weights['W_xf'], weights['W_xc']], [weights['W_hf'], weights['W_hc']],
+                                [weights['b_f'], weights['b_c']], weights['W_hc'].shape[0])
+        self.w_cf = weights['w_cf']
+
+    def step(self, xw_t, hw, h_tm1, c_tm1):
+        f_t = sigmoid(self.gate(xw_t, 0) + self.gate(hw, 0))
+        can_h_t = self.gate(hw, 1) * f_t
+        can_h_t += self.gate(xw_t, 1)
+        numpy.tanh(can_h_t, out=can_h_t)
+
+        h_t = self.w_cf * (1.0 - f_t) * h_tm1
+        h_t += f_t * can_h_t
+
+        return  h_t, h_t
+
+
+class GruLayer(RecurrentLayer):
+
+    def __init__(self, weights):
+        RecurrentLayer.__init__(self, [weights['W_xz'], weights['W_xr'], weights['W_xh']], [weights['W_hz'], weights['W_hr'], weights['W_hh']],
+                                [weights['b_z'], weights['b_r'], weights['b_h']], weights['W_hh'].shape[0])
+
+    def step(self, xw_t, hw, h_tm1, c_tm1):
+        z_t = sigmoid(self.gate(xw_t, 0) + self.gate(hw, 0))
+        r_t = sigmoid(self.gate(xw_t, 1) + self.gate(hw, 1))
+        can_h_t = self.gate(hw, 2) * r_t
+        can_h_t += self.gate(xw_t, 2)
+        numpy.tanh(can_h_t, out=can_h_t)
+
+        h_t = (1.0 - z_t) * h_tm1
+        h_t += z_t * can_h_t
+
+        return  h_t, h_t
+
+
+class VanillaRnnLayer(RecurrentLayer):
+
+    def __init__(self, weights):
+        RecurrentLayer.__init__(self, [weights['W_xi']], [weights['W_hi']], [weights['b_i']], weights['W_hi'].shape[0])
+
+    def step(self, xw_t, hw, h_tm1, c_tm1):
+        h_t = numpy.tanh(hw + xw_t)
+
+        return  h_t, h_t
+
+
+class BidirectionalLayer(object):
+
+    def __init__(self, forward_layer, backward_layer):
+        self.forward_layer = forward_layer
+        self.backward_layer = backward_layer
+
+    def __call__(self, x):
+        return  numpy.concatenate([self.forward_layer(x), self.backward_layer(x, reverse=True)], axis=-1)
+
+
+class NumpyInferenceNetwork(object):
+    '''
+    forward-only version of models.deep_rnn.DeepRecurrentNetwork and models.dnn.DNN, which runs in float32 with numpy alone
+    '''
+
+    RECURRENT_LAYERS = {'LSTM': LstmLayer, 'LSTM_NFG': LstmLayer, 'LSTM_NIG': LstmLayer, 'LSTM_NOG': LstmLayer, 'LSTM_NPH': LstmLayer,
+                        'SLSTM': SimplifiedLstmLayer, 'SGRU': SimplifiedGruLayer, 'GRU': GruLayer, 'RNN': VanillaRnnLayer}
+    LAYER_PARAMS = dict(LSTM_PARAMS, SLSTM=SLSTM_PARAMS, SGRU=SGRU_PARAMS, GRU=GRU_PARAMS, RNN=RNN_PARAMS,
+                        BLSTM=LSTM_PARAMS['LSTM'] * 2, BSLSTM=SLSTM_PARAMS * 2)
+    FEEDFORWARD_LAYERS = ['TANH', 'SIGMOID', 'SOFTMAX', 'RELU', 'RESU']
+
+    def __init__(self, architecture, weights):
+        '''
+        :param architecture: model class and constructor arguments, as saved by models.model_io.save_model_weights
+        :param weights: list of (parameter name, value), in the order of the model parameters
+        '''
+        self.logger = logging.getLogger('numpy_inference')
+
+        arguments = architecture['arguments']
+        if architecture['class'] == 'DeepRecurrentNetwork':
+            hidden_layer_type = [layer_type.upper() for layer_type in arguments['hidden_layer_type']]
+            output_type = arguments.get('output_type', 'LINEAR').upper()
+            dropout_rate = arguments.get('dropout_rate', 0.0)
+        elif architecture['class'] == 'DNN':
+            ## models.dnn.DNN uses tanh hidden layers whatever its hidden_activation
+            hidden_layer_type = ['TANH'] * len(arguments['hidden_layers_sizes'])
+            output_type = arguments.get('output_activation', 'linear').upper()
+            dropout_rate = 0.0
+        else:
+            raise ValueError('models of class %s are not supported' % (architecture['class']))
+
+        weights = [(name, numpy.asarray(value, dtype=numpy.float32)) for (name, value) in weights]
+        weights.reverse()
+
+        self.layers = []
+        for layer_type in hidden_layer_type:
+            layer_weights = self.take_weights(weights, self.LAYER_PARAMS.get(layer_type, FEEDFORWARD_PARAMS), layer_type)
+
+            ## at test time, dropout scales the input of each hidden layer by 1-p: fold it into the input weights
+            if dropout_rate > 0.0:
+                for layer_weight in layer_weights:
+                    for name in layer_weight:
+                        if name == 'W' or name.startswith('W_x'):
+                            layer_weight[name] = layer_weight[name] * numpy.float32(1.0 - dropout_rate)
+
+            if layer_type in self.FEEDFORWARD_LAYERS:
+                self.layers.append(FeedForwardLayer(layer_weights[0], layer_type.lower()))
+            elif layer_type in ('BLSTM', 'BSLSTM'):
+                layer_class = self.RECURRENT_LAYERS[layer_type[1:]]
+                self.layers.append(BidirectionalLayer(layer_class(layer_weights[0]), layer_class(layer_weights[1])))
+            elif layer_type in self.RECURRENT_LAYERS:
+                self.layers.append(self.RECURRENT_LAYERS[layer_type](layer_weights[0]))
+            else:
+                raise ValueError('hidden layer type %s is not supported for numpy inference' % (layer_type))
+
+        if output_type == 'LINEAR':
+            output_type = 'linear'
+        elif output_type in self.FEEDFORWARD_LAYERS:
+            output_type = output_type.lower()
+        else:
+            raise ValueError('output layer type %s is not supported for numpy inference' % (output_type))
+        self.layers.append(FeedForwardLayer(self.take_weights(weights, FEEDFORWARD_PARAMS, output_type)[0], output_type))
+
+        if weights:
+            raise ValueError('%d parameters left over after the output layer' % (len(weights)))
+
+    def take_weights(self, weights, names, layer_type):
+        ## the next parameters of the model, as one dictionary per direction of the layer
+        layer_weights = [{}]
+        for name in names:
+            if not weights:
+                raise ValueError('too few parameters for the %s layer' % (layer_type))
+            (weight_name, value) = weights.pop()
+            if weight_name != name:
+                raise ValueError('expected parameter %s of the %s layer, found %s' % (name, layer_type, weight_name))
+            if name in layer_weights[-1]:
+                layer_weights.append({})
+            layer_weights[-1][name] = value
+
+        return  layer_weights
+
+    @classmethod
+    def from_model(cls, dnn_model):
+        weights = [(param.name, param.get_value()) for param in dnn_model.params]
+        return  cls({'class': type(dnn_model).__name__, 'arguments': dnn_model.architecture}, weights)
+
+    def parameter_prediction(self, test_set_x):
+        '''
+        :param test_set_x: input features, with time along the first axis
+        :returns: predicted features, as models.deep_rnn.DeepRecurrentNetwork.parameter_prediction
+        '''
+        x = numpy.asarray(test_set_x, dtype=numpy.float32)
+        for layer in self.layers:
+            x = layer(x)
+
+        return  x
+
+
+def load_numpy_model(file_name):
+    '''
+    load a network for numpy inference from a weights file or, if theano is available, from a pickled model
+    '''
+    if not zipfile.is_zipfile(file_name):
+        return  NumpyInferenceNetwork.from_model(load_model(file_name))
+
+    (architecture, weights) = read_model_weights(file_name)
+
+    return  NumpyInferenceNetwork(architecture, weights)
@@ -43,6 +43,7 @@ import time
 
 from keras_lib import configuration
 from keras_lib import data_utils
+from io_funcs.packed_corpus import PackedCorpus
 from keras_lib.train import TrainKerasModels
 
 class KerasClass(object):
@@ -116,6 +117,13 @@ class KerasClass(object):
 
         #### Generate only test list ####
         self.GenTestList = cfg.GenTestList
+
+        #### Read train and valid data from packed corpora ####
+        self.train_corpus = None
+        self.valid_corpus = None
+        if cfg.packed_corpus_dir != 'None':
+            self.train_corpus = PackedCorpus(os.path.join(cfg.packed_corpus_dir, 'train.pack'))
+            self.valid_corpus = PackedCorpus(os.path.join(cfg.packed_corpus_dir, 'valid.pack'))
         
         ###################################################
         ####### End of user-defined conf variables ########
@@ -160,7 +168,7 @@ class KerasClass(object):
         else:
             print('preparing train_x, train_y from input and output feature files...')
             train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,
-                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training)
+                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training, packed_corpus=self.train_corpus)
 
             print('computing norm stats for train_x...')
             inp_scaler = data_utils.compute_norm_stats(train_x, self.inp_stats_file, method=self.inp_norm)
@@ -181,10 +189,10 @@ class KerasClass(object):
         #### load the data ####
         print('preparing train_x, train_y from input and output feature files...')
         train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,
-                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training)
+                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training, packed_corpus=self.train_corpus)
         print('preparing valid_x, valid_y from input and output feature files...')
         valid_x, valid_y, valid_flen = data_utils.read_data_from_file_list(self.inp_valid_file_list, self.out_valid_file_list,
-                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training)
+                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training, packed_corpus=self.valid_corpus)
 
         #### normalize the data ####
         data_utils.norm_data(train_x, self.inp_scaler, sequential_training=self.sequential_training)
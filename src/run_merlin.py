@@ -39,6 +39,7 @@
 
 import pickle
 import gzip
+import random
 import os, sys, errno
 import time
 import math
@@ -55,7 +56,8 @@ import numpy.distutils.__config__
 # and only after that can we import theano
 import theano
 
-from utils.providers import ListDataProvider
+from utils.providers import ListDataProvider, PrefetchingDataProvider
+from io_funcs.packed_corpus import PackedCorpus, pack_corpus
 
 from frontend.label_normalisation import HTSLabelNormalisation
 from frontend.silence_remover import SilenceRemover
@@ -69,9 +71,13 @@ from frontend.mean_variance_norm import MeanVarianceNorm
 from frontend.label_composer import LabelComposer
 from frontend.label_modifier import HTSLabelModification
 from frontend.merge_features import MergeFeat
+from frontend.global_variance import GlobalVariance
 
 import configuration
 from models.deep_rnn import DeepRecurrentNetwork
+from models.model_io import save_model_weights, load_model
+from models.numpy_inference import load_numpy_model
+from training_schemes.data_parallel import DataParallelTrainer
 
 from utils.compute_distortion import DistortionComputation, IndividualDistortionComp
 from utils.generate import generate_wav
@@ -149,9 +155,17 @@ def load_covariance(var_file_dict, out_dimension_dict):
     return  var
 
 
+def save_training_checkpoint(checkpoint, checkpoint_file):
+    ## write a temporary file first, so that a job killed while saving keeps its previous checkpoint
+    temp_file = checkpoint_file + '.tmp'
+    with open(temp_file, 'wb') as fid:
+        pickle.dump(checkpoint, fid, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(temp_file, checkpoint_file)
+
+
 def train_DNN(train_xy_file_list, valid_xy_file_list, \
               nnets_file_name, n_ins, n_outs, ms_outs, hyper_params, buffer_size, plot=False, var_dict=None,
-              cmp_mean_vector = None, cmp_std_vector = None, init_dnn_model_file = None):
+              cmp_mean_vector = None, cmp_std_vector = None, init_dnn_model_file = None, packed_corpus_files = None, resume = False):
 
     # get loggers for this function
     # this one writes to both console and file
@@ -206,27 +220,46 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
     (train_x_file_list, train_y_file_list) = train_xy_file_list
     (valid_x_file_list, valid_y_file_list) = valid_xy_file_list
 
+    ## read the features from the packed training and validation corpora rather than file by file
+    train_corpus = None
+    valid_corpus = None
+    if packed_corpus_files:
+        train_corpus = PackedCorpus(packed_corpus_files[0])
+        valid_corpus = PackedCorpus(packed_corpus_files[1])
+
     logger.debug('Creating training   data provider')
     train_data_reader = ListDataProvider(x_file_list = train_x_file_list, y_file_list = train_y_file_list,
                             n_ins = n_ins, n_outs = n_outs, buffer_size = buffer_size, 
-                            sequential = sequential_training, shuffle = True)
+                            sequential = sequential_training, shuffle = True, packed_corpus = train_corpus,
+                            shuffle_seed = cfg.shuffle_seed, shuffle_pool_size = cfg.shuffle_pool_size)
+    ## blocks of frames come in file order, and are trained in the order of their shuffle index
+    train_data_reader.shuffle_by_index = not sequential_training
 
     logger.debug('Creating validation data provider')
     valid_data_reader = ListDataProvider(x_file_list = valid_x_file_list, y_file_list = valid_y_file_list,
                             n_ins = n_ins, n_outs = n_outs, buffer_size = buffer_size, 
-                            sequential = sequential_training, shuffle = False)
+                            sequential = sequential_training, shuffle = False, packed_corpus = valid_corpus)
 
     if cfg.rnn_batch_training:
-        train_data_reader.set_rnn_params(training_algo=cfg.training_algo, batch_size=cfg.batch_size, seq_length=cfg.seq_length, merge_size=cfg.merge_size, bucket_range=cfg.bucket_range)
+        train_data_reader.set_rnn_params(training_algo=cfg.training_algo, batch_size=cfg.batch_size, seq_length=cfg.seq_length, merge_size=cfg.merge_size, bucket_range=cfg.bucket_range,
+                                         length_index_file=os.path.join(cfg.inter_data_dir, 'file_lengths.json'), batch_frames=cfg.batch_frames)
         valid_data_reader.reshape_input_output()
     
     shared_train_set_xy, temp_train_set_x, temp_train_set_y = train_data_reader.load_one_partition()
     train_set_x, train_set_y = shared_train_set_xy
+    train_set_index = None
+    if train_data_reader.shuffle_by_index:
+        train_set_index = theano.shared(train_data_reader.shuffle_index, name='index', borrow=True)
     shared_valid_set_xy, temp_valid_set_x, temp_valid_set_y = valid_data_reader.load_one_partition()
     valid_set_x, valid_set_y = shared_valid_set_xy
-    train_data_reader.reset()
+    train_data_reader.reset(new_epoch = False)
     valid_data_reader.reset()
 
+    ## load the next training partition in the background while the current one trains
+    if cfg.prefetch_partitions > 0:
+        train_data_reader = PrefetchingDataProvider(train_data_reader, queue_depth = cfg.prefetch_partitions,
+                                                    memory_budget = cfg.prefetch_memory_budget)
+
 
     ##temporally we use the training set as pretrain_set_x.
     ##we need to support any data for pretraining
@@ -261,7 +294,7 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
         logger.info('load parameters from existing model: %s' %(init_dnn_model_file))
         if not os.path.isfile(init_dnn_model_file):
             sys.exit('Model file %s does not exist'%(init_dnn_model_file))
-        existing_dnn_model = pickle.load(open(init_dnn_model_file, 'rb'))
+        existing_dnn_model = load_model(init_dnn_model_file)
         if not use_lhuc and not len(existing_dnn_model.params) == len(dnn_model.params):
             sys.exit('Old and new models have different numbers of weight matrices')
         elif use_lhuc and len(dnn_model.params) < len(existing_dnn_model.params):
@@ -283,7 +316,18 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
                     sys.exit('old and new weight matrices have different shapes')
                 k = k + 1        
     train_fn, valid_fn = dnn_model.build_finetune_functions(
-                    (train_set_x, train_set_y), (valid_set_x, valid_set_y), use_lhuc, layer_index=cfg.freeze_layers)  #, batch_size=batch_size
+                    (train_set_x, train_set_y), (valid_set_x, valid_set_y), use_lhuc, layer_index=cfg.freeze_layers, minibatch_slices=True,
+                    train_shared_index=train_set_index)
+
+    ## share each minibatch between several processes, for frame-level training on CPU
+    data_parallel_trainer = None
+    if cfg.training_workers != 1:
+        if sequential_training:
+            logger.warning('data-parallel training is only available for frame-level training: using one process')
+        else:
+            data_parallel_trainer = DataParallelTrainer(dnn_model, n_ins, n_outs, buffer_size, num_workers = cfg.training_workers,
+                                                        use_lhuc = use_lhuc, layer_index = cfg.freeze_layers)
+
     logger.info('fine-tuning the %s model' %(model_type))
 
     start_time = time.time()
@@ -302,36 +346,94 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
     previous_finetune_lr = finetune_lr
 
     epoch = 0
+
+    ## everything needed to carry on training from where it was stopped: the network, the optimizer,
+    ## the schedule of the learning rate and early stopping, the position in the training data and the random generators
+    checkpoint_file = nnets_file_name + '.checkpoint'
+    checkpoint_interval = cfg.checkpoint_interval * 60
+    def make_checkpoint(in_epoch, finished = False):
+        return  {'epoch': epoch, 'in_epoch': in_epoch, 'finished': finished,
+                 'params': [param.get_value() for param in dnn_model.params],
+                 'training_state': dnn_model.get_training_state(),
+                 'current_finetune_lr': current_finetune_lr, 'current_momentum': current_momentum,
+                 'previous_finetune_lr': previous_finetune_lr, 'best_validation_loss': best_validation_loss,
+                 'previous_loss': previous_loss, 'early_stop': early_stop, 'val_loss_counter': val_loss_counter,
+                 'train_error': list(train_error) if in_epoch else [], 'epoch_time': time.time() - sub_start_time if in_epoch else 0.0,
+                 'reader_state': train_data_reader.get_state(),
+                 'numpy_random_state': numpy.random.get_state(), 'random_state': random.getstate()}
+
+    resume_in_epoch = False
+    if resume and os.path.isfile(checkpoint_file):
+        logger.info('resuming training from checkpoint %s' %(checkpoint_file))
+        with open(checkpoint_file, 'rb') as fid:
+            checkpoint = pickle.load(fid)
+
+        for param, value in zip(dnn_model.params, checkpoint['params']):
+            param.set_value(value)
+        dnn_model.set_training_state(checkpoint['training_state'])
+        if data_parallel_trainer is not None:
+            data_parallel_trainer.publish_params()
+
+        epoch = checkpoint['epoch']
+        current_finetune_lr = checkpoint['current_finetune_lr']
+        current_momentum = checkpoint['current_momentum']
+        previous_finetune_lr = checkpoint['previous_finetune_lr']
+        best_validation_loss = checkpoint['best_validation_loss']
+        previous_loss = checkpoint['previous_loss']
+        early_stop = checkpoint['early_stop']
+        val_loss_counter = checkpoint['val_loss_counter']
+        train_error = checkpoint['train_error']
+        sub_start_time = time.time() - checkpoint['epoch_time']
+
+        train_data_reader.set_state(checkpoint['reader_state'])
+        numpy.random.set_state(checkpoint['numpy_random_state'])
+        random.setstate(checkpoint['random_state'])
+
+        resume_in_epoch = checkpoint['in_epoch']
+        if checkpoint['finished']:
+            logger.info('training had already finished')
+            epoch = training_epochs
+        elif resume_in_epoch:
+            logger.info('carrying on with epoch %i' %(epoch))
+    elif resume:
+        logger.warning('no checkpoint found at %s: training from the start' %(checkpoint_file))
+
+    last_checkpoint_time = time.time()
+
     while (epoch < training_epochs):
-        epoch = epoch + 1
-        
-        if lr_decay==0:
-            # fixed learning rate 
-            reduce_lr = False
-        elif lr_decay<0:
-            # exponential decay
-            reduce_lr = False if epoch <= warmup_epoch else True
-        elif val_loss_counter > 0:
-            # linear decay
-            reduce_lr = False
-            if val_loss_counter%lr_decay==0:
-                reduce_lr = True
-                val_loss_counter = 0
+        if resume_in_epoch:
+            ## the learning rate for this epoch came with the checkpoint
+            resume_in_epoch = False
         else:
-            # no decay
-            reduce_lr = False
+            epoch = epoch + 1
+
+            if lr_decay==0:
+                # fixed learning rate 
+                reduce_lr = False
+            elif lr_decay<0:
+                # exponential decay
+                reduce_lr = False if epoch <= warmup_epoch else True
+            elif val_loss_counter > 0:
+                # linear decay
+                reduce_lr = False
+                if val_loss_counter%lr_decay==0:
+                    reduce_lr = True
+                    val_loss_counter = 0
+            else:
+                # no decay
+                reduce_lr = False
 
-        if reduce_lr:
-            current_finetune_lr = previous_finetune_lr * 0.5
-            current_momentum    = momentum
-        else:
-            current_finetune_lr = previous_finetune_lr
-            current_momentum    = warmup_momentum
-        
-        previous_finetune_lr = current_finetune_lr
+            if reduce_lr:
+                current_finetune_lr = previous_finetune_lr * 0.5
+                current_momentum    = momentum
+            else:
+                current_finetune_lr = previous_finetune_lr
+                current_momentum    = warmup_momentum
+
+            previous_finetune_lr = current_finetune_lr
 
-        train_error = []
-        sub_start_time = time.time()
+            train_error = []
+            sub_start_time = time.time()
 
         logger.debug("training params -- learning rate: %f, early_stop: %d/%d" % (current_finetune_lr, early_stop, early_stop_epoch))
         while (not train_data_reader.is_finish()):
@@ -343,16 +445,34 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
             if sequential_training == True:
                 batch_size = temp_train_set_x.shape[0]
 
-            n_train_batches = temp_train_set_x.shape[0] // batch_size
-            for index in range(n_train_batches):
-                ## send a batch to the shared variable, rather than pass the batch size and batch index to the finetune function
-                train_set_x.set_value(numpy.asarray(temp_train_set_x[index*batch_size:(index + 1)*batch_size], dtype=theano.config.floatX), borrow=True)
-                train_set_y.set_value(numpy.asarray(temp_train_set_y[index*batch_size:(index + 1)*batch_size], dtype=theano.config.floatX), borrow=True)
+            n_train_frames = temp_train_set_x.shape[0]
+            if train_set_index is not None:
+                n_train_frames = len(train_data_reader.shuffle_index)
 
-                this_train_error = train_fn(current_finetune_lr, current_momentum)
+            if data_parallel_trainer is not None:
+                data_parallel_trainer.set_partition(temp_train_set_x, temp_train_set_y, train_data_reader.shuffle_index)
+                train_minibatch = data_parallel_trainer.train_minibatch
+            else:
+                ## send the whole partition to the shared variables once; the finetune function slices out each batch
+                train_set_x.set_value(numpy.asarray(temp_train_set_x, dtype=theano.config.floatX), borrow=True)
+                train_set_y.set_value(numpy.asarray(temp_train_set_y, dtype=theano.config.floatX), borrow=True)
+                if train_set_index is not None:
+                    train_set_index.set_value(train_data_reader.shuffle_index, borrow=True)
+                train_minibatch = train_fn
+
+            n_train_batches = n_train_frames // batch_size
+            for index in range(n_train_batches):
+                this_train_error = train_minibatch(current_finetune_lr, current_momentum, index*batch_size, (index + 1)*batch_size)
 
                 train_error.append(this_train_error)
 
+            if checkpoint_interval > 0 and time.time() - last_checkpoint_time >= checkpoint_interval and not train_data_reader.is_finish():
+                save_training_checkpoint(make_checkpoint(in_epoch = True), checkpoint_file)
+                last_checkpoint_time = time.time()
+
+        if cfg.rnn_batch_training:
+            logger.info('padding efficiency %.1f%% (frames of speech in the padded training batches)' % (100.0 * train_data_reader.get_padding_efficiency()))
+
         train_data_reader.reset()
 
         logger.debug('calculating validation loss')
@@ -382,7 +502,10 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
             plotlogger.save_plot('training convergence',title='Progress of training and validation error',xlabel='epochs',ylabel='error')
 
         if this_validation_loss < best_validation_loss:
-            pickle.dump(best_dnn_model, open(nnets_file_name, 'wb'))
+            if cfg.model_file_format == 'npz':
+                save_model_weights(best_dnn_model, nnets_file_name)
+            else:
+                pickle.dump(best_dnn_model, open(nnets_file_name, 'wb'))
 
             best_dnn_model = dnn_model
             best_validation_loss = this_validation_loss
@@ -394,6 +517,8 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
 
         if epoch > 15 and early_stop > early_stop_epoch:
             logger.debug('stopping early')
+            if checkpoint_interval > 0:
+                save_training_checkpoint(make_checkpoint(in_epoch = False, finished = True), checkpoint_file)
             break
 
         if math.isnan(this_validation_loss):
@@ -401,6 +526,16 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
 
         previous_loss = this_validation_loss
 
+        if checkpoint_interval > 0:
+            save_training_checkpoint(make_checkpoint(in_epoch = False, finished = epoch >= training_epochs), checkpoint_file)
+            last_checkpoint_time = time.time()
+
+    if cfg.prefetch_partitions > 0:
+        train_data_reader.stop()
+
+    if data_parallel_trainer is not None:
+        data_parallel_trainer.close()
+
     end_time = time.time()
 
     logger.info('overall  training time: %.2fm validation error %f' % ((end_time - start_time) / 60., best_validation_loss))
@@ -411,13 +546,16 @@ def train_DNN(train_xy_file_list, valid_xy_file_list, \
     return  best_validation_loss
 
 
-def dnn_generation(valid_file_list, nnets_file_name, n_ins, n_outs, out_file_list, reshape_io=False):
+def dnn_generation(valid_file_list, nnets_file_name, n_ins, n_outs, out_file_list, reshape_io=False, inference_engine='theano'):
     logger = logging.getLogger("dnn_generation")
     logger.debug('Starting dnn_generation')
 
     plotlogger = logging.getLogger("plotting")
 
-    dnn_model = pickle.load(open(nnets_file_name, 'rb'))
+    if inference_engine == 'numpy':
+        dnn_model = load_numpy_model(nnets_file_name)
+    else:
+        dnn_model = load_model(nnets_file_name)
 
     file_number = len(valid_file_list)
 
@@ -453,7 +591,7 @@ def dnn_hidden_generation(valid_file_list, nnets_file_name, n_ins, n_outs, out_f
 
     plotlogger = logging.getLogger("plotting")
 
-    dnn_model = pickle.load(open(nnets_file_name, 'rb'))
+    dnn_model = load_model(nnets_file_name)
 
     file_number = len(valid_file_list)
 
@@ -575,7 +713,10 @@ def main_function(cfg):
 
     assert cfg.label_style == 'HTS', 'Only HTS-style labels are now supported as input to Merlin'
 
-    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats)
+    label_cache_dir = cfg.label_cache_dir if cfg.label_cache_dir != "None" else None
+    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats,
+                                             label_cache_size=cfg.label_cache_size, label_cache_dir=label_cache_dir, label_cache_memory=cfg.label_cache_memory,
+                                             num_workers=cfg.label_normalisation_workers)
     add_feat_dim = sum(cfg.additional_features.values())
     lab_dim = label_normaliser.dimension + add_feat_dim + cfg.appended_input_dim
     if cfg.VoiceConversion:
@@ -635,7 +776,7 @@ def main_function(cfg):
 
                 binary_label_file_list = out_feat_file_list
 
-        remover = SilenceRemover(n_cmp = lab_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats)
+        remover = SilenceRemover(n_cmp = lab_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats, num_workers = cfg.silence_removal_workers)
         remover.remove_silence(binary_label_file_list, in_label_align_file_list, nn_label_file_list)
 
         min_max_normaliser = MinMaxNormalisation(feature_dimension = lab_dim, min_value = 0.01, max_value = 0.99)
@@ -644,13 +785,13 @@ def main_function(cfg):
         if cfg.GenTestList:
             min_max_normaliser.load_min_max_values(label_norm_file)
         else:
-            min_max_normaliser.find_min_max_values(nn_label_file_list[0:cfg.train_file_number])
+            min_max_normaliser.find_min_max_values(nn_label_file_list[0:cfg.train_file_number], num_workers=cfg.normalisation_workers)
 
         ### enforce silence such that the normalization runs without removing silence: only for final synthesis
         if cfg.GenTestList and cfg.enforce_silence:
-            min_max_normaliser.normalise_data(binary_label_file_list, nn_label_norm_file_list)
+            min_max_normaliser.normalise_data(binary_label_file_list, nn_label_norm_file_list, num_workers=cfg.normalisation_workers)
         else:
-            min_max_normaliser.normalise_data(nn_label_file_list, nn_label_norm_file_list)
+            min_max_normaliser.normalise_data(nn_label_file_list, nn_label_norm_file_list, num_workers=cfg.normalisation_workers)
 
 
 
@@ -706,7 +847,7 @@ def main_function(cfg):
 
         elif cfg.remove_silence_using_hts_labels: 
             ## back off to previous method using HTS labels:
-            remover = SilenceRemover(n_cmp = cfg.cmp_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats)
+            remover = SilenceRemover(n_cmp = cfg.cmp_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats, num_workers = cfg.silence_removal_workers)
             remover.remove_silence(nn_cmp_file_list, in_label_align_file_list, nn_cmp_file_list) # save to itself
 
     ### save acoustic normalisation information for normalising the features back
@@ -724,8 +865,8 @@ def main_function(cfg):
                 global_mean_vector, global_std_vector = normaliser.load_mean_std_values(norm_info_file)
             else:
                 ###calculate mean and std vectors on the training data, and apply on the whole dataset
-                global_mean_vector = normaliser.compute_mean(nn_cmp_file_list[0:cfg.train_file_number], 0, cfg.cmp_dim)
-                global_std_vector = normaliser.compute_std(nn_cmp_file_list[0:cfg.train_file_number], global_mean_vector, 0, cfg.cmp_dim)
+                global_mean_vector, global_std_vector = normaliser.compute_mean_std(nn_cmp_file_list[0:cfg.train_file_number], 0, cfg.cmp_dim,
+                                                                                   num_workers=cfg.normalisation_workers)
                 # for hmpd vocoder we don't need to normalize the 
                 # pdd values
                 if cfg.vocoder_type == 'hmpd':
@@ -744,7 +885,7 @@ def main_function(cfg):
                     logger.info('hmpd pdd values are not normalized since they are in 0 to 1')
                     global_mean_vector[:,stream_start_index['pdd']: stream_start_index['pdd'] + cfg.out_dimension_dict['pdd']] = 0
                     global_std_vector[:,stream_start_index['pdd']: stream_start_index['pdd'] + cfg.out_dimension_dict['pdd']] = 1
-            normaliser.feature_normalisation(nn_cmp_file_list, nn_cmp_norm_file_list)
+            normaliser.feature_normalisation(nn_cmp_file_list, nn_cmp_norm_file_list, num_workers=cfg.normalisation_workers)
             cmp_norm_info = numpy.concatenate((global_mean_vector, global_std_vector), axis=0)
 
         elif cfg.output_feature_normalisation == 'MINMAX':
@@ -752,8 +893,8 @@ def main_function(cfg):
             if cfg.GenTestList:
                 min_max_normaliser.load_min_max_values(norm_info_file)
             else:
-                min_max_normaliser.find_min_max_values(nn_cmp_file_list[0:cfg.train_file_number])
-            min_max_normaliser.normalise_data(nn_cmp_file_list, nn_cmp_norm_file_list)
+                min_max_normaliser.find_min_max_values(nn_cmp_file_list[0:cfg.train_file_number], num_workers=cfg.normalisation_workers)
+            min_max_normaliser.normalise_data(nn_cmp_file_list, nn_cmp_norm_file_list, num_workers=cfg.normalisation_workers)
 
             cmp_min_vector = min_max_normaliser.min_vector
             cmp_max_vector = min_max_normaliser.max_vector
@@ -798,6 +939,16 @@ def main_function(cfg):
 
     logger.info('label dimension is %d' % lab_dim)
 
+    ### pack the normalised training and validation data, one file per split
+    packed_corpus_files = (file_paths.get_packed_corpus_file_name('train'), file_paths.get_packed_corpus_file_name('valid'))
+    if cfg.PACKDATA:
+        logger.info('packing the training and validation data into %s' % (file_paths.packed_corpus_dir))
+        pack_corpus(train_x_file_list, train_y_file_list, lab_dim, cfg.cmp_dim, packed_corpus_files[0])
+        pack_corpus(valid_x_file_list, valid_y_file_list, lab_dim, cfg.cmp_dim, packed_corpus_files[1])
+
+    if not cfg.use_packed_corpus:
+        packed_corpus_files = None
+
     combined_model_arch = str(len(hidden_layer_size))
     for hid_size in hidden_layer_size:
         combined_model_arch += '_' + str(hid_size)
@@ -818,6 +969,9 @@ def main_function(cfg):
         cfg.out_feat_dir  = nn_cmp_norm_dir
         cfg.pred_feat_dir = gen_dir
 
+        if cfg.use_packed_corpus:
+            cfg.packed_corpus_dir = file_paths.packed_corpus_dir
+
         if cfg.GenTestList and cfg.test_synth_dir!="None":
             cfg.inp_feat_dir  = cfg.test_synth_dir
             cfg.pred_feat_dir = cfg.test_synth_dir
@@ -871,7 +1025,8 @@ def main_function(cfg):
                       nnets_file_name = nnets_file_name, \
                       n_ins = lab_dim, n_outs = cfg.cmp_dim, ms_outs = cfg.multistream_outs, \
                       hyper_params = cfg.hyper_params, buffer_size = cfg.buffer_size, plot = cfg.plot, var_dict = var_dict,
-                      cmp_mean_vector = cmp_mean_vector, cmp_std_vector = cmp_std_vector,init_dnn_model_file=cfg.start_from_trained_model)
+                      cmp_mean_vector = cmp_mean_vector, cmp_std_vector = cmp_std_vector,init_dnn_model_file=cfg.start_from_trained_model,
+                      packed_corpus_files = packed_corpus_files, resume = cfg.resume_training)
         except KeyboardInterrupt:
             logger.critical('train_DNN interrupted via keyboard')
             # Could 'raise' the exception further, but that causes a deep traceback to be printed
@@ -946,7 +1101,7 @@ def main_function(cfg):
             tf_instance.test_tensorflow_model()
         else:
             reshape_io = True if cfg.rnn_batch_training else False
-            dnn_generation(test_x_file_list, nnets_file_name, lab_dim, cfg.cmp_dim, gen_file_list, reshape_io)
+            dnn_generation(test_x_file_list, nnets_file_name, lab_dim, cfg.cmp_dim, gen_file_list, reshape_io, inference_engine=cfg.inference_engine)
 
         logger.debug('denormalising generated output using method %s' % cfg.output_feature_normalisation)
 
@@ -959,11 +1114,11 @@ def main_function(cfg):
 
         if cfg.output_feature_normalisation == 'MVN':
             denormaliser = MeanVarianceNorm(feature_dimension = cfg.cmp_dim)
-            denormaliser.feature_denormalisation(gen_file_list, gen_file_list, cmp_min_vector, cmp_max_vector)
+            denormaliser.feature_denormalisation(gen_file_list, gen_file_list, cmp_min_vector, cmp_max_vector, num_workers=cfg.normalisation_workers)
 
         elif cfg.output_feature_normalisation == 'MINMAX':
             denormaliser = MinMaxNormalisation(cfg.cmp_dim, min_value = 0.01, max_value = 0.99, min_vector = cmp_min_vector, max_vector = cmp_max_vector)
-            denormaliser.denormalise_data(gen_file_list, gen_file_list)
+            denormaliser.denormalise_data(gen_file_list, gen_file_list, num_workers=cfg.normalisation_workers)
         else:
             logger.critical('denormalising method %s is not supported!\n' %(cfg.output_feature_normalisation))
             raise
@@ -971,7 +1126,7 @@ def main_function(cfg):
         if cfg.AcousticModel:
             ##perform MLPG to smooth parameter trajectory
             ## lf0 is included, the output features much have vuv.
-            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features, enforce_silence = cfg.enforce_silence)
+            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features, enforce_silence = cfg.enforce_silence, num_workers = cfg.parameter_generation_workers)
             generator.acoustic_decomposition(gen_file_list, cfg.cmp_dim, cfg.out_dimension_dict, cfg.file_extension_dict, var_file_dict, do_MLPG=cfg.do_MLPG, cfg=cfg)
 
         if cfg.DurationModel:
@@ -987,6 +1142,19 @@ def main_function(cfg):
             label_modifier.modify_duration_labels(in_gen_label_align_file_list, gen_dur_list, gen_label_list)
 
 
+    ### global variance statistics of the natural training features and of the generated features, for apply_GV
+    if cfg.GENGV:
+        logger.info('computing global variance statistics in %s' % (cfg.GV_dir))
+        if not os.path.exists(cfg.GV_dir):
+            os.makedirs(cfg.GV_dir)
+
+        for stream in cfg.gv_streams:
+            ref_file_list = prepare_file_path_list(file_id_list[0:cfg.train_file_number], cfg.in_dir_dict[stream], cfg.file_extension_dict[stream], False)
+            gen_stream_file_list = prepare_file_path_list(gen_file_id_list, gen_dir, cfg.file_extension_dict[stream], False)
+
+            global_variance = GlobalVariance.compute(ref_file_list, gen_stream_file_list, cfg.in_dimension_dict[stream], voiced_only = (stream == 'lf0'))
+            global_variance.save(cfg.GV_dir, stream)
+
     ### generate wav
     if cfg.GENWAV:
         logger.info('reconstructing waveform(s)')
@@ -1018,7 +1186,7 @@ def main_function(cfg):
             trim_silence(untrimmed_reference_data, ref_dur_list, cfg.dur_dim, \
                                 untrimmed_test_labels, lab_dim, silence_feature)
         else:
-            remover = SilenceRemover(n_cmp = cfg.dur_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features)
+            remover = SilenceRemover(n_cmp = cfg.dur_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, num_workers = cfg.silence_removal_workers)
             remover.remove_silence(in_file_list_dict['dur'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_dur_list)
 
         valid_dur_rmse, valid_dur_corr = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.dur_ext, cfg.dur_dim)
@@ -1086,7 +1254,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_mgc_list, cfg.mgc_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.mgc_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.mgc_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['mgc'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_mgc_list)
             else:
                 ref_data_dir = os.path.join(data_dir, 'mgc')
@@ -1102,7 +1270,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_mvf_list, cfg.mvf_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.mvf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.mvf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['mvf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_mvf_list)
             else:
                 ref_data_dir = os.path.join(data_dir, 'mvf')
@@ -1118,7 +1286,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_lf0_list, cfg.lf0_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.lf0_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.lf0_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['lf0'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_lf0_list)
             else:
                 if cfg.vocoder_type == 'MAGPHASE':
@@ -1130,7 +1298,7 @@ def main_function(cfg):
       
         if 'mag' in cfg.in_dimension_dict:
             if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.mag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.mag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['mag'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_mag_list)
             else:
                 ref_data_dir = os.path.join(data_dir, 'feats')
@@ -1141,7 +1309,7 @@ def main_function(cfg):
 
         if 'real' in cfg.in_dimension_dict:
             if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.real_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.real_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['real'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_real_list)
             else:
                 ref_data_dir = os.path.join(data_dir, 'feats')
@@ -1152,7 +1320,7 @@ def main_function(cfg):
 
         if 'imag' in cfg.in_dimension_dict:
             if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.imag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.imag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['imag'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_imag_list)
             else:
                 ref_data_dir = os.path.join(data_dir, 'feats')
@@ -1167,7 +1335,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_lsf_list, cfg.lsf_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             else:
-                remover = SilenceRemover(n_cmp = cfg.lsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.lsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['lsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_lsf_list)
             valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.lsf_ext, cfg.lsf_dim)
             test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.lsf_ext, cfg.lsf_dim)
@@ -1178,7 +1346,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_slsf_list, cfg.slsf_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             else:
-                remover = SilenceRemover(n_cmp = cfg.slsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.slsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['slsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_slsf_list)
             valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.slsf_ext, cfg.slsf_dim)
             test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.slsf_ext, cfg.slsf_dim)
@@ -1189,7 +1357,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_hnr_list, cfg.hnr_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             else:
-                remover = SilenceRemover(n_cmp = cfg.hnr_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.hnr_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['hnr'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_hnr_list)
             valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.hnr_ext, cfg.hnr_dim)
             test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.hnr_ext, cfg.hnr_dim)
@@ -1200,7 +1368,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_gain_list, cfg.gain_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             else:
-                remover = SilenceRemover(n_cmp = cfg.gain_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.gain_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['gain'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_gain_list)
             valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.gain_ext, cfg.gain_dim)
             test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.gain_ext, cfg.gain_dim)
@@ -1211,7 +1379,7 @@ def main_function(cfg):
                 trim_silence(untrimmed_reference_data, ref_pdd_list, cfg.pdd_dim, \
                                     untrimmed_test_labels, lab_dim, silence_feature)
             else:
-                remover = SilenceRemover(n_cmp = cfg.pdd_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+                remover = SilenceRemover(n_cmp = cfg.pdd_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, num_workers = cfg.silence_removal_workers)
                 remover.remove_silence(in_file_list_dict['pdd'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_pdd_list)
             valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.pdd_ext, cfg.pdd_dim)
             test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.pdd_ext, cfg.pdd_dim)
@@ -1254,14 +1422,21 @@ if __name__ == '__main__':
     logger = logging.getLogger("main")
 
 
-    if len(sys.argv) != 2:
-        logger.critical('usage: run_merlin.sh [config file name]')
+    args = sys.argv[1:]
+    resume_training = '--resume' in args
+    if resume_training:
+        args.remove('--resume')
+
+    if len(args) != 1:
+        logger.critical('usage: run_merlin.sh [--resume] [config file name]')
         sys.exit(1)
 
-    config_file = sys.argv[1]
+    config_file = args[0]
 
     config_file = os.path.abspath(config_file)
     cfg.configure(config_file)
+    if resume_training:
+        cfg.resume_training = True
 
 
     logger.info('Installation information:')
@@ -43,6 +43,7 @@ import time
 import tensorflow as tf
 from tensorflow_lib import configuration
 from tensorflow_lib import data_utils
+from io_funcs.packed_corpus import PackedCorpus
 from tensorflow_lib.train import TrainTensorflowModels,Train_Encoder_Decoder_Models
 
 class TensorflowClass(object):
@@ -115,6 +116,11 @@ class TensorflowClass(object):
 
         #### Generate only test list ####
         self.GenTestList = cfg.GenTestList
+
+        #### Read train data from a packed corpus ####
+        self.train_corpus = None
+        if cfg.packed_corpus_dir != 'None':
+            self.train_corpus = PackedCorpus(os.path.join(cfg.packed_corpus_dir, 'train.pack'))
         
         ###################################################
         ####### End of user-defined conf variables ########
@@ -161,7 +167,7 @@ class TensorflowClass(object):
         else:
             print('preparing train_x, train_y from input and output feature files...')
             train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,\
-                    self.inp_dim, self.out_dim, sequential_training=True if self.sequential_training or self.encoder_decoder else False)
+                    self.inp_dim, self.out_dim, sequential_training=True if self.sequential_training or self.encoder_decoder else False, packed_corpus=self.train_corpus)
 
             print('computing norm stats for train_x...')
             inp_scaler = data_utils.compute_norm_stats(train_x, self.inp_stats_file, method=self.inp_norm)
@@ -174,7 +180,7 @@ class TensorflowClass(object):
                  #### load the data ####
 
         train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,
-                     self.inp_dim, self.out_dim, sequential_training=True if self.sequential_training or self.encoder_decoder else False)
+                     self.inp_dim, self.out_dim, sequential_training=True if self.sequential_training or self.encoder_decoder else False, packed_corpus=self.train_corpus)
                 #### normalize the data ####
         data_utils.norm_data(train_x, self.inp_scaler, sequential_training=True if self.sequential_training or self.encoder_decoder else False)
         data_utils.norm_data(train_y, self.out_scaler, sequential_training=True if self.sequential_training or self.encoder_decoder else False)
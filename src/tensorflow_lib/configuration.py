@@ -139,6 +139,7 @@ class configuration(object):
 
             ('inp_feat_dir', self.def_inp_dir, 'Paths', 'inp_feat'),
             ('out_feat_dir', self.def_out_dir, 'Paths', 'out_feat'),
+            ('packed_corpus_dir', 'None', 'Paths', 'packed_corpus'),
 
             ('model_dir', self.model_dir, 'Paths', 'models'),
             ('stats_dir', self.stats_dir, 'Paths', 'stats'),
@@ -0,0 +1,221 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import pickle
+import ctypes
+import logging
+import traceback
+import multiprocessing
+
+import numpy
+import theano
+
+from training_schemes.shared_parameters import shared_array, weighted_gradient, SharedParameterLayout
+
+
+def _data_parallel_worker(worker_index, model_string, use_lhuc, n_ins, n_outs, num_workers, buffers, connection):
+    ## each worker has its own copy of the network, whose parameters are views of the shared parameter buffer
+    (param_buffer, gradient_buffer, x_buffer, y_buffer, index_buffer) = buffers
+
+    try:
+        dnn_model = pickle.loads(model_string)
+        params = dnn_model.get_finetune_params(use_lhuc)
+
+        layout = SharedParameterLayout.from_params(params)
+        param_views = layout.param_views(param_buffer)
+        gradient_view = layout.gradient_matrix(gradient_buffer, num_workers)[worker_index]
+
+        train_set_x = theano.shared(numpy.zeros((1, n_ins), dtype=theano.config.floatX), name='x', borrow=True)
+        train_set_y = theano.shared(numpy.zeros((1, n_outs), dtype=theano.config.floatX), name='y', borrow=True)
+        train_set_index = theano.shared(numpy.zeros(1, dtype=numpy.int64), name='index', borrow=True)
+
+        gradient_fn = dnn_model.build_gradient_function((train_set_x, train_set_y), use_lhuc, train_set_index)
+        connection.send(('ready', ))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+        return
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        try:
+            if message[0] == 'partition':
+                (frame_number, index_length) = message[1:]
+                train_set_x.set_value(shared_array(x_buffer, frame_number * n_ins, (frame_number, n_ins)), borrow=True)
+                train_set_y.set_value(shared_array(y_buffer, frame_number * n_outs, (frame_number, n_outs)), borrow=True)
+                train_set_index.set_value(shared_array(index_buffer, index_length), borrow=True)
+            elif message[0] == 'step':
+                (start, end) = message[1:]
+                for param, param_view in zip(params, param_views):
+                    param.set_value(param_view, borrow=True)
+
+                outputs = gradient_fn(start, end)
+
+                for (gradient, offset, size) in zip(outputs[1:], layout.offsets, layout.sizes):
+                    gradient_view[offset:offset+size] = gradient.ravel()
+
+                connection.send(('step', end - start, float(outputs[0])))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+
+
+class DataParallelTrainer(object):
+    '''
+    Synchronous data-parallel training of a DeepRecurrentNetwork on CPU. Each minibatch is split between
+    worker processes, which compute the gradients of their share of the frames. The gradients are summed,
+    weighted by the number of frames, through shared memory, and the master applies the optimizer of the
+    network to them. The workers read the updated parameters and the training data from shared memory.
+
+    This is meant for frame-level training, where the frames of a minibatch are independent.
+    '''
+
+    def __init__(self, dnn_model, n_ins, n_outs, buffer_size, num_workers=0, use_lhuc=False, layer_index=0):
+        self.logger = logging.getLogger("DataParallelTrainer")
+
+        if num_workers <= 0:
+            num_workers = multiprocessing.cpu_count()
+        self.num_workers = num_workers
+
+        self.n_ins = n_ins
+        self.n_outs = n_outs
+        self.buffer_size = buffer_size
+
+        self.params = dnn_model.get_finetune_params(use_lhuc)
+        self.update_fn, self.gradients = dnn_model.build_gradient_update_function(use_lhuc, layer_index)
+
+        self.layout = SharedParameterLayout.from_params(self.params)
+
+        value_type = ctypes.c_float if theano.config.floatX == 'float32' else ctypes.c_double
+        self.param_buffer = multiprocessing.RawArray(value_type, self.layout.size)
+        self.gradient_buffer = multiprocessing.RawArray(value_type, self.layout.size * num_workers)
+        self.x_buffer = multiprocessing.RawArray(value_type, buffer_size * n_ins)
+        self.y_buffer = multiprocessing.RawArray(value_type, buffer_size * n_outs)
+        self.index_buffer = multiprocessing.RawArray(ctypes.c_int64, buffer_size)
+        buffers = (self.param_buffer, self.gradient_buffer, self.x_buffer, self.y_buffer, self.index_buffer)
+
+        self.param_views = self.layout.param_views(self.param_buffer)
+        self.gradient_matrix = self.layout.gradient_matrix(self.gradient_buffer, num_workers)
+        self.publish_params()
+
+        model_string = pickle.dumps(dnn_model)
+
+        self.connections = []
+        self.workers = []
+        for worker_index in range(num_workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_data_parallel_worker,
+                                             args=(worker_index, model_string, use_lhuc, n_ins, n_outs, num_workers, buffers, worker_connection))
+            worker.daemon = True
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+        for connection in self.connections:
+            self._receive(connection)
+
+        self.index_length = 0
+
+        self.logger.info('training with %d worker processes' % (num_workers))
+
+    def _receive(self, connection):
+        reply = connection.recv()
+        if reply[0] == 'error':
+            self.logger.critical('data-parallel worker failed:\n%s' % (reply[1]))
+            self.close()
+            raise RuntimeError('data-parallel worker failed')
+        return  reply
+
+    def publish_params(self):
+        '''
+        copy the current parameters of the network to the shared buffer read by the workers
+        '''
+        for param, param_view in zip(self.params, self.param_views):
+            param_view[:] = param.get_value(borrow=True)
+
+    def set_partition(self, temp_set_x, temp_set_y, shuffle_index=None):
+        '''
+        share a partition of training data with the workers. The minibatches are taken in the order of shuffle_index, if given.
+        '''
+        frame_number = temp_set_x.shape[0]
+        if shuffle_index is None:
+            shuffle_index = numpy.arange(frame_number)
+
+        shared_array(self.x_buffer, frame_number * self.n_ins, (frame_number, self.n_ins))[:] = temp_set_x
+        shared_array(self.y_buffer, frame_number * self.n_outs, (frame_number, self.n_outs))[:] = temp_set_y
+        shared_array(self.index_buffer, len(shuffle_index))[:] = shuffle_index
+        self.index_length = len(shuffle_index)
+
+        for connection in self.connections:
+            connection.send(('partition', frame_number, self.index_length))
+
+    def train_minibatch(self, learning_rate, momentum, start, end):
+        '''
+        train on the frames start to end of the partition, and return the training error
+        '''
+        bounds = numpy.linspace(start, end, self.num_workers + 1).astype(int)
+
+        active_workers = []
+        for worker_index, connection in enumerate(self.connections):
+            if bounds[worker_index + 1] > bounds[worker_index]:
+                connection.send(('step', int(bounds[worker_index]), int(bounds[worker_index + 1])))
+                active_workers.append(worker_index)
+
+        frame_numbers = numpy.zeros(len(active_workers))
+        errors = numpy.zeros(len(active_workers))
+        for i, worker_index in enumerate(active_workers):
+            (_, frame_numbers[i], errors[i]) = self._receive(self.connections[worker_index])
+
+        ## the network cost is a mean over frames, so the minibatch gradient is the frame-weighted mean of the shares
+        gradient, weights = weighted_gradient(self.gradient_matrix[active_workers], frame_numbers)
+
+        for shared_gradient, value in zip(self.gradients, self.layout.split(gradient)):
+            shared_gradient.set_value(numpy.asarray(value, dtype=theano.config.floatX), borrow=True)
+
+        self.update_fn(learning_rate, momentum)
+        self.publish_params()
+
+        return  numpy.dot(weights, errors)
+
+    def close(self):
+        for connection, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                connection.send(None)
+            worker.join()
@@ -0,0 +1,99 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+import numpy
+
+
+def shared_array(raw_array, length, shape=None):
+    ## numpy view of the first length values of a multiprocessing.RawArray
+    view = numpy.ctypeslib.as_array(raw_array)[0:length]
+    if shape is not None:
+        view = view.reshape(shape)
+    return  view
+
+
+def weighted_gradient(gradient_matrix, frame_numbers):
+    '''
+    combine the gradients computed by several workers, one per row of gradient_matrix, each over frame_numbers frames.
+    The network cost is a mean over frames, so the gradient of the whole minibatch is the frame-weighted mean of the
+    rows. Returns the gradient and the weights, which also combine the errors of the workers.
+    '''
+    frame_numbers = numpy.asarray(frame_numbers, dtype=numpy.float64)
+    weights = frame_numbers / frame_numbers.sum()
+    return  numpy.dot(weights, gradient_matrix), weights
+
+
+class SharedParameterLayout(object):
+    '''
+    Layout of the parameters of a network in shared memory for data-parallel training: the parameters are flattened
+    one after the other into one buffer, and each worker has a row of the same size in the gradient buffer.
+    '''
+
+    def __init__(self, shapes):
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.sizes = [int(numpy.prod(shape)) for shape in self.shapes]
+        self.offsets = [int(offset) for offset in numpy.cumsum([0] + self.sizes[:-1])]
+        self.size = sum(self.sizes)
+
+    @classmethod
+    def from_params(cls, params):
+        '''
+        the layout of a list of theano shared variables, e.g. the finetune parameters of a network
+        '''
+        return  cls([param.get_value(borrow=True).shape for param in params])
+
+    def param_views(self, param_buffer):
+        '''
+        return a view of param_buffer for each parameter, in its shape
+        '''
+        flat_view = shared_array(param_buffer, self.size)
+        return  [flat_view[offset:offset+size].reshape(shape) for (offset, size, shape) in zip(self.offsets, self.sizes, self.shapes)]
+
+    def gradient_matrix(self, gradient_buffer, num_workers):
+        '''
+        return a view of gradient_buffer with the flattened gradients of each worker in a row
+        '''
+        return  shared_array(gradient_buffer, self.size * num_workers, (num_workers, self.size))
+
+    def split(self, flat_values):
+        '''
+        return the values of each parameter, in its shape, from a flat vector such as a row of the gradient matrix
+        '''
+        return  [flat_values[offset:offset+size].reshape(shape) for (offset, size, shape) in zip(self.offsets, self.sizes, self.shapes)]
@@ -59,6 +59,7 @@ class FilePaths(object):
     self.nn_cmp_norm_dir = os.path.join(
         self.inter_data_dir, 'nn_norm' + self.cfg.combined_feature_name + '_' +
         str(self.cfg.cmp_dim))
+    self.packed_corpus_dir = os.path.join(self.inter_data_dir, 'packed_corpus')
     self.model_dir = os.path.join(self.cfg.work_dir, 'nnets_model')
     self.gen_dir = os.path.join(self.cfg.work_dir, 'gen')
     self.file_id_list = read_file_list(self.cfg.file_id_scp)
@@ -88,6 +89,9 @@ class FilePaths(object):
     self.nn_cmp_norm_file_list = prepare_file_path_list(
         self.file_id_list, self.nn_cmp_norm_dir, self.cfg.cmp_ext)
 
+  def get_packed_corpus_file_name(self, split):
+    return os.path.join(self.packed_corpus_dir, split + '.pack')
+
   def get_nnets_file_name(self):
     return '%s/%s.model' % (self.model_dir, self.cfg.model_file_name)
 
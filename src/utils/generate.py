@@ -44,9 +44,14 @@ This script assumes c-version STRAIGHT which is not available to public. Please
 own vocoder to replace this script.
 '''
 import sys, os, subprocess, glob, subprocess
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 #from utils import GlobalCfg
 
 from io_funcs.binary_io import  BinaryIOCollection
+from utils.mcep_postfilter import post_filter_mgc
+from frontend.global_variance import GlobalVariance
 import numpy as np
 
 import logging
@@ -130,168 +135,178 @@ def erb_alpha(sr):
     return 0.5941*np.sqrt(np.arctan(0.1418*sr/1000.0))+0.03237
 
 def post_filter(mgc_file_in, mgc_file_out, mgc_dim, pf_coef, fw_coef, co_coef, fl_coef, gen_dir, cfg):
+    '''
+    Mel-cepstral post-filtering of one file. This is done in-process (see utils.mcep_postfilter), without
+    temporary files, so gen_dir and cfg are no longer used.
+    '''
 
-    SPTK = cfg.SPTK
-
-    line = "echo 1 1 "
-    for i in range(2, mgc_dim):
-        line = line + str(pf_coef) + " "
-
-    run_process('{line} | {x2x} +af > {weight}'
-                .format(line=line, x2x=SPTK['X2X'], weight=os.path.join(gen_dir, 'weight')))
-
-    run_process('{freqt} -m {order} -a {fw} -M {co} -A 0 < {mgc} | {c2acr} -m {co} -M 0 -l {fl} > {base_r0}'
-                .format(freqt=SPTK['FREQT'], order=mgc_dim-1, fw=fw_coef, co=co_coef, mgc=mgc_file_in, c2acr=SPTK['C2ACR'], fl=fl_coef, base_r0=mgc_file_in+'_r0'))
-
-    run_process('{vopr} -m -n {order} < {mgc} {weight} | {freqt} -m {order} -a {fw} -M {co} -A 0 | {c2acr} -m {co} -M 0 -l {fl} > {base_p_r0}'
-                .format(vopr=SPTK['VOPR'], order=mgc_dim-1, mgc=mgc_file_in, weight=os.path.join(gen_dir, 'weight'),
-                        freqt=SPTK['FREQT'], fw=fw_coef, co=co_coef,
-                        c2acr=SPTK['C2ACR'], fl=fl_coef, base_p_r0=mgc_file_in+'_p_r0'))
-
-    run_process('{vopr} -m -n {order} < {mgc} {weight} | {mc2b} -m {order} -a {fw} | {bcp} -n {order} -s 0 -e 0 > {base_b0}'
-                .format(vopr=SPTK['VOPR'], order=mgc_dim-1, mgc=mgc_file_in, weight=os.path.join(gen_dir, 'weight'),
-                        mc2b=SPTK['MC2B'], fw=fw_coef,
-                        bcp=SPTK['BCP'], base_b0=mgc_file_in+'_b0'))
-
-    run_process('{vopr} -d < {base_r0} {base_p_r0} | {sopr} -LN -d 2 | {vopr} -a {base_b0} > {base_p_b0}'
-                .format(vopr=SPTK['VOPR'], base_r0=mgc_file_in+'_r0', base_p_r0=mgc_file_in+'_p_r0',
-                        sopr=SPTK['SOPR'],
-                        base_b0=mgc_file_in+'_b0', base_p_b0=mgc_file_in+'_p_b0'))
+    io_funcs = BinaryIOCollection()
 
-    run_process('{vopr} -m -n {order} < {mgc} {weight} | {mc2b} -m {order} -a {fw} | {bcp} -n {order} -s 1 -e {order} | {merge} -n {order2} -s 0 -N 0 {base_p_b0} | {b2mc} -m {order} -a {fw} > {base_p_mgc}'
-                .format(vopr=SPTK['VOPR'], order=mgc_dim-1, mgc=mgc_file_in, weight=os.path.join(gen_dir, 'weight'),
-                        mc2b=SPTK['MC2B'],  fw=fw_coef,
-                        bcp=SPTK['BCP'],
-                        merge=SPTK['MERGE'], order2=mgc_dim-2, base_p_b0=mgc_file_in+'_p_b0',
-                        b2mc=SPTK['B2MC'], base_p_mgc=mgc_file_out))
+    mgc, frame_number = io_funcs.load_binary_file_frame(mgc_file_in, mgc_dim)
+    io_funcs.array_to_binary_file(post_filter_mgc(mgc, pf_coef, fw_coef, co_coef, fl_coef), mgc_file_out)
 
     return
 
-def wavgen_straight_type_vocoder(gen_dir, file_id_list, cfg, logger):
+def wavgen_straight_type_utterance(gen_dir, filename, cfg, fw_coef, gv_stats=None):
     '''
-    Waveform generation with STRAIGHT or WORLD vocoders.
-    (whose acoustic parameters are: mgc, bap, and lf0)
+    Waveform generation of one utterance with STRAIGHT or WORLD vocoders.
+    All the files are given by their absolute paths in gen_dir, so that utterances can be generated concurrently.
+    gv_stats maps streams (mgc, lf0 or bap) to their frontend.global_variance.GlobalVariance.
     '''
 
     SPTK     = cfg.SPTK
-#    NND      = cfg.NND
     STRAIGHT = cfg.STRAIGHT
     WORLD    = cfg.WORLD
 
-    ## to be moved
-    pf_coef = cfg.pf_coef
-    if isinstance(cfg.fw_alpha, str):
-        if cfg.fw_alpha=='Bark':
-            fw_coef = bark_alpha(cfg.sr)
-        elif cfg.fw_alpha=='ERB':
-            fw_coef = bark_alpha(cfg.sr)
-        else:
-            raise ValueError('cfg.fw_alpha='+cfg.fw_alpha+' not implemented, the frequency warping coefficient "fw_coef" cannot be deduced.')
-    else:
-        fw_coef = cfg.fw_alpha
-    co_coef = cfg.co_coef
-    fl_coef = cfg.fl
-
-    if cfg.apply_GV:
-        io_funcs = BinaryIOCollection()
-
-        logger.info('loading global variance stats from %s' % (cfg.GV_dir))
-
-        ref_gv_mean_file = os.path.join(cfg.GV_dir, 'ref_gv.mean')
-        gen_gv_mean_file = os.path.join(cfg.GV_dir, 'gen_gv.mean')
-        ref_gv_std_file  = os.path.join(cfg.GV_dir, 'ref_gv.std')
-        gen_gv_std_file  = os.path.join(cfg.GV_dir, 'gen_gv.std')
-
-        ref_gv_mean, frame_number = io_funcs.load_binary_file_frame(ref_gv_mean_file, 1)
-        gen_gv_mean, frame_number = io_funcs.load_binary_file_frame(gen_gv_mean_file, 1)
-        ref_gv_std, frame_number = io_funcs.load_binary_file_frame(ref_gv_std_file, 1)
-        gen_gv_std, frame_number = io_funcs.load_binary_file_frame(gen_gv_std_file, 1)
+    base   = os.path.join(gen_dir, filename)
+    files = {'sp'  : base + cfg.sp_ext,
+             'mgc' : base + cfg.mgc_ext,
+             'f0'  : base + '.f0',
+             'lf0' : base + cfg.lf0_ext,
+             'ap'  : base + '.ap',
+             'bap' : base + cfg.bap_ext,
+             'wav' : base + '.wav'}
 
-    counter=1
-    max_counter = len(file_id_list)
+    mgc_file_name = files['mgc']
+    bap_file_name = files['bap']
 
-    for filename in file_id_list:
+    ### post-filtering
+    if cfg.do_post_filtering:
 
-        logger.info('creating waveform for %4d of %4d: %s' % (counter,max_counter,filename) )
-        counter=counter+1
-        base   = filename
-        files = {'sp'  : base + cfg.sp_ext,
-                 'mgc' : base + cfg.mgc_ext,
-                 'f0'  : base + '.f0',
-                 'lf0' : base + cfg.lf0_ext,
-                 'ap'  : base + '.ap',
-                 'bap' : base + cfg.bap_ext,
-                 'wav' : base + '.wav'}
+        mgc_file_name = files['mgc']+'_p_mgc'
+        post_filter(files['mgc'], mgc_file_name, cfg.mgc_dim, cfg.pf_coef, fw_coef, cfg.co_coef, cfg.fl, gen_dir, cfg)
 
-        mgc_file_name = files['mgc']
-        bap_file_name = files['bap']
-
-        cur_dir = os.getcwd()
-        os.chdir(gen_dir)
-
-        ### post-filtering
-        if cfg.do_post_filtering:
+    ### GV enhancement, of each stream with GV statistics
+    if gv_stats:
+        io_funcs = BinaryIOCollection()
+        for stream, global_variance in gv_stats.items():
+            gen_features, frame_number = io_funcs.load_binary_file_frame(files[stream], cfg.in_dimension_dict[stream])
 
-            mgc_file_name = files['mgc']+'_p_mgc'
-            post_filter(files['mgc'], mgc_file_name, cfg.mgc_dim, pf_coef, fw_coef, co_coef, fl_coef, gen_dir, cfg)
+            enhanced_file_name = files[stream]+'_p_'+stream
+            io_funcs.array_to_binary_file(global_variance.enhance(gen_features), enhanced_file_name)
 
-        if cfg.vocoder_type == "STRAIGHT" and cfg.apply_GV:
-            gen_mgc, frame_number = io_funcs.load_binary_file_frame(mgc_file_name, cfg.mgc_dim)
+            if stream == 'mgc':
+                mgc_file_name = enhanced_file_name
+            else:
+                files[stream] = enhanced_file_name
+
+    ###mgc to sp to wav
+    if cfg.vocoder_type == 'STRAIGHT':
+        run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 2 {mgc} > {sp}'
+                    .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.mgc_dim-1, fl=cfg.fl, mgc=mgc_file_name, sp=files['sp']))
+        run_process('{sopr} -magic -1.0E+10 -EXP -MAGIC 0.0 {lf0} > {f0}'.format(sopr=SPTK['SOPR'], lf0=files['lf0'], f0=files['f0']))
+        run_process('{x2x} +fa {f0} > {f0a}'.format(x2x=SPTK['X2X'], f0=files['f0'], f0a=files['f0'] + '.a'))
+
+        if cfg.use_cep_ap:
+            run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 0 {bap} > {ap}'
+                        .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.bap_dim-1, fl=cfg.fl, bap=files['bap'], ap=files['ap']))
+        else:
+            run_process('{bndap2ap} {bap} > {ap}'
+                         .format(bndap2ap=STRAIGHT['BNDAP2AP'], bap=files['bap'], ap=files['ap']))
 
-            gen_mu  = np.reshape(np.mean(gen_mgc, axis=0), (-1, 1))
-            gen_std = np.reshape(np.std(gen_mgc, axis=0), (-1, 1))
+        run_process('{synfft} -f {sr} -spec -fftl {fl} -shift {shift} -sigp 1.2 -cornf 4000 -float -apfile {ap} {f0a} {sp} {wav}'
+                    .format(synfft=STRAIGHT['SYNTHESIS_FFT'], sr=cfg.sr, fl=cfg.fl, shift=cfg.shift, ap=files['ap'], f0a=files['f0']+'.a', sp=files['sp'], wav=files['wav']))
 
-            local_gv = (ref_gv_std/gen_gv_std) * (gen_std - gen_gv_mean) + ref_gv_mean;
+        run_process('rm -f {sp} {f0} {f0a} {ap}'
+                    .format(sp=files['sp'],f0=files['f0'],f0a=files['f0']+'.a',ap=files['ap']))
+    elif cfg.vocoder_type == 'WORLD':
 
-            enhanced_mgc = np.repeat(local_gv, frame_number, 1).T / np.repeat(gen_std, frame_number, 1).T * (gen_mgc - np.repeat(gen_mu, frame_number, 1).T) + np.repeat(gen_mu, frame_number, 1).T;
+        run_process('{sopr} -magic -1.0E+10 -EXP -MAGIC 0.0 {lf0} | {x2x} +fd > {f0}'.format(sopr=SPTK['SOPR'], lf0=files['lf0'], x2x=SPTK['X2X'], f0=files['f0']))
 
-            new_mgc_file_name = files['mgc']+'_p_mgc'
-            io_funcs.array_to_binary_file(enhanced_mgc, new_mgc_file_name)
+        run_process('{sopr} -c 0 {bap} | {x2x} +fd > {ap}'.format(sopr=SPTK['SOPR'],bap=files['bap'],x2x=SPTK['X2X'],ap=files['ap']))
 
-            mgc_file_name = files['mgc']+'_p_mgc'
+        ### If using world v2, please comment above line and uncomment this
+        #run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 0 {bap} | {sopr} -d 32768.0 -P | {x2x} +fd > {ap}'
+        #            .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.bap_dim, fl=cfg.fl, bap=bap_file_name, sopr=SPTK['SOPR'], x2x=SPTK['X2X'], ap=files['ap']))
 
-        if cfg.do_post_filtering and cfg.apply_GV:
-            logger.critical('Both smoothing techniques together can\'t be applied!!\n' )
-            raise
+        run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 2 {mgc} | {sopr} -d 32768.0 -P | {x2x} +fd > {sp}'
+                    .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.mgc_dim-1, fl=cfg.fl, mgc=mgc_file_name, sopr=SPTK['SOPR'], x2x=SPTK['X2X'], sp=files['sp']))
 
-        ###mgc to sp to wav
-        if cfg.vocoder_type == 'STRAIGHT':
-            run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 2 {mgc} > {sp}'
-                        .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.mgc_dim-1, fl=cfg.fl, mgc=mgc_file_name, sp=files['sp']))
-            run_process('{sopr} -magic -1.0E+10 -EXP -MAGIC 0.0 {lf0} > {f0}'.format(sopr=SPTK['SOPR'], lf0=files['lf0'], f0=files['f0']))
-            run_process('{x2x} +fa {f0} > {f0a}'.format(x2x=SPTK['X2X'], f0=files['f0'], f0a=files['f0'] + '.a'))
+        run_process('{synworld} {fl} {sr} {f0} {sp} {ap} {wav}'
+                     .format(synworld=WORLD['SYNTHESIS'], fl=cfg.fl, sr=cfg.sr, f0=files['f0'], sp=files['sp'], ap=files['ap'], wav=files['wav']))
 
-            if cfg.use_cep_ap:
-                run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 0 {bap} > {ap}'
-                            .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.bap_dim-1, fl=cfg.fl, bap=files['bap'], ap=files['ap']))
-            else:
-                run_process('{bndap2ap} {bap} > {ap}'
-                             .format(bndap2ap=STRAIGHT['BNDAP2AP'], bap=files['bap'], ap=files['ap']))
+        run_process('rm -f {ap} {sp} {f0}'.format(ap=files['ap'],sp=files['sp'],f0=files['f0']))
 
-            run_process('{synfft} -f {sr} -spec -fftl {fl} -shift {shift} -sigp 1.2 -cornf 4000 -float -apfile {ap} {f0a} {sp} {wav}'
-                        .format(synfft=STRAIGHT['SYNTHESIS_FFT'], sr=cfg.sr, fl=cfg.fl, shift=cfg.shift, ap=files['ap'], f0a=files['f0']+'.a', sp=files['sp'], wav=files['wav']))
 
-            run_process('rm -f {sp} {f0} {f0a} {ap}'
-                        .format(sp=files['sp'],f0=files['f0'],f0a=files['f0']+'.a',ap=files['ap']))
-        elif cfg.vocoder_type == 'WORLD':
+def wavgen_straight_type_vocoder(gen_dir, file_id_list, cfg, logger):
+    '''
+    Waveform generation with STRAIGHT or WORLD vocoders.
+    (whose acoustic parameters are: mgc, bap, and lf0)
+    With cfg.wavgen_workers other than 1, the utterances are generated concurrently.
+    '''
 
-            run_process('{sopr} -magic -1.0E+10 -EXP -MAGIC 0.0 {lf0} | {x2x} +fd > {f0}'.format(sopr=SPTK['SOPR'], lf0=files['lf0'], x2x=SPTK['X2X'], f0=files['f0']))
+    if isinstance(cfg.fw_alpha, str):
+        if cfg.fw_alpha=='Bark':
+            fw_coef = bark_alpha(cfg.sr)
+        elif cfg.fw_alpha=='ERB':
+            fw_coef = bark_alpha(cfg.sr)
+        else:
+            raise ValueError('cfg.fw_alpha='+cfg.fw_alpha+' not implemented, the frequency warping coefficient "fw_coef" cannot be deduced.')
+    else:
+        fw_coef = cfg.fw_alpha
 
-            run_process('{sopr} -c 0 {bap} | {x2x} +fd > {ap}'.format(sopr=SPTK['SOPR'],bap=files['bap'],x2x=SPTK['X2X'],ap=files['ap']))
+    if cfg.do_post_filtering and cfg.apply_GV:
+        logger.critical('Both smoothing techniques together can\'t be applied!!\n' )
+        raise ValueError('do_post_filtering and apply_GV cannot be used together')
 
-            ### If using world v2, please comment above line and uncomment this
-            #run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 0 {bap} | {sopr} -d 32768.0 -P | {x2x} +fd > {ap}'
-            #            .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.bap_dim, fl=cfg.fl, bap=bap_file_name, sopr=SPTK['SOPR'], x2x=SPTK['X2X'], ap=files['ap']))
+    ## the GV statistics are loaded once for all the utterances
+    gv_stats = {}
+    if cfg.apply_GV:
+        logger.info('loading global variance stats of %s from %s' % (', '.join(cfg.gv_streams), cfg.GV_dir))
 
-            run_process('{mgc2sp} -a {alpha} -g 0 -m {order} -l {fl} -o 2 {mgc} | {sopr} -d 32768.0 -P | {x2x} +fd > {sp}'
-                        .format(mgc2sp=SPTK['MGC2SP'], alpha=cfg.fw_alpha, order=cfg.mgc_dim-1, fl=cfg.fl, mgc=mgc_file_name, sopr=SPTK['SOPR'], x2x=SPTK['X2X'], sp=files['sp']))
+        for stream in cfg.gv_streams:
+            if stream not in ['mgc', 'lf0', 'bap']:
+                raise ValueError('GV enhancement of the %s stream is not supported by the %s vocoder' % (stream, cfg.vocoder_type))
+            gv_stats[stream] = GlobalVariance.load(cfg.GV_dir, stream, cfg.in_dimension_dict[stream])
 
-            run_process('{synworld} {fl} {sr} {f0} {sp} {ap} {wav}'
-                         .format(synworld=WORLD['SYNTHESIS'], fl=cfg.fl, sr=cfg.sr, f0=files['f0'], sp=files['sp'], ap=files['ap'], wav=files['wav']))
+    gen_dir = os.path.abspath(gen_dir)
 
-            run_process('rm -f {ap} {sp} {f0}'.format(ap=files['ap'],sp=files['sp'],f0=files['f0']))
+    def synthesise(filename):
+        ## a failed utterance is reported with the others at the end, rather than stopping the rest
+        try:
+            wavgen_straight_type_utterance(gen_dir, filename, cfg, fw_coef, gv_stats)
+        except Exception as e:
+            return  (filename, e)
+        return  (filename, None)
+
+    num_workers = cfg.wavgen_workers
+    if num_workers == 0:
+        num_workers = multiprocessing.cpu_count()
+
+    start_time = time.time()
+
+    ## the work is done by the vocoder processes, so a pool of threads is enough to keep the cores busy
+    pool = None
+    if num_workers > 1:
+        logger.info('creating %d waveforms with %d workers' % (len(file_id_list), num_workers) )
+        pool = ThreadPool(num_workers)
+        results = pool.imap_unordered(synthesise, file_id_list)
+    else:
+        results = (synthesise(filename) for filename in file_id_list)
 
-        os.chdir(cur_dir)
+    failed_list = []
+    try:
+        counter=1
+        max_counter = len(file_id_list)
+        for (filename, error) in results:
+            if error is None:
+                logger.info('created waveform %4d of %4d: %s' % (counter,max_counter,filename) )
+            else:
+                logger.critical('failed to create waveform %4d of %4d: %s (%s)' % (counter,max_counter,filename,repr(error)) )
+                failed_list.append(filename)
+            counter=counter+1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    elapsed_time = time.time() - start_time
+    created_number = len(file_id_list) - len(failed_list)
+    logger.info('created %d waveforms in %.1f seconds (%.2f per second)' % (created_number, elapsed_time, created_number / max(elapsed_time, 1e-6)) )
+
+    if failed_list:
+        logger.critical('%d waveforms could not be created: %s' % (len(failed_list), ' '.join(failed_list)) )
+        raise OSError('waveform generation failed for %d files' % len(failed_list))
 
 
 def wavgen_magphase(gen_dir, file_id_list, cfg, logger):
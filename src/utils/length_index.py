@@ -0,0 +1,102 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import os
+import json
+import logging
+
+
+class UtteranceLengthIndex(object):
+    '''
+    Number of frames of each utterance, worked out from the sizes of the binary feature files
+    (float32, no header) rather than by loading them. The index can be kept on disk: an entry is
+    reused only while the size and modification time of both files and the dimensions are unchanged.
+    '''
+
+    def __init__(self, index_file=None):
+        self.logger = logging.getLogger("UtteranceLengthIndex")
+
+        self.index_file = index_file
+        self.entries = {}
+        self.changed = False
+
+        if self.index_file and os.path.isfile(self.index_file):
+            try:
+                with open(self.index_file, 'r') as fid:
+                    self.entries = json.load(fid)
+            except ValueError:
+                self.logger.warning('ignoring unreadable length index %s' % (self.index_file))
+                self.entries = {}
+
+    def lookup(self, x_file_name, y_file_name, n_ins, n_outs):
+        '''
+        return the number of frames of the input and output files
+        '''
+        x_stat = os.stat(x_file_name)
+        y_stat = os.stat(y_file_name)
+
+        key = os.path.abspath(x_file_name)
+        entry = [os.path.abspath(y_file_name), n_ins, n_outs,
+                 x_stat.st_size, x_stat.st_mtime, y_stat.st_size, y_stat.st_mtime]
+
+        cached = self.entries.get(key)
+        if cached is not None and cached[:-2] == entry:
+            return  cached[-2], cached[-1]
+
+        ## the frame numbers follow directly from the file sizes
+        lab_frame_number = x_stat.st_size // (4 * n_ins)
+        out_frame_number = y_stat.st_size // (4 * n_outs)
+
+        self.entries[key] = entry + [lab_frame_number, out_frame_number]
+        self.changed = True
+
+        return  lab_frame_number, out_frame_number
+
+    def save(self):
+        if not self.index_file or not self.changed:
+            return
+
+        ## write a temporary file first, so that an interrupted run leaves the old index intact
+        temp_file = self.index_file + '.%d.tmp' % (os.getpid())
+        with open(temp_file, 'w') as fid:
+            json.dump(self.entries, fid)
+        os.rename(temp_file, self.index_file)
+
+        self.changed = False
+        self.logger.debug('saved lengths of %d utterances to %s' % (len(self.entries), self.index_file))
@@ -0,0 +1,141 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+## Mel-cepstral post-filtering (formant enhancement) in numpy, as the SPTK command chain formerly
+## run by utils.generate.post_filter. Every function works on whole (frames, dimension) matrices.
+
+import numpy
+from scipy.signal import lfilter
+
+
+## freqt matrices, by (input order, output order, alpha)
+_freqt_matrices = {}
+
+def freqt_matrix(in_order, out_order, alpha):
+    '''
+    matrix of the SPTK frequency transform (freqt) of cepstra of order in_order to order out_order.
+    The transform is linear, so row i is the transform of the i-th unit cepstrum, computed with the SPTK recursion.
+    '''
+    key = (in_order, out_order, alpha)
+    if key in _freqt_matrices:
+        return  _freqt_matrices[key]
+
+    beta = 1.0 - alpha * alpha
+    unit_cepstra = numpy.eye(in_order + 1)
+
+    g = numpy.zeros((in_order + 1, out_order + 1))
+    for i in range(in_order, -1, -1):
+        d = g
+        g = numpy.empty_like(d)
+        g[:, 0] = unit_cepstra[:, i] + alpha * d[:, 0]
+        if out_order >= 1:
+            g[:, 1] = beta * d[:, 0] + alpha * d[:, 1]
+        if out_order >= 2:
+            ## g[j] = d[j-1] + alpha * (d[j] - g[j-1]) is a first order recursion along j
+            g[:, 2:], _ = lfilter([1.0], [1.0, alpha], d[:, 1:-1] + alpha * d[:, 2:], axis=1, zi=-alpha * g[:, 1:2])
+
+    _freqt_matrices[key] = g
+    return  g
+
+
+def freqt(cepstra, out_order, alpha):
+    '''
+    frequency transform of cepstra (SPTK freqt -m <in_order> -M <out_order> -a <a1> -A <a2>, with alpha = (a2 - a1) / (1 - a1 a2))
+    '''
+    return  numpy.dot(cepstra, freqt_matrix(cepstra.shape[1] - 1, out_order, alpha))
+
+
+def c2acr_energy(cepstra, fft_length):
+    '''
+    autocorrelation at lag 0, i.e. the energy, of the spectra of cepstra (SPTK c2acr -M 0 -l fft_length)
+    '''
+    log_amplitude = numpy.fft.rfft(cepstra, n=fft_length, axis=1).real
+
+    ## the mean of the power spectrum over all fft_length bins, from the bins of the real FFT
+    bin_weights = numpy.full(log_amplitude.shape[1], 2.0)
+    bin_weights[0] = 1.0
+    if fft_length % 2 == 0:
+        bin_weights[-1] = 1.0
+
+    return  numpy.dot(numpy.exp(2.0 * log_amplitude), bin_weights) / fft_length
+
+
+def mc2b(mgc, alpha):
+    '''
+    mel-cepstra to MLSA filter coefficients (SPTK mc2b)
+    '''
+    b = numpy.array(mgc, dtype=numpy.float64)
+    for m in range(b.shape[1] - 2, -1, -1):
+        b[:, m] -= alpha * b[:, m + 1]
+    return  b
+
+
+def b2mc(b, alpha):
+    '''
+    MLSA filter coefficients to mel-cepstra (SPTK b2mc)
+    '''
+    mgc = numpy.array(b, dtype=numpy.float64)
+    mgc[:, :-1] += alpha * b[:, 1:]
+    return  mgc
+
+
+def post_filter_mgc(mgc, pf_coef, fw_coef, co_coef, fl_coef):
+    '''
+    formant enhancement of mel-cepstra of shape (frames, mgc_dim): the coefficients from the second on are scaled
+    by pf_coef, and the energy of each frame is restored through the gain of the MLSA filter coefficients
+
+    :param fw_coef: frequency warping coefficient of the mel-cepstra
+    :param co_coef: order of the linear cepstra used to measure the energy
+    :param fl_coef: FFT length used to measure the energy
+    :returns: the enhanced mel-cepstra
+    '''
+    mgc = numpy.asarray(mgc, dtype=numpy.float64)
+
+    weight = numpy.ones(mgc.shape[1])
+    weight[2:] = pf_coef
+    weighted_mgc = mgc * weight
+
+    ## energies of the original and enhanced spectra, from unwarped cepstra
+    r0 = c2acr_energy(freqt(mgc, co_coef, -fw_coef), fl_coef)
+    p_r0 = c2acr_energy(freqt(weighted_mgc, co_coef, -fw_coef), fl_coef)
+
+    b = mc2b(weighted_mgc, fw_coef)
+    b[:, 0] += 0.5 * numpy.log(r0 / p_r0)
+
+    return  b2mc(b, fw_coef)
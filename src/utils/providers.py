@@ -38,8 +38,16 @@
 ################################################################################
 
 import os, sys
-import numpy, theano, random
+import numpy, random
+import copy
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from io_funcs.binary_io import BinaryIOCollection
+from io_funcs.packed_corpus import PackedCorpus
+from utils.length_index import UtteranceLengthIndex
 import logging
 from frontend.label_normalisation import HTSLabelNormalisation
 
@@ -59,7 +67,8 @@ class ListDataProvider(object):
     This provide assumes binary format with float32 precision without any header (e.g. HTK header).
 
     """
-    def __init__(self, x_file_list, y_file_list, dur_file_list=None, n_ins=0, n_outs=0, buffer_size=500000, sequential=False, network_type=None, shuffle=False):
+    def __init__(self, x_file_list, y_file_list, dur_file_list=None, n_ins=0, n_outs=0, buffer_size=500000, sequential=False, network_type=None, shuffle=False, packed_corpus=None,
+                 shuffle_seed=271639, shuffle_pool_size=0):
         """Initialise a data provider
 
         :param x_file_list: list of file names for the input files to DNN
@@ -69,6 +78,9 @@ class ListDataProvider(object):
         :param n_outs: the dimensionality for output features
         :param buffer_size: the size of the buffer, indicating the number of frames in the buffer. The value depends on the memory size of RAM/GPU.
         :param shuffle: True/False. To indicate whether the file list will be shuffled. When loading data block by block, the data in the buffer will be shuffle no matter this value is True or False.
+        :param packed_corpus: optional PackedCorpus holding the features of the files in the lists. The features are then read from it rather than from the files.
+        :param shuffle_seed: seed for shuffling the frames of the first epoch when loading block by block. Each later epoch adds its number to it.
+        :param shuffle_pool_size: number of randomly chosen frames of each block that are held back for the next block, so that frames mix across block boundaries.
         """
 
         self.logger = logging.getLogger("ListDataProvider")
@@ -115,6 +127,14 @@ class ListDataProvider(object):
         self.y_files_list = y_file_list
         self.dur_files_list = dur_file_list
 
+        self.packed_corpus = packed_corpus
+        if self.packed_corpus is not None:
+            try:
+                assert self.packed_corpus.n_ins == self.n_ins and self.packed_corpus.n_outs == self.n_outs
+            except AssertionError:
+                self.logger.critical('packed corpus dimensions %d, %d differ from %d, %d' % (self.packed_corpus.n_ins, self.packed_corpus.n_outs, self.n_ins, self.n_outs))
+                raise
+
         self.logger.debug('first  list of items from ...%s to ...%s' % (self.x_files_list[0].rjust(20)[-20:],self.x_files_list[-1].rjust(20)[-20:]) )
         self.logger.debug('second list of items from ...%s to ...%s' % (self.y_files_list[0].rjust(20)[-20:],self.y_files_list[-1].rjust(20)[-20:]) )
 
@@ -136,24 +156,87 @@ class ListDataProvider(object):
 
         self.end_reading = False
 
+        try:
+            assert 0 <= shuffle_pool_size < buffer_size
+        except AssertionError:
+            self.logger.critical('the shuffle pool of %d frames must be smaller than the buffer size %d' % (shuffle_pool_size, buffer_size))
+            raise
+
+        self.shuffle_seed = shuffle_seed
+        self.shuffle_pool_size = shuffle_pool_size
+        self.epoch = 0
+        self.shuffle_rng = numpy.random.RandomState(self.shuffle_seed)
+        self.pool_frame_number = 0
+
+        ## set to True to get blocks in file order with the permutation to train them in as shuffle_index,
+        ## rather than shuffled copies
+        self.shuffle_by_index = False
+        self.shuffle_index = None
+
+        ## set to False to get plain numpy arrays in place of theano shared variables
+        self.share_data = True
+
+        ## for batch training of RNNs: the numbers of real and of padded frames in the batches loaded
+        self.real_frame_number = 0
+        self.padded_frame_number = 0
+
         self.logger.debug('initialised')
 
+    ## attributes giving the position of the provider within an epoch
+    STATE_ATTRIBUTES = ('file_index', 'end_reading', 'epoch', 'remain_frame_number', 'remain_data_x', 'remain_data_y',
+                        'pool_frame_number', 'pool_data_x', 'pool_data_y',
+                        'bucket_index', 'bucket_file_index', 'current_bucket_size', 'current_bucket_list', 'seq_length',
+                        'length_batch_index', 'length_batches', 'real_frame_number', 'padded_frame_number')
+
     def __iter__(self):
         return self
 
-    def reset(self):
+    def get_state(self):
+        """Get the position of the provider within the current epoch, so that reading can carry on from it later (e.g. from a training checkpoint).
+
+        """
+        state = {}
+        for name in self.STATE_ATTRIBUTES:
+            if hasattr(self, name):
+                value = getattr(self, name)
+                ## the remaining data can be a view of a mapped file
+                state[name] = numpy.array(value) if isinstance(value, numpy.ndarray) else copy.copy(value)
+        state['shuffle_rng'] = self.shuffle_rng.get_state()
+
+        return  state
+
+    def set_state(self, state):
+        """Carry on reading from a position given by get_state.
+
+        """
+        for name in self.STATE_ATTRIBUTES:
+            if name in state:
+                setattr(self, name, state[name])
+        self.shuffle_rng.set_state(state['shuffle_rng'])
+
+    def reset(self, new_epoch=True):
         """When all the files in the file list have been used for DNN training, reset the data provider to start a new epoch.
 
+        :param new_epoch: False to read the current epoch again from its start, e.g. after a first partition was loaded only to set up the model, so that the first epoch is still shuffled with shuffle_seed.
         """
+        if self.end_reading and new_epoch:
+            self.epoch += 1
         self.file_index = 0
         self.end_reading = False
 
         self.remain_frame_number = 0
+        self.pool_frame_number = 0
+        self.shuffle_rng = numpy.random.RandomState(self.shuffle_seed + self.epoch)
         
         self.bucket_index = 0
         self.bucket_file_index = 0
         self.current_bucket_size = 0
 
+        self.length_batch_index = 0
+
+        self.real_frame_number = 0
+        self.padded_frame_number = 0
+
         self.logger.debug('reset')
 
     def make_shared(self, data_set, data_name):
@@ -163,13 +246,34 @@ class ListDataProvider(object):
         :param data_name: indicate the name of the data (e.g., 'x', 'y', etc)
         :returns: shared dataset -- data_set
         """
+        if not self.share_data:
+            return  data_set
+
+        ## theano is only imported where it is used, so that plain numpy partitions can be read without it
+        import theano
+
         data_set = theano.shared(numpy.asarray(data_set, dtype=theano.config.floatX), name=data_name, borrow=True)
 
         return  data_set
 
-    def set_rnn_params(self, training_algo=1, batch_size=25, seq_length=200, merge_size=1, bucket_range=100):
+    def load_utterance_features(self, file_index):
+        """Get the input and output features of one utterance as read-only views, so that only the frames used are read.
+
+        :param file_index: position of the utterance in the file lists
+        :returns: input features, output features
+        """
+        if self.packed_corpus is not None:
+            return  self.packed_corpus.load_utterance(PackedCorpus.utterance_name(self.x_files_list[file_index]))
+
+        io_funcs = BinaryIOCollection()
+        in_features = io_funcs.load_binary_file_mmap(self.x_files_list[file_index], self.n_ins)
+        out_features = io_funcs.load_binary_file_mmap(self.y_files_list[file_index], self.n_outs)
+
+        return  in_features, out_features
+
+    def set_rnn_params(self, training_algo=1, batch_size=25, seq_length=200, merge_size=1, bucket_range=100, length_index_file=None, batch_frames=0, length_chunk_batches=8):
         # get file lengths
-        self.get_file_lengths()
+        self.get_file_lengths(length_index_file)
 
         # set training algo
         self.training_algo = training_algo
@@ -194,32 +298,39 @@ class ListDataProvider(object):
         elif(self.training_algo == 3):
             self.seq_length = seq_length
             self.merge_size = merge_size
+        elif(self.training_algo == 4):
+            self.merge_size = 1
+            self.batch_frames = batch_frames if batch_frames > 0 else batch_size * seq_length
+            ## utterances are sorted by length within randomly drawn chunks of about this many batches
+            self.length_chunk_size = max(1, length_chunk_batches * batch_size)
+            self.length_batches = []
         else:
             self.logger.critical("Choose training algorithm for batch training with RNNs:")
             self.logger.critical("1. Padding model -- pad utterances with zeros to maximum sequence length")
             self.logger.critical("2. Bucket model  -- form buckets with minimum and maximum sequence length")
             self.logger.critical("3. Split model   -- split utterances to a fixed sequence length")
+            self.logger.critical("4. Frame budget model -- batch utterances of similar length up to a number of padded frames")
             sys.exit(1)
 
     def reshape_input_output(self):
         self.reshape_io = True
 
-    def get_file_lengths(self):
-        io_funcs = BinaryIOCollection()
+    def get_file_lengths(self, length_index_file=None):
+        """Find the number of frames of every utterance from the file sizes, without loading the files.
+
+        :param length_index_file: optional file in which the lengths are kept between runs. Entries are recomputed whenever a file changes.
+        """
+        length_index = UtteranceLengthIndex(length_index_file)
 
         self.file_length_dict = {'framenum2utt':{}, 'utt2framenum':{}, 'utt2index':{}}
 
-        ### read file by file ###
-        while True:
-            if  self.file_index >= self.list_size:
-                self.end_reading = True
-                self.file_index = 0
-                break
+        for file_index in range(self.list_size):
+            if self.packed_corpus is not None:
+                lab_frame_number, out_frame_number = self.packed_corpus.get_frame_numbers(PackedCorpus.utterance_name(self.x_files_list[file_index]))
+            else:
+                lab_frame_number, out_frame_number = length_index.lookup(self.x_files_list[file_index], self.y_files_list[file_index], self.n_ins, self.n_outs)
 
-            in_features, lab_frame_number = io_funcs.load_binary_file_frame(self.x_files_list[self.file_index], self.n_ins)
-            out_features, out_frame_number = io_funcs.load_binary_file_frame(self.y_files_list[self.file_index], self.n_outs)
-         
-            base_file_name = os.path.basename(self.x_files_list[self.file_index]).split('.')[0]
+            base_file_name = os.path.basename(self.x_files_list[file_index]).split('.')[0]
             if abs(lab_frame_number - out_frame_number) < 5:    ## we allow small difference here. may not be correct, but sometimes, there is one/two frames difference
                 frame_number = min(lab_frame_number, out_frame_number)
             else:
@@ -232,8 +343,9 @@ class ListDataProvider(object):
                 self.file_length_dict['framenum2utt'][frame_number].append(base_file_name)
 
             self.file_length_dict['utt2framenum'][base_file_name] = frame_number
-            self.file_length_dict['utt2index'][base_file_name] = self.file_index
-            self.file_index += 1
+            self.file_length_dict['utt2index'][base_file_name] = file_index
+
+        length_index.save()
 
         self.reset()
 
@@ -247,6 +359,44 @@ class ListDataProvider(object):
 
         self.seq_length = max(temp_list)
 
+    def make_length_batches(self, rng):
+        """Group the utterances into batches of similar length, whose padded size stays within the frame budget.
+
+        The utterances are drawn in a random order, in chunks of length_chunk_size, and each chunk is sorted
+        by length (equal lengths stay in random order) before it is cut into batches, so that the members of
+        the batches change from epoch to epoch. The order of all the batches is then shuffled.
+
+        :param rng: numpy RandomState for the current epoch
+        """
+        frame_numbers = numpy.array([self.file_length_dict['utt2framenum'][os.path.basename(file_name).split('.')[0]] for file_name in self.x_files_list])
+
+        utterance_order = rng.permutation(self.list_size)
+
+        length_batches = []
+        for chunk_start in range(0, self.list_size, self.length_chunk_size):
+            chunk = utterance_order[chunk_start:chunk_start+self.length_chunk_size]
+            current_batch = []
+            for file_index in chunk[numpy.argsort(frame_numbers[chunk], kind='mergesort')]:
+                ## utterances come in increasing length, so the new one sets the padded length of the batch
+                if current_batch and (len(current_batch) + 1) * frame_numbers[file_index] > self.batch_frames:
+                    length_batches.append(current_batch)
+                    current_batch = []
+                current_batch.append(int(file_index))
+            if current_batch:
+                length_batches.append(current_batch)
+
+        self.length_batches = [length_batches[batch_index] for batch_index in rng.permutation(len(length_batches))]
+
+        self.logger.debug('%d utterances in %d batches of at most %d frames' % (self.list_size, len(self.length_batches), self.batch_frames))
+
+    def get_padding_efficiency(self):
+        """The fraction of the frames in the batches loaded since the last reset that are not padding.
+
+        """
+        if self.padded_frame_number == 0:
+            return  1.0
+        return  float(self.real_frame_number) / self.padded_frame_number
+
     def get_next_bucket(self):
         min_seq_length = self.list_of_buckets[self.bucket_index]
         max_seq_length = self.list_of_buckets[self.bucket_index] + self.bucket_range
@@ -298,7 +448,8 @@ class ListDataProvider(object):
         return  shared_set_xy, temp_set_x, temp_set_y
 
     def load_next_batch(self):
-        io_funcs = BinaryIOCollection()
+        if(self.training_algo == 4):
+            return  self.load_next_length_batch()
 
         ## set sequence length for batch training 
         if(self.training_algo == 1):
@@ -312,8 +463,9 @@ class ListDataProvider(object):
             # seq length is set based on default/user configuration 
             pass;
             
-        temp_set_x = numpy.zeros((self.buffer_size, self.n_ins))
-        temp_set_y = numpy.zeros((self.buffer_size, self.n_outs))
+        temp_set_x = numpy.zeros((self.buffer_size, self.n_ins), dtype=numpy.float32)
+        temp_set_y = numpy.zeros((self.buffer_size, self.n_outs), dtype=numpy.float32)
+        frame_used = numpy.zeros(self.buffer_size, dtype=bool)
 
         ### read file by file ###
         current_index = 0
@@ -333,13 +485,14 @@ class ListDataProvider(object):
                 self.utt_index = self.file_index 
                 base_file_name = os.path.basename(self.x_files_list[self.utt_index]).split('.')[0]
 
-            in_features, lab_frame_number = io_funcs.load_binary_file_frame(self.x_files_list[self.utt_index], self.n_ins)
-            out_features, out_frame_number = io_funcs.load_binary_file_frame(self.y_files_list[self.utt_index], self.n_outs)
+            ## map the files, so that only the frames used are read, straight into the buffers
+            in_features, out_features = self.load_utterance_features(self.utt_index)
          
             frame_number = self.file_length_dict['utt2framenum'][base_file_name]
 
-            temp_set_x[current_index:current_index+frame_number, ] = in_features
-            temp_set_y[current_index:current_index+frame_number, ] = out_features
+            temp_set_x[current_index:current_index+frame_number, ] = in_features[0:frame_number, ]
+            temp_set_y[current_index:current_index+frame_number, ] = out_features[0:frame_number, ]
+            frame_used[current_index:current_index+frame_number] = True
             current_index += frame_number
 
             if((self.file_index+1)%self.merge_size == 0):
@@ -372,6 +525,9 @@ class ListDataProvider(object):
         temp_set_x = temp_set_x.reshape(num_of_samples, self.seq_length, self.n_ins)
         temp_set_y = temp_set_y.reshape(num_of_samples, self.seq_length, self.n_outs)
 
+        self.real_frame_number += int(frame_used.sum())
+        self.padded_frame_number += num_of_samples*self.seq_length
+
         shared_set_x = self.make_shared(temp_set_x, 'x')
         shared_set_y = self.make_shared(temp_set_y, 'y')
 
@@ -379,18 +535,51 @@ class ListDataProvider(object):
 
         return shared_set_xy, temp_set_x, temp_set_y
         
-    def load_next_utterance(self):
-        """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
+    def load_next_length_batch(self):
+        """Load a batch of utterances of similar length, each padded with zeros to the longest one. The batches are drawn again at every epoch.
 
         """
+        if self.length_batch_index == 0:
+            self.make_length_batches(numpy.random.RandomState(self.shuffle_seed + self.epoch))
 
-        temp_set_x = numpy.empty((self.buffer_size, self.n_ins))
-        temp_set_y = numpy.empty((self.buffer_size, self.n_outs))
+        current_batch = self.length_batches[self.length_batch_index]
+        frame_numbers = [self.file_length_dict['utt2framenum'][os.path.basename(self.x_files_list[file_index]).split('.')[0]] for file_index in current_batch]
 
-        io_fun = BinaryIOCollection()
+        self.seq_length = max(frame_numbers)
 
-        in_features, lab_frame_number = io_fun.load_binary_file_frame(self.x_files_list[self.file_index], self.n_ins)
-        out_features, out_frame_number = io_fun.load_binary_file_frame(self.y_files_list[self.file_index], self.n_outs)
+        temp_set_x = numpy.zeros((len(current_batch), self.seq_length, self.n_ins), dtype=numpy.float32)
+        temp_set_y = numpy.zeros((len(current_batch), self.seq_length, self.n_outs), dtype=numpy.float32)
+
+        for sample_index, (file_index, frame_number) in enumerate(zip(current_batch, frame_numbers)):
+            in_features, out_features = self.load_utterance_features(file_index)
+
+            temp_set_x[sample_index, 0:frame_number, ] = in_features[0:frame_number, ]
+            temp_set_y[sample_index, 0:frame_number, ] = out_features[0:frame_number, ]
+
+        self.real_frame_number += sum(frame_numbers)
+        self.padded_frame_number += len(current_batch) * self.seq_length
+
+        self.length_batch_index += 1
+        if self.length_batch_index >= len(self.length_batches):
+            self.end_reading = True
+            self.length_batch_index = 0
+
+        shared_set_x = self.make_shared(temp_set_x, 'x')
+        shared_set_y = self.make_shared(temp_set_y, 'y')
+
+        shared_set_xy = (shared_set_x, shared_set_y)
+
+        return shared_set_xy, temp_set_x, temp_set_y
+
+    def load_next_utterance(self):
+        """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
+
+        """
+
+        ## the utterance is returned to the caller, so take a copy of the mapped features
+        in_features, out_features = [numpy.array(features) for features in self.load_utterance_features(self.file_index)]
+        lab_frame_number = in_features.shape[0]
+        out_frame_number = out_features.shape[0]
 
         frame_number = lab_frame_number
         if abs(lab_frame_number - out_frame_number) < 5:    ## we allow small difference here. may not be correct, but sometimes, there is one/two frames difference
@@ -429,6 +618,7 @@ class ListDataProvider(object):
         """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
 
         """
+        import theano
 
         temp_set_x = numpy.empty((self.buffer_size, self.n_ins))
         temp_set_y = numpy.empty((self.buffer_size, self.n_outs))
@@ -469,6 +659,7 @@ class ListDataProvider(object):
         """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
         
         """
+        import theano
         
         io_fun = BinaryIOCollection()
 
@@ -530,6 +721,7 @@ class ListDataProvider(object):
         """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
         
         """
+        import theano
 
         temp_set_x = numpy.empty((self.buffer_size, self.n_ins))
         temp_set_y = numpy.empty((self.buffer_size, self.n_outs))
@@ -592,6 +784,7 @@ class ListDataProvider(object):
         """Load the data for one utterance. This function will be called when utterance-by-utterance loading is required (e.g., sequential training).
         
         """
+        import theano
        
         inp_length = (self.MLU_div['word'][1] - self.MLU_div['word'][0]) + (self.MLU_div['word'][3] - self.MLU_div['word'][2])
         af_length = self.MLU_div['length'][-1]
@@ -690,6 +883,7 @@ class ListDataProvider(object):
         return shared_set_xyd, new_temp_set_x, new_temp_set_y, new_temp_set_d, new_temp_set_af
 
     def load_next_utterance_CTC(self):
+        import theano
 
         temp_set_x = numpy.empty((self.buffer_size, self.n_ins))
         temp_set_y = numpy.empty(self.buffer_size)
@@ -727,19 +921,31 @@ class ListDataProvider(object):
 
         self.logger.debug('loading next partition')
 
-        temp_set_x = numpy.empty((self.buffer_size, self.n_ins))
-        temp_set_y = numpy.empty((self.buffer_size, self.n_outs))
+        ## the features are float32 on disk, and are kept so all the way to theano
+        temp_set_x = numpy.empty((self.buffer_size, self.n_ins), dtype=numpy.float32)
+        temp_set_y = numpy.empty((self.buffer_size, self.n_outs), dtype=numpy.float32)
         current_index = 0
 
+        ### frames held back in the shuffle pool of the previous block come first
+        if self.pool_frame_number > 0:
+            temp_set_x[current_index:self.pool_frame_number, ] = self.pool_data_x
+            temp_set_y[current_index:self.pool_frame_number, ] = self.pool_data_y
+            current_index += self.pool_frame_number
+
+            self.pool_frame_number = 0
+
         ### first check whether there are remaining data from previous utterance
+        ### together with the pool they may not fit: what does not fit is left for the next block
         if self.remain_frame_number > 0:
-            temp_set_x[current_index:self.remain_frame_number, ] = self.remain_data_x
-            temp_set_y[current_index:self.remain_frame_number, ] = self.remain_data_y
-            current_index += self.remain_frame_number
+            used_frame_number = min(self.remain_frame_number, self.buffer_size - current_index)
+            temp_set_x[current_index:current_index+used_frame_number, ] = self.remain_data_x[0:used_frame_number, ]
+            temp_set_y[current_index:current_index+used_frame_number, ] = self.remain_data_y[0:used_frame_number, ]
+            current_index += used_frame_number
 
-            self.remain_frame_number = 0
+            self.remain_data_x = self.remain_data_x[used_frame_number:, ]
+            self.remain_data_y = self.remain_data_y[used_frame_number:, ]
+            self.remain_frame_number -= used_frame_number
 
-        io_fun = BinaryIOCollection()
         while True:
             if current_index >= self.buffer_size:
                 break
@@ -748,8 +954,10 @@ class ListDataProvider(object):
                 self.file_index = 0
                 break
 
-            in_features, lab_frame_number = io_fun.load_binary_file_frame(self.x_files_list[self.file_index], self.n_ins)
-            out_features, out_frame_number = io_fun.load_binary_file_frame(self.y_files_list[self.file_index], self.n_outs)
+            ## map the files, so that the frames are copied straight into the buffers
+            in_features, out_features = self.load_utterance_features(self.file_index)
+            lab_frame_number = in_features.shape[0]
+            out_frame_number = out_features.shape[0]
 
             frame_number = lab_frame_number
             if abs(lab_frame_number - out_frame_number) < 5:    ## we allow small difference here. may not be correct, but sometimes, there is one/two frames difference
@@ -783,10 +991,23 @@ class ListDataProvider(object):
         temp_set_x = temp_set_x[0:current_index, ]
         temp_set_y = temp_set_y[0:current_index, ]
 
-        numpy.random.seed(271639)
-        numpy.random.shuffle(temp_set_x)
-        numpy.random.seed(271639)
-        numpy.random.shuffle(temp_set_y)
+        ## one permutation for both inputs and outputs, from a generator seeded for this epoch
+        shuffle_index = self.shuffle_rng.permutation(current_index)
+
+        ## the last frames of the permutation wait in the pool for the next block, unless this is the last block
+        if self.shuffle_pool_size > 0 and not self.end_reading:
+            pool_index = numpy.sort(shuffle_index[current_index - self.shuffle_pool_size:])
+            self.pool_data_x = temp_set_x[pool_index]
+            self.pool_data_y = temp_set_y[pool_index]
+            self.pool_frame_number = len(pool_index)
+
+            shuffle_index = shuffle_index[0:current_index - self.shuffle_pool_size]
+
+        if self.shuffle_by_index:
+            self.shuffle_index = shuffle_index
+        else:
+            temp_set_x = temp_set_x[shuffle_index]
+            temp_set_y = temp_set_y[shuffle_index]
 
         shared_set_x = self.make_shared(temp_set_x, 'x')
         shared_set_y = self.make_shared(temp_set_y, 'y')
@@ -801,6 +1022,147 @@ class ListDataProvider(object):
         return self.end_reading
 
 
+class PrefetchingDataProvider(object):
+    """ This class wraps a ListDataProvider and loads the next partition on a background thread while the current one is being used for training.
+
+    Partitions are produced by a single thread in exactly the order the wrapped provider would give them, so the batch order (and therefore the training result) is unchanged.
+    The wrapped provider returns plain numpy arrays in place of theano shared variables, so only the main thread touches theano.
+
+    """
+    ## attributes of the wrapped provider that describe the partition it has just loaded
+    PARTITION_ATTRIBUTES = ('shuffle_index', )
+
+    def __init__(self, data_provider, queue_depth=2, memory_budget=0):
+        """Initialise a prefetching data provider
+
+        :param data_provider: a ListDataProvider, positioned at the start of an epoch
+        :param queue_depth: the maximum number of partitions loaded ahead of the one in use
+        :param memory_budget: the maximum memory in MB for the partitions loaded ahead. 0 means no limit.
+        """
+
+        self.logger = logging.getLogger("ListDataProvider")
+
+        self.data_provider = data_provider
+        self.data_provider.share_data = False
+
+        ## the buffers are float32
+        partition_bytes = data_provider.buffer_size * (data_provider.n_ins + data_provider.n_outs) * 4
+        if memory_budget > 0:
+            queue_depth = min(queue_depth, int(memory_budget * 1024 * 1024 // partition_bytes))
+        self.queue_depth = max(1, queue_depth)
+
+        self.end_reading = False
+        for name in self.PARTITION_ATTRIBUTES:
+            setattr(self, name, None)
+
+        self.producer = None
+        self.stop_event = None
+        self.partition_queue = None
+
+        self.logger.debug('prefetching up to %d partitions of %.1f MB' % (self.queue_depth, partition_bytes / 1048576.0))
+
+        self.start()
+
+    def __getattr__(self, name):
+        ## anything else is answered by the wrapped provider
+        if name == 'data_provider':
+            raise AttributeError(name)
+        return getattr(self.data_provider, name)
+
+    def start(self):
+        """Start loading the partitions of the current epoch in the background.
+
+        """
+        self.stop_event = threading.Event()
+        self.partition_queue = queue.Queue(maxsize=self.queue_depth)
+
+        ## the position of the consumer, which the producer is ahead of
+        self.reader_state = self.data_provider.get_state()
+
+        self.producer = threading.Thread(target=self._produce, args=(self.partition_queue, self.stop_event))
+        self.producer.daemon = True
+        self.producer.start()
+
+    def stop(self):
+        """Stop the background thread, discarding any partitions loaded ahead.
+
+        """
+        if self.producer is None:
+            return
+
+        self.stop_event.set()
+        self.producer.join()
+        self.producer = None
+
+    def _produce(self, partition_queue, stop_event):
+        try:
+            while not stop_event.is_set():
+                partition = self.data_provider.load_one_partition()
+                finished = self.data_provider.is_finish()
+                attributes = dict((name, getattr(self.data_provider, name)) for name in self.PARTITION_ATTRIBUTES)
+                attributes['reader_state'] = self.data_provider.get_state()
+                if not self._put(partition_queue, stop_event, (partition, finished, attributes, None)) or finished:
+                    break
+        except BaseException as e:
+            self.logger.exception('failed to load partition')
+            self._put(partition_queue, stop_event, (None, True, {}, e))
+
+    def _put(self, partition_queue, stop_event, item):
+        ## wait for a free slot, giving up if the consumer has asked us to stop
+        while not stop_event.is_set():
+            try:
+                partition_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def load_one_partition(self):
+        if self.producer is None:
+            self.start()
+
+        partition, finished, attributes, error = self.partition_queue.get()
+        self.__dict__.update(attributes)
+        if error is not None:
+            self.stop()
+            self.end_reading = True
+            raise error
+
+        if finished:
+            self.stop()
+        self.end_reading = finished
+
+        return partition
+
+    def is_finish(self):
+        return self.end_reading
+
+    def get_state(self):
+        """Get the position after the last partition returned, rather than that of the background thread.
+
+        """
+        return  self.reader_state
+
+    def set_state(self, state):
+        self.stop()
+        self.data_provider.set_state(state)
+        self.end_reading = self.data_provider.is_finish()
+
+        self.start()
+
+    def reset(self):
+        """Start a new epoch. Loading of its first partitions begins straight away.
+
+        """
+        self.stop()
+        self.data_provider.reset()
+        self.end_reading = False
+
+        self.start()
+
+        self.logger.debug('reset')
+
+
 class ListDataProviderWithProjectionIndex(ListDataProvider):
     '''
     Added kwarg index_to_project to __init__
@@ -817,6 +1179,7 @@ class ListDataProviderWithProjectionIndex(ListDataProvider):
         self.indexes_only = indexes_only
 
     def load_next_partition_with_projection(self):
+        import theano
 
         shared_set_xy, temp_set_x, temp_set_y = self.load_next_partition()
 
@@ -0,0 +1,123 @@
+"""Tests the vectorised F0 interpolation and dynamic features against the original frame loops.
+"""
+
+import sys
+sys.path.append('../src')
+
+import numpy
+from frontend.acoustic_base import AcousticBase
+
+
+def _reference_interpolate_f0(data):
+  data = numpy.reshape(data, (data.size, 1))
+
+  vuv_vector = numpy.zeros((data.size, 1))
+  vuv_vector[data > 0.0] = 1.0
+  vuv_vector[data <= 0.0] = 0.0
+
+  ip_data = data
+
+  frame_number = data.size
+  last_value = 0.0
+  for i in range(frame_number):
+    if data[i] <= 0.0:
+      j = i + 1
+      for j in range(i + 1, frame_number):
+        if data[j] > 0.0:
+          break
+      if j < frame_number - 1:
+        if last_value > 0.0:
+          step = (data[j] - data[i - 1]) / float(j - i + 1)
+          for k in range(i, j):
+            ip_data[k] = data[i - 1] + step * (k - i + 1)
+        else:
+          for k in range(i, j):
+            ip_data[k] = data[j]
+      else:
+        for k in range(i, frame_number):
+          ip_data[k] = last_value
+    else:
+      ip_data[i] = data[i]
+      last_value = data[i]
+
+  return ip_data, vuv_vector
+
+
+def _reference_dynamic_vector(vector, dynamic_win, frame_number):
+  vector = numpy.reshape(vector, (frame_number, 1))
+
+  win_length = len(dynamic_win)
+  win_width = int(win_length / 2)
+  temp_vector = numpy.zeros((frame_number + 2 * win_width, 1))
+  delta_vector = numpy.zeros((frame_number, 1))
+
+  temp_vector[win_width:frame_number + win_width] = vector
+  for w in range(win_width):
+    temp_vector[w, 0] = vector[0, 0]
+    temp_vector[frame_number + win_width + w, 0] = vector[frame_number - 1, 0]
+
+  for i in range(frame_number):
+    for w in range(win_length):
+      delta_vector[i] += temp_vector[i + w, 0] * dynamic_win[w]
+
+  return delta_vector
+
+
+def test_interpolate_f0():
+  """Tests gaps at either end, single voiced frames at the edges and fully unvoiced data.
+  """
+  rng = numpy.random.RandomState(1234)
+  acoustic_base = AcousticBase()
+
+  cases = [[0, 0, 5.0, 0, 0, 6.0, 0],
+           [5.0, 0, 0, 0, 6.0],
+           [0, 0, 0, 7.0],
+           [5.0, 0, 0, 7.0, 8.0],
+           [5.0],
+           [0.0],
+           [-1.0e10, -1.0e10],
+           [0, 4.0, 0],
+           [4.0, 5.0, 0, 0]]
+  for frame_number in [1, 2, 3, 10, 500]:
+    f0 = rng.uniform(4.0, 6.0, frame_number)
+    f0[rng.uniform(size=frame_number) < 0.4] = -1.0e10
+    cases.append(f0)
+    f0 = rng.uniform(4.0, 6.0, frame_number)
+    f0[rng.uniform(size=frame_number) < 0.7] = 0.0
+    cases.append(f0)
+
+  for case in cases:
+    for dtype in [numpy.float32, numpy.float64]:
+      reference_ip, reference_vuv = _reference_interpolate_f0(numpy.array(case, dtype=dtype))
+      ip_data, vuv_vector = acoustic_base.interpolate_f0(numpy.array(case, dtype=dtype))
+      assert ip_data.dtype == reference_ip.dtype
+      assert numpy.array_equal(ip_data, reference_ip), case
+      assert numpy.array_equal(vuv_vector, reference_vuv), case
+
+
+def test_compute_dynamic_matrix():
+  """Tests standard and wider windows, with edge padding on short and long data.
+  """
+  rng = numpy.random.RandomState(1234)
+  acoustic_base = AcousticBase()
+
+  windows = [[-0.5, 0.0, 0.5], [1.0, -2.0, 1.0], [-0.2, -0.1, 0.0, 0.1, 0.2], [1.0]]
+  for frame_number in [1, 2, 5, 301]:
+    for dtype in [numpy.float32, numpy.float64]:
+      data_matrix = rng.randn(frame_number, 7).astype(dtype)
+      for dynamic_win in windows:
+        dynamic_matrix = acoustic_base.compute_dynamic_matrix(data_matrix, dynamic_win, frame_number, 7)
+        for dim in range(7):
+          reference = _reference_dynamic_vector(data_matrix[:, dim], dynamic_win, frame_number)
+          assert numpy.array_equal(dynamic_matrix[:, dim:dim + 1], reference)
+          assert numpy.array_equal(acoustic_base.compute_dynamic_vector(data_matrix[:, dim], dynamic_win, frame_number),
+                                   reference)
+
+
+def main():
+  test_interpolate_f0()
+  test_compute_dynamic_matrix()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,55 @@
+"""Tests the memory-mapped and frame-range readers of BinaryIOCollection.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+
+
+def test_binary_io_readers():
+  """Tests that the mapped, ranged and sliced reads agree with the full read.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    io_funcs = BinaryIOCollection()
+    file_name = os.path.join(data_dir, 'utt.cmp')
+    features = numpy.random.RandomState(1234).randn(37, 5)
+    io_funcs.array_to_binary_file(features, file_name)
+    features = io_funcs.load_binary_file(file_name, 5)
+    assert features.dtype == numpy.float32
+
+    mapped_features = io_funcs.load_binary_file_mmap(file_name, 5)
+    assert numpy.array_equal(mapped_features, features)
+    assert not mapped_features.flags.writeable
+
+    assert numpy.array_equal(io_funcs.load_binary_file_frames(file_name, 5, 3, 11), features[3:11])
+    assert io_funcs.load_binary_file_frames(file_name, 5, 30, 60).shape == (7, 5)
+
+    reader = io_funcs.open_binary_file(file_name, 5)
+    assert len(reader) == 37
+    for index in [slice(0, 37), slice(5, 9), slice(-4, None), slice(20, 10), slice(1, 30, 4), slice(None, None, -3)]:
+      assert numpy.array_equal(reader[index], features[index]), index
+    assert numpy.array_equal(reader[-1], features[-1])
+
+    ## float32 data is written as it is; a mapped view of the output file itself is copied first
+    io_funcs.array_to_binary_file(io_funcs.load_binary_file_mmap(file_name, 5)[::2], file_name)
+    assert numpy.array_equal(io_funcs.load_binary_file(file_name, 5), features[::2])
+
+    empty_file_name = os.path.join(data_dir, 'empty.cmp')
+    io_funcs.array_to_binary_file(numpy.zeros((0, 5), dtype=numpy.float32), empty_file_name)
+    assert io_funcs.load_binary_file_mmap(empty_file_name, 5).shape == (0, 5)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_binary_io_readers()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,140 @@
+"""Tests data-parallel training: the shared-memory layout, the weighting of the gradients and the whole trainer.
+"""
+
+import sys
+import ctypes
+import multiprocessing
+sys.path.append('../src')
+
+import numpy
+import pytest
+from training_schemes.shared_parameters import SharedParameterLayout, weighted_gradient
+
+N_INS = 6
+N_OUTS = 4
+
+
+class _StubParam(object):
+  def __init__(self, value):
+    self.value = value
+
+  def get_value(self, borrow=False):
+    return self.value
+
+
+class _StubLinearModel(object):
+  """A linear regression with a mean squared error over frames, whose gradients are computed in numpy.
+  """
+  def __init__(self, rng):
+    self.params = [_StubParam(rng.normal(size=(N_INS, N_OUTS))), _StubParam(rng.normal(size=N_OUTS))]
+
+  def get_finetune_params(self, use_lhuc=False):
+    return self.params
+
+  def error_and_gradients(self, x, y):
+    (W, b) = [param.get_value() for param in self.params]
+    residual = x.dot(W) + b - y
+    error = numpy.mean(numpy.sum(residual ** 2, axis=1))
+    return error, [2.0 * x.T.dot(residual) / x.shape[0], 2.0 * residual.mean(axis=0)]
+
+
+def test_parameter_layout():
+  """Tests that the parameters and the gradients of each worker have their own places in the shared buffers.
+  """
+  params = [numpy.zeros((3, 4)), numpy.zeros(4), numpy.zeros((2, 5, 2)), numpy.zeros(1)]
+  layout = SharedParameterLayout.from_params([_StubParam(value) for value in params])
+  assert layout.size == 12 + 4 + 20 + 1
+  assert layout.offsets == [0, 12, 16, 36]
+
+  param_buffer = multiprocessing.RawArray(ctypes.c_double, layout.size)
+  for (index, param_view) in enumerate(layout.param_views(param_buffer)):
+    assert param_view.shape == params[index].shape
+    param_view[:] = index + 1
+  assert list(numpy.ctypeslib.as_array(param_buffer)) == [1] * 12 + [2] * 4 + [3] * 20 + [4]
+
+  gradient_buffer = multiprocessing.RawArray(ctypes.c_float, layout.size * 3)
+  gradient_matrix = layout.gradient_matrix(gradient_buffer, 3)
+  for worker_index in range(3):
+    gradient_matrix[worker_index] = worker_index + 1
+  assert list(numpy.ctypeslib.as_array(gradient_buffer)) == [1] * layout.size + [2] * layout.size + [3] * layout.size
+
+  flat_values = numpy.arange(layout.size)
+  for (offset, value) in zip(layout.offsets, layout.split(flat_values)):
+    assert value.ravel()[0] == offset
+
+
+def test_gradient_weighting():
+  """Tests that the gradients of uneven shares of a minibatch add up to the gradient of the whole minibatch.
+  """
+  rng = numpy.random.RandomState(0)
+  dnn_model = _StubLinearModel(rng)
+  layout = SharedParameterLayout.from_params(dnn_model.get_finetune_params())
+  x = rng.normal(size=(10, N_INS))
+  y = rng.normal(size=(10, N_OUTS))
+
+  ## the shares of three workers, as DataParallelTrainer.train_minibatch makes them
+  bounds = numpy.linspace(0, 10, 4).astype(int)
+  gradient_matrix = numpy.zeros((3, layout.size))
+  errors = []
+  for worker_index in range(3):
+    (start, end) = (bounds[worker_index], bounds[worker_index + 1])
+    error, gradients = dnn_model.error_and_gradients(x[start:end], y[start:end])
+    gradient_matrix[worker_index] = numpy.concatenate([gradient.ravel() for gradient in gradients])
+    errors.append(error)
+
+  gradient, weights = weighted_gradient(gradient_matrix, numpy.diff(bounds))
+  error, gradients = dnn_model.error_and_gradients(x, y)
+  for (value, expected) in zip(layout.split(gradient), gradients):
+    assert numpy.allclose(value, expected)
+  assert numpy.isclose(numpy.dot(weights, errors), error)
+
+
+def test_data_parallel_training():
+  """Tests that training with two workers gives the same errors and parameters as the training function of the network.
+  """
+  theano = pytest.importorskip('theano')
+  from models.deep_rnn import DeepRecurrentNetwork
+  from training_schemes.data_parallel import DataParallelTrainer
+
+  (batch_size, step_number) = (15, 5)
+  rng = numpy.random.RandomState(1)
+  partition_x = rng.normal(size=(batch_size * step_number + 7, N_INS)).astype(numpy.float32)
+  partition_y = rng.normal(size=(batch_size * step_number + 7, N_OUTS)).astype(numpy.float32)
+  shuffle_index = rng.permutation(partition_x.shape[0])[0:batch_size * step_number].astype(numpy.int64)
+
+  def make_model():
+    return DeepRecurrentNetwork(n_in=N_INS, hidden_layer_size=[8, 8], n_out=N_OUTS, L1_reg=0.0, L2_reg=0.00001,
+                                hidden_layer_type=['TANH', 'SIGMOID'])
+
+  def shared(value, name):
+    return theano.shared(numpy.asarray(value, dtype=theano.config.floatX), name=name, borrow=True)
+
+  reference_model = make_model()
+  train_xy = (shared(partition_x, 'x'), shared(partition_y, 'y'))
+  train_fn, _ = reference_model.build_finetune_functions(train_xy, train_xy, minibatch_slices=True,
+                                                         train_shared_index=theano.shared(shuffle_index, name='index', borrow=True))
+
+  parallel_model = make_model()
+  trainer = DataParallelTrainer(parallel_model, N_INS, N_OUTS, partition_x.shape[0], num_workers=2)
+  try:
+    trainer.set_partition(partition_x, partition_y, shuffle_index)
+    for index in range(step_number):
+      (lr, mom) = (0.01, 0.9 if index > 1 else 0.3)
+      reference_error = train_fn(lr, mom, index * batch_size, (index + 1) * batch_size)
+      parallel_error = trainer.train_minibatch(lr, mom, index * batch_size, (index + 1) * batch_size)
+      assert numpy.allclose(parallel_error, reference_error, rtol=1e-4, atol=1e-6), index
+  finally:
+    trainer.close()
+
+  for (parallel_param, reference_param) in zip(parallel_model.params, reference_model.params):
+    assert numpy.allclose(parallel_param.get_value(), reference_param.get_value(), rtol=1e-4, atol=1e-6), parallel_param.name
+
+
+def main():
+  test_parameter_layout()
+  test_gradient_weighting()
+  test_data_parallel_training()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,98 @@
+"""Tests the broadcast normalisation of MinMaxNormalisation and MeanVarianceNorm against the tiled formulas.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.mean_variance_norm import MeanVarianceNorm
+from frontend.min_max_norm import MinMaxNormalisation
+
+FEATURE_DIMENSION = 6
+
+
+def _make_files(data_dir, file_number):
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(1234)
+  file_list = []
+  for i in range(file_number):
+    features = rng.randn(rng.randint(1, 80), FEATURE_DIMENSION) * 3.0 + 2.0
+    features[:, 4] = 0.5  ## a constant column
+    file_list.append(os.path.join(data_dir, 'utt_%d.cmp' % i))
+    io_funcs.array_to_binary_file(features, file_list[-1])
+  return file_list
+
+
+def _load(file_list):
+  io_funcs = BinaryIOCollection()
+  return [io_funcs.load_binary_file(file_name, FEATURE_DIMENSION) for file_name in file_list]
+
+
+def test_min_max_normalisation():
+  """Tests normalisation with excluded columns, the thread pool and denormalisation back.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    in_file_list = _make_files(data_dir, 9)
+    out_file_lists = {}
+    for num_workers in [1, 4]:
+      out_file_lists[num_workers] = [file_name + '.norm%d' % num_workers for file_name in in_file_list]
+      normaliser = MinMaxNormalisation(FEATURE_DIMENSION, min_value=0.01, max_value=0.99, exclude_columns=[1, 5])
+      normaliser.find_min_max_values(in_file_list)
+      normaliser.normalise_data(in_file_list, out_file_lists[num_workers], num_workers=num_workers)
+
+    fea_max_min_diff = normaliser.max_vector - normaliser.min_vector
+    target_max_min_diff = numpy.where(fea_max_min_diff <= 0.0, 1.0, 0.98)
+    fea_max_min_diff = numpy.where(fea_max_min_diff <= 0.0, 1.0, fea_max_min_diff)
+
+    for (features, norm_features, pool_features) in zip(_load(in_file_list), _load(out_file_lists[1]), _load(out_file_lists[4])):
+      reference = target_max_min_diff / fea_max_min_diff * (features - normaliser.min_vector) + 0.01
+      reference[:, [1, 5]] = features[:, [1, 5]]
+      assert numpy.allclose(norm_features, reference, rtol=1e-6, atol=1e-6)
+      assert numpy.array_equal(norm_features[:, [1, 5]], features[:, [1, 5]])
+      assert numpy.array_equal(norm_features, pool_features)
+
+    denormaliser = MinMaxNormalisation(FEATURE_DIMENSION, min_value=0.01, max_value=0.99,
+                                       min_vector=normaliser.min_vector[0], max_vector=normaliser.max_vector[0])
+    denorm_file_list = [file_name + '.denorm' for file_name in in_file_list]
+    denormaliser.denormalise_data(out_file_lists[1], denorm_file_list, num_workers=2)
+    for (features, denorm_features) in zip(_load(in_file_list), _load(denorm_file_list)):
+      assert numpy.allclose(denorm_features[:, [0, 2, 3, 4]], features[:, [0, 2, 3, 4]], rtol=1e-5, atol=1e-5)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_mean_variance_normalisation():
+  """Tests normalisation and denormalisation in place.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    in_file_list = _make_files(data_dir, 7)
+    original_features = _load(in_file_list)
+
+    normaliser = MeanVarianceNorm(feature_dimension=FEATURE_DIMENSION)
+    mean_vector, std_vector = normaliser.compute_mean_std(in_file_list, 0, FEATURE_DIMENSION)
+    std_vector[:, 4] = 1.0
+    normaliser.feature_normalisation(in_file_list, in_file_list, num_workers=3)
+
+    for (features, norm_features) in zip(original_features, _load(in_file_list)):
+      assert numpy.allclose(norm_features, (features - mean_vector) / std_vector, rtol=1e-5, atol=1e-6)
+
+    normaliser.feature_denormalisation(in_file_list, in_file_list, mean_vector, std_vector)
+    for (features, denorm_features) in zip(original_features, _load(in_file_list)):
+      assert numpy.allclose(denorm_features, features, rtol=1e-5, atol=1e-5)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_min_max_normalisation()
+  test_mean_variance_normalisation()
+
+
+if __name__ == '__main__':
+  main()
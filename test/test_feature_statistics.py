@@ -0,0 +1,89 @@
+"""Tests the one-pass feature statistics and their use by the normalisers.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.feature_statistics import FeatureStatistics, compute_feature_statistics
+from frontend.mean_variance_norm import MeanVarianceNorm
+from frontend.min_max_norm import MinMaxNormalisation
+
+FEATURE_DIMENSION = 7
+
+
+def _make_files(data_dir, file_number, offset=0.0):
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(1234)
+  file_list = []
+  all_features = []
+  for i in range(file_number):
+    features = (rng.randn(rng.randint(1, 60), FEATURE_DIMENSION) * numpy.arange(1, FEATURE_DIMENSION + 1)
+                + offset).astype(numpy.float32)
+    file_list.append(os.path.join(data_dir, 'utt_%d.cmp' % i))
+    io_funcs.array_to_binary_file(features, file_list[-1])
+    all_features.append(features)
+  return file_list, numpy.concatenate(all_features, axis=0).astype(numpy.float64)
+
+
+def test_feature_statistics():
+  """Tests in-process and sharded statistics against NumPy on the concatenated data.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    for offset in [0.0, 1.0e4]:
+      file_list, all_features = _make_files(data_dir, 23, offset)
+      for num_workers in [1, 3]:
+        statistics = compute_feature_statistics(file_list, FEATURE_DIMENSION, num_workers)
+        assert statistics.frame_number == all_features.shape[0]
+        assert numpy.allclose(statistics.mean_vector(), numpy.mean(all_features, axis=0, keepdims=True), rtol=1e-12)
+        assert numpy.allclose(statistics.std_vector(), numpy.std(all_features, axis=0, keepdims=True), rtol=1e-9)
+        assert numpy.array_equal(statistics.min_vector(), numpy.amin(all_features, axis=0, keepdims=True))
+        assert numpy.array_equal(statistics.max_vector(), numpy.amax(all_features, axis=0, keepdims=True))
+
+    ## merging with empty statistics changes nothing
+    statistics = FeatureStatistics(FEATURE_DIMENSION)
+    statistics.accumulate(all_features)
+    mean = statistics.mean.copy()
+    statistics.merge(FeatureStatistics(FEATURE_DIMENSION))
+    statistics.accumulate(numpy.zeros((0, FEATURE_DIMENSION)))
+    assert numpy.array_equal(statistics.mean, mean)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_normaliser_statistics():
+  """Tests that the one-pass normaliser statistics agree with the separate passes.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    file_list, all_features = _make_files(data_dir, 11)
+
+    normaliser = MeanVarianceNorm(feature_dimension=FEATURE_DIMENSION)
+    mean_vector = normaliser.compute_mean(file_list, 0, FEATURE_DIMENSION)
+    std_vector = normaliser.compute_std(file_list, mean_vector, 0, FEATURE_DIMENSION)
+    one_pass_mean_vector, one_pass_std_vector = normaliser.compute_mean_std(file_list, 0, FEATURE_DIMENSION)
+    ## the separate passes sum the float32 features in float32
+    assert numpy.allclose(mean_vector, one_pass_mean_vector, rtol=1e-5, atol=1e-6)
+    assert numpy.allclose(std_vector, one_pass_std_vector, rtol=1e-5, atol=1e-6)
+
+    min_max_normaliser = MinMaxNormalisation(feature_dimension=FEATURE_DIMENSION)
+    min_max_normaliser.find_min_max_values(file_list, num_workers=2)
+    assert min_max_normaliser.min_vector.shape == (1, FEATURE_DIMENSION)
+    assert numpy.array_equal(min_max_normaliser.min_vector, numpy.amin(all_features, axis=0, keepdims=True))
+    assert numpy.array_equal(min_max_normaliser.max_vector, numpy.amax(all_features, axis=0, keepdims=True))
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_feature_statistics()
+  test_normaliser_statistics()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,81 @@
+"""Tests the training function of DeepRecurrentNetwork which slices minibatches out of a whole partition.
+"""
+
+import sys
+sys.path.append('../src')
+
+import numpy
+import pytest
+
+theano = pytest.importorskip('theano')
+
+from models.deep_rnn import DeepRecurrentNetwork
+
+N_INS = 6
+N_OUTS = 4
+BATCH_SIZE = 16
+
+
+def _make_model():
+  return DeepRecurrentNetwork(n_in=N_INS, hidden_layer_size=[8, 8], n_out=N_OUTS, L1_reg=0.0, L2_reg=0.00001,
+                              hidden_layer_type=['TANH', 'TANH'])
+
+
+def _shared(value, name):
+  return theano.shared(numpy.asarray(value, dtype=theano.config.floatX), name=name, borrow=True)
+
+
+def _train(shuffle_index=None, step_number=6):
+  """Trains one model on minibatches sliced from the partition, and one on minibatches uploaded one at a time.
+  """
+  rng = numpy.random.RandomState(0)
+  partition_x = rng.normal(size=(BATCH_SIZE * step_number, N_INS)).astype(numpy.float32)
+  partition_y = rng.normal(size=(BATCH_SIZE * step_number, N_OUTS)).astype(numpy.float32)
+  valid_xy = (_shared(partition_x, 'valid_x'), _shared(partition_y, 'valid_y'))
+
+  sliced_model = _make_model()
+  train_set_index = None
+  if shuffle_index is not None:
+    train_set_index = theano.shared(shuffle_index, name='index', borrow=True)
+  sliced_fn, _ = sliced_model.build_finetune_functions((_shared(partition_x, 'x'), _shared(partition_y, 'y')), valid_xy,
+                                                      minibatch_slices=True, train_shared_index=train_set_index)
+
+  batch_model = _make_model()
+  (batch_x, batch_y) = (_shared(partition_x[0:BATCH_SIZE], 'x'), _shared(partition_y[0:BATCH_SIZE], 'y'))
+  batch_fn, _ = batch_model.build_finetune_functions((batch_x, batch_y), valid_xy)
+
+  frame_order = numpy.arange(partition_x.shape[0]) if shuffle_index is None else shuffle_index
+  for index in range(step_number):
+    (lr, mom) = (0.01, 0.9 if index > 2 else 0.3)
+    sliced_error = sliced_fn(lr, mom, index * BATCH_SIZE, (index + 1) * BATCH_SIZE)
+
+    minibatch = frame_order[index * BATCH_SIZE:(index + 1) * BATCH_SIZE]
+    batch_x.set_value(numpy.asarray(partition_x[minibatch], dtype=theano.config.floatX), borrow=True)
+    batch_y.set_value(numpy.asarray(partition_y[minibatch], dtype=theano.config.floatX), borrow=True)
+    batch_error = batch_fn(lr, mom)
+
+    assert numpy.allclose(sliced_error, batch_error, rtol=1e-5, atol=1e-6), index
+
+  for (sliced_param, batch_param) in zip(sliced_model.params, batch_model.params):
+    assert numpy.allclose(sliced_param.get_value(), batch_param.get_value(), rtol=1e-5, atol=1e-6), sliced_param.name
+
+
+def test_minibatch_slices():
+  """Tests that slicing minibatches out of the partition gives the same errors and parameters as uploading each one.
+  """
+  _train()
+
+
+def test_minibatch_slices_with_index():
+  """Tests the same, with the frames taken in the order of a shuffle index.
+  """
+  _train(numpy.random.RandomState(1).permutation(BATCH_SIZE * 6).astype(numpy.int64))
+
+
+def main():
+  test_minibatch_slices()
+  test_minibatch_slices_with_index()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+"""Tests waveform generation over many utterances, with the vocoder of each utterance replaced.
+"""
+
+import sys
+import logging
+import threading
+sys.path.append('../src')
+
+import utils.generate as generate
+
+
+class _Config(object):
+  def __init__(self, wavgen_workers):
+    self.fw_alpha = 0.42
+    self.do_post_filtering = False
+    self.apply_GV = False
+    self.wavgen_workers = wavgen_workers
+
+
+class _RecordingHandler(logging.Handler):
+  def __init__(self):
+    logging.Handler.__init__(self)
+    self.records = []
+
+  def emit(self, record):
+    self.records.append(record)
+
+
+class _FakeMultiprocessing(object):
+  @staticmethod
+  def cpu_count():
+    return 3
+
+
+def _generate(file_id_list, failed_ids, wavgen_workers):
+  """Generates the waveforms of file_id_list, failing for failed_ids.
+
+  Returns the ids the vocoder was called for, the log records, the pool sizes used and the error raised, if any.
+  """
+  called_ids = []
+  pool_sizes = []
+  lock = threading.Lock()
+
+  def fake_utterance(gen_dir, filename, cfg, fw_coef, gv_stats=None):
+    with lock:
+      called_ids.append(filename)
+    if filename in failed_ids:
+      raise OSError('vocoder failed for %s' % filename)
+
+  def recording_pool(num_workers):
+    pool_sizes.append(num_workers)
+    return original_pool(num_workers)
+
+  logger = logging.getLogger('test_generate')
+  logger.setLevel(logging.DEBUG)
+  handler = _RecordingHandler()
+  logger.addHandler(handler)
+
+  (original_utterance, original_pool, original_multiprocessing) = (generate.wavgen_straight_type_utterance, generate.ThreadPool, generate.multiprocessing)
+  generate.wavgen_straight_type_utterance = fake_utterance
+  generate.ThreadPool = recording_pool
+  generate.multiprocessing = _FakeMultiprocessing
+  error = None
+  try:
+    generate.wavgen_straight_type_vocoder('gen', file_id_list, _Config(wavgen_workers), logger)
+  except OSError as e:
+    error = e
+  finally:
+    (generate.wavgen_straight_type_utterance, generate.ThreadPool, generate.multiprocessing) = (original_utterance, original_pool, original_multiprocessing)
+    logger.removeHandler(handler)
+
+  return called_ids, handler.records, pool_sizes, error
+
+
+def test_all_created():
+  """Tests that every waveform is created, in order without workers, and without an error.
+  """
+  file_id_list = ['utt_%d' % i for i in range(6)]
+  for (wavgen_workers, expected_pool_sizes) in [(1, []), (2, [2]), (0, [3])]:
+    called_ids, records, pool_sizes, error = _generate(file_id_list, set(), wavgen_workers)
+    assert error is None
+    assert pool_sizes == expected_pool_sizes
+    if wavgen_workers == 1:
+      assert called_ids == file_id_list
+    assert sorted(called_ids) == file_id_list
+    assert not [record for record in records if record.levelno >= logging.CRITICAL]
+    assert records[-1].getMessage().startswith('created 6 waveforms in')
+
+
+def test_failed_files():
+  """Tests that each failed file is logged, the others are still created, and an error is raised at the end.
+  """
+  file_id_list = ['utt_%d' % i for i in range(7)]
+  failed_ids = set(['utt_1', 'utt_4', 'utt_5'])
+  for wavgen_workers in [1, 0]:
+    called_ids, records, pool_sizes, error = _generate(file_id_list, failed_ids, wavgen_workers)
+    assert isinstance(error, OSError) and '3 files' in str(error)
+    assert sorted(called_ids) == file_id_list
+
+    messages = [record.getMessage() for record in records]
+    for filename in file_id_list:
+      failure_messages = [message for message in messages if message.startswith('failed to create waveform') and filename in message]
+      assert len(failure_messages) == (1 if filename in failed_ids else 0), filename
+    assert [message for message in messages if message.startswith('created 4 waveforms in')]
+    ## with workers, the failed files are listed in the order they finished
+    assert messages[-1].startswith('3 waveforms could not be created: ')
+    assert set(messages[-1].split(': ')[1].split()) == failed_ids
+
+  ## only the waveforms created count towards the rate
+  called_ids, records, pool_sizes, error = _generate(file_id_list, set(file_id_list), 2)
+  assert [record.getMessage() for record in records if record.getMessage().startswith('created 0 waveforms in')][0].endswith('(0.00 per second)')
+
+
+def main():
+  test_all_created()
+  test_failed_files()
+
+
+if __name__ == '__main__':
+  main()
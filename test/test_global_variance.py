@@ -0,0 +1,84 @@
+"""Tests GV enhancement and the computation of GV statistics.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.global_variance import GlobalVariance, compute_gv_statistics
+
+
+def test_enhance():
+  """Tests the enhancement against the per-utterance formula used before.
+  """
+  rng = numpy.random.RandomState(0)
+  (frame_number, dimension) = (50, 4)
+  ref_gv_mean = rng.uniform(0.5, 1.0, size=(dimension, 1))
+  ref_gv_std = rng.uniform(0.1, 0.2, size=(dimension, 1))
+  gen_gv_mean = rng.uniform(0.3, 0.6, size=(dimension, 1))
+  gen_gv_std = rng.uniform(0.1, 0.2, size=(dimension, 1))
+  gen_mgc = rng.normal(size=(frame_number, dimension))
+
+  gen_mu  = numpy.reshape(numpy.mean(gen_mgc, axis=0), (-1, 1))
+  gen_std = numpy.reshape(numpy.std(gen_mgc, axis=0), (-1, 1))
+  local_gv = (ref_gv_std/gen_gv_std) * (gen_std - gen_gv_mean) + ref_gv_mean
+  expected = numpy.repeat(local_gv, frame_number, 1).T / numpy.repeat(gen_std, frame_number, 1).T * (gen_mgc - numpy.repeat(gen_mu, frame_number, 1).T) + numpy.repeat(gen_mu, frame_number, 1).T
+
+  global_variance = GlobalVariance(ref_gv_mean, ref_gv_std, gen_gv_mean, gen_gv_std)
+  assert numpy.allclose(global_variance.enhance(gen_mgc), expected)
+
+
+def test_enhance_lf0():
+  """Tests that unvoiced lf0 frames are left as they are.
+  """
+  lf0 = numpy.array([[-1.0e+10], [5.0], [5.2], [-1.0e+10], [4.8]])
+  global_variance = GlobalVariance([0.4], [0.1], [0.2], [0.1], voiced_only=True)
+  enhanced = global_variance.enhance(lf0)
+
+  assert numpy.all(enhanced[[0, 3]] == -1.0e+10)
+  ## the generated GV is moved by ref_gv_mean - gen_gv_mean, as the GV standard deviations are equal
+  assert numpy.isclose(numpy.std(enhanced[[1, 2, 4]]), numpy.std(lf0[[1, 2, 4]]) + 0.2)
+  assert numpy.isclose(numpy.mean(enhanced[[1, 2, 4]]), 5.0)
+
+
+def test_statistics():
+  """Tests the statistics of a set of files, and that they are saved and loaded.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    io_funcs = BinaryIOCollection()
+    rng = numpy.random.RandomState(1)
+    file_list = []
+    utterance_gv = []
+    for i in range(5):
+      features = rng.normal(scale=i + 1.0, size=(30 + i, 3)).astype(numpy.float32)
+      file_list.append(os.path.join(data_dir, '%d.mgc' % i))
+      io_funcs.array_to_binary_file(features, file_list[-1])
+      utterance_gv.append(numpy.std(features.astype(numpy.float64), axis=0))
+
+    (gv_mean, gv_std) = compute_gv_statistics(file_list, 3)
+    assert numpy.allclose(gv_mean, numpy.mean(utterance_gv, axis=0))
+    assert numpy.allclose(gv_std, numpy.std(utterance_gv, axis=0))
+
+    global_variance = GlobalVariance.compute(file_list, file_list[:2], 3)
+    global_variance.save(data_dir, 'mgc')
+    assert os.path.isfile(os.path.join(data_dir, 'ref_gv.mean'))
+    loaded = GlobalVariance.load(data_dir, 'mgc', 3)
+    assert numpy.allclose(loaded.gen_gv_std, global_variance.gen_gv_std)
+    assert numpy.allclose(loaded.ref_gv_mean, global_variance.ref_gv_mean)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_enhance()
+  test_enhance_lf0()
+  test_statistics()
+
+
+if __name__ == '__main__':
+  main()
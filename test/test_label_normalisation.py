@@ -0,0 +1,214 @@
+"""Tests HTSLabelNormalisation against the reference regex question matching.
+"""
+
+import os
+import sys
+import re
+import glob
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from frontend.label_normalisation import HTSLabelNormalisation, HTSDurationLabelNormalisation
+from frontend.question_matcher import QuestionSetMatcher
+
+QUESTION_FILES = sorted(glob.glob('../misc/questions/*.hed'))
+LABEL_FILES = sorted(glob.glob('../misc/scripts/frontend/festival_utt_to_lab/test/labels/full/*.lab'))
+
+
+def _load_full_labels():
+  full_labels = []
+  for file_name in LABEL_FILES:
+    with open(file_name) as fid:
+      for line in fid.readlines():
+        line = line.strip()
+        if len(line) > 0:
+          full_labels.append(line.split()[-1])
+  return full_labels
+
+
+def _reference_label_vector(label_normaliser, full_label):
+  label_binary_vector = label_normaliser.pattern_matching_binary(full_label)
+  label_continuous_vector = label_normaliser.pattern_matching_continous_position(full_label)
+  return numpy.concatenate([label_binary_vector, label_continuous_vector], axis=1)
+
+
+def test_question_matcher_parity():
+  """Tests that the compiled question set gives the same vectors as the regex path.
+  """
+  full_labels = _load_full_labels()
+  assert len(full_labels) > 0, 'no test labels found'
+
+  for question_file_name in QUESTION_FILES:
+    label_normaliser = HTSLabelNormalisation(question_file_name)
+    for full_label in full_labels:
+      reference = _reference_label_vector(label_normaliser, full_label)
+      compiled = label_normaliser.question_matcher.match(full_label)
+      assert reference.shape == compiled.shape
+      assert numpy.array_equal(reference, compiled), \
+          'mismatch for %s on %s' % (question_file_name, full_label)
+
+
+def test_question_matcher_wildcards():
+  """Tests the pattern kinds that do not occur in the shipped question sets.
+  """
+  label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0])
+  questions = {'0': ('"C-a"', ['*-a+*']),
+               '1': ('"Start-x"', ['x^*']),
+               '2': ('"End-1"', ['*J:8+5-1']),
+               '3': ('"Exact"', ['x^x-a+b']),
+               '4': ('"No-wildcard"', ['-a+']),
+               '5': ('"LL-x"', ['*x^*']),
+               '6': ('"Inner"', ['*-?+b=*', '*/A:*/B:2*']),
+               '7': ('"Anything"', ['*'])}
+  matcher = QuestionSetMatcher(questions, {}, label_normaliser.wildcards2regex)
+
+  for full_label in ['x^x-a+b', 'y^x-a+b=c/A:1/B:2/J:8+5-1', 'x^a-b+c', '']:
+    label_normaliser.discrete_dict = {}
+    for (index, (question_key, question_list)) in questions.items():
+      re_list = []
+      for question in question_list:
+        processed_question = label_normaliser.wildcards2regex(question)
+        if 'LL-' in question_key:
+          processed_question = '^' + processed_question
+        re_list.append(re.compile(processed_question))
+      label_normaliser.discrete_dict[index] = re_list
+    reference = label_normaliser.pattern_matching_binary(full_label)
+    assert numpy.array_equal(reference, matcher.match_binary(full_label)), full_label
+
+
+def test_label_vector_cache():
+  """Tests that cached label vectors match, and that they persist across instances.
+  """
+  full_labels = _load_full_labels()
+  cache_dir = tempfile.mkdtemp()
+  try:
+    label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0], label_cache_size=10,
+                                             label_cache_dir=cache_dir)
+    for full_label in full_labels + full_labels:
+      reference = _reference_label_vector(label_normaliser, full_label)
+      assert numpy.array_equal(reference, label_normaliser.label_vector_cache.get(full_label))
+    label_normaliser.label_vector_cache.save()
+    assert len(os.listdir(cache_dir)) == 1, 'persistent label cache not saved'
+
+    label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0], label_cache_dir=cache_dir)
+    label_vector_cache = label_normaliser.label_vector_cache
+    for full_label in full_labels:
+      reference = _reference_label_vector(label_normaliser, full_label)
+      assert numpy.array_equal(reference, label_vector_cache.get(full_label))
+    assert label_vector_cache.miss_number == 0, 'persistent label cache not used'
+  finally:
+    shutil.rmtree(cache_dir)
+
+
+def test_label_vector_cache_memory():
+  """Tests that the cached label vectors are float32 and that the cache keeps within its memory limit.
+  """
+  full_labels = _load_full_labels()
+  label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0], label_cache_memory=0.01)
+  label_vector_cache = label_normaliser.label_vector_cache
+  for full_label in full_labels:
+    label_vector = label_vector_cache.get(full_label)
+    assert label_vector.dtype == numpy.float32
+    assert numpy.array_equal(_reference_label_vector(label_normaliser, full_label), label_vector)
+    assert 0 < label_vector_cache.lru_bytes <= label_vector_cache.max_bytes or len(label_vector_cache.lru) == 0
+  assert label_vector_cache.lru_bytes == sum(label_vector.nbytes for label_vector in label_vector_cache.lru.values())
+  assert len(label_vector_cache.lru) < len(set(full_labels))
+
+
+def test_state_frame_features():
+  """Tests the frame-level subphone features of a state-aligned phone.
+  """
+  full_label = _load_full_labels()[1]
+  state_frames = [2, 3, 1, 4, 2]
+  cache_dir = tempfile.mkdtemp()
+  try:
+    label_file_name = os.path.join(cache_dir, 'state_align.lab')
+    start_time = 0
+    with open(label_file_name, 'w') as fid:
+      for (state, frame_number) in enumerate(state_frames):
+        end_time = start_time + frame_number * 50000
+        fid.write('%d %d %s[%d]\n' % (start_time, end_time, full_label, state + 2))
+        start_time = end_time
+
+    label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0], subphone_feats='full')
+    label_matrix = label_normaliser.load_labels_with_state_alignment(label_file_name)
+  finally:
+    shutil.rmtree(cache_dir)
+
+  dict_size = label_normaliser.dict_size
+  phone_duration = sum(state_frames)
+  assert label_matrix.shape == (phone_duration, label_normaliser.dimension)
+  assert numpy.array_equal(label_matrix[:, :dict_size],
+                           numpy.tile(_reference_label_vector(label_normaliser, full_label), (phone_duration, 1)))
+
+  frame_index = 0
+  state_duration_base = 0
+  for (state, frame_number) in enumerate(state_frames):
+    state_index = state + 1
+    for i in range(frame_number):
+      expected = [float(i + 1) / frame_number, float(frame_number - i) / frame_number, frame_number,
+                  state_index, 6 - state_index, phone_duration, float(frame_number) / phone_duration,
+                  float(phone_duration - i - state_duration_base) / phone_duration,
+                  float(state_duration_base + i + 1) / phone_duration]
+      assert numpy.array_equal(label_matrix[frame_index, dict_size:], expected)
+      frame_index += 1
+    state_duration_base += frame_number
+
+
+def test_coarse_coding_features():
+  """Tests the coarse coding of each frame of a phone against the loop over frames, including phones of no frames.
+  """
+  label_normaliser = HTSLabelNormalisation(QUESTION_FILES[0])
+  label_normaliser.cc_features = numpy.random.RandomState(4).normal(size=(3, 600))
+  for dur in [0, 1, 2, 7, 200, 201, 350]:
+    expected = numpy.zeros((dur, 3))
+    for i in range(dur):
+      rel_indx = int((200/float(dur))*i)
+      expected[i] = [label_normaliser.cc_features[0, 300+rel_indx], label_normaliser.cc_features[1, 200+rel_indx],
+                     label_normaliser.cc_features[2, 100+rel_indx]]
+    assert numpy.array_equal(label_normaliser.extract_coarse_coding_features_relative(dur), expected), dur
+  assert label_normaliser.extract_coarse_coding_features_relative(0).shape == (0, 3)
+
+
+def test_process_pool_normalisation():
+  """Tests that normalising in worker processes gives the same files and label cache as in-process.
+  """
+  out_dir = tempfile.mkdtemp()
+  try:
+    for (normaliser_class, label_type, subphone_feats) in [(HTSLabelNormalisation, 'phone_align', 'minimal_phoneme'),
+                                                           (HTSDurationLabelNormalisation, 'state_align', 'full')]:
+      output_files = {}
+      for num_workers in [1, 2]:
+        cache_dir = os.path.join(out_dir, 'cache_%d' % num_workers)
+        output_files[num_workers] = [os.path.join(out_dir, '%d_%s' % (num_workers, os.path.basename(file_name)))
+                                     for file_name in LABEL_FILES]
+        label_normaliser = normaliser_class(QUESTION_FILES[0], subphone_feats=subphone_feats,
+                                            label_cache_dir=cache_dir, num_workers=num_workers)
+        label_normaliser.perform_normalisation(LABEL_FILES, output_files[num_workers], label_type=label_type)
+
+      for (single_file, pool_file) in zip(output_files[1], output_files[2]):
+        assert numpy.array_equal(numpy.fromfile(single_file, dtype=numpy.float32),
+                                 numpy.fromfile(pool_file, dtype=numpy.float32)), pool_file
+
+      label_vector_cache = normaliser_class(QUESTION_FILES[0], label_cache_dir=os.path.join(out_dir, 'cache_2')).label_vector_cache
+      assert set(label_vector_cache.persistent.keys()) == set(_load_full_labels()), 'worker label contexts not merged'
+      shutil.rmtree(out_dir)
+      os.mkdir(out_dir)
+  finally:
+    shutil.rmtree(out_dir)
+
+
+def main():
+  test_question_matcher_parity()
+  test_question_matcher_wildcards()
+  test_label_vector_cache()
+  test_label_vector_cache_memory()
+  test_state_frame_features()
+  test_coarse_coding_features()
+  test_process_pool_normalisation()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,48 @@
+"""Tests the utterance length index used for batch training of RNNs.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from utils.length_index import UtteranceLengthIndex
+
+
+def test_length_index():
+  """Tests that the lengths come from the file sizes and that changed files are looked up again.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    io_funcs = BinaryIOCollection()
+    x_file_name = os.path.join(data_dir, 'utt.lab')
+    y_file_name = os.path.join(data_dir, 'utt.cmp')
+    io_funcs.array_to_binary_file(numpy.zeros((120, 7)), x_file_name)
+    io_funcs.array_to_binary_file(numpy.zeros((118, 3)), y_file_name)
+    index_file = os.path.join(data_dir, 'file_lengths.json')
+
+    length_index = UtteranceLengthIndex(index_file)
+    assert length_index.lookup(x_file_name, y_file_name, 7, 3) == (120, 118)
+    length_index.save()
+    assert os.path.isfile(index_file)
+
+    length_index = UtteranceLengthIndex(index_file)
+    assert length_index.lookup(x_file_name, y_file_name, 7, 3) == (120, 118)
+    assert not length_index.changed
+
+    io_funcs.array_to_binary_file(numpy.zeros((90, 3)), y_file_name)
+    assert length_index.lookup(x_file_name, y_file_name, 7, 3) == (120, 90)
+    assert length_index.changed
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_length_index()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,121 @@
+"""Tests the numpy mel-cepstral post-filter against per-frame versions of the SPTK routines it replaces.
+"""
+
+import sys
+sys.path.append('../src')
+
+import numpy
+import pytest
+from utils.mcep_postfilter import freqt, c2acr_energy, mc2b, b2mc, post_filter_mgc
+
+
+def sptk_freqt(c1, m2, a):
+  """SPTK freqt, one frame at a time.
+  """
+  m1 = len(c1) - 1
+  b = 1 - a * a
+  g = numpy.zeros(m2 + 1)
+  d = numpy.zeros(m2 + 1)
+  for i in range(-m1, 1):
+    d[0] = g[0]
+    g[0] = c1[-i] + a * d[0]
+    d[1] = g[1]
+    g[1] = b * d[0] + a * d[1]
+    for j in range(2, m2 + 1):
+      d[j] = g[j]
+      g[j] = d[j - 1] + a * (d[j] - g[j - 1])
+  return g
+
+
+def sptk_c2acr_energy(c, flng):
+  """SPTK c2acr -M 0, one frame at a time.
+  """
+  x = numpy.zeros(flng)
+  x[:len(c)] = c
+  x = numpy.exp(2.0 * numpy.fft.fft(x).real)
+  return numpy.fft.fft(x).real[0] / flng
+
+
+def sptk_mc2b(mc, a):
+  b = numpy.zeros(len(mc))
+  b[-1] = mc[-1]
+  for m in range(len(mc) - 2, -1, -1):
+    b[m] = mc[m] - a * b[m + 1]
+  return b
+
+
+def sptk_b2mc(b, a):
+  mc = numpy.zeros(len(b))
+  d = mc[-1] = b[-1]
+  for m in range(len(b) - 2, -1, -1):
+    o = b[m] + a * d
+    d = b[m]
+    mc[m] = o
+  return mc
+
+
+def make_mgc(frame_number=4, mgc_dim=25):
+  rng = numpy.random.RandomState(0)
+  mgc = rng.normal(0.0, 0.2, size=(frame_number, mgc_dim))
+  mgc[:, 0] += 1.0
+  return mgc
+
+
+def test_sptk_routines():
+  """Tests freqt, c2acr, mc2b and b2mc on several frames at once.
+  """
+  mgc = make_mgc()
+  alpha = 0.42
+
+  cepstra = freqt(mgc, 255, -alpha)
+  energy = c2acr_energy(cepstra, 512)
+  b = mc2b(mgc, alpha)
+  for t in range(mgc.shape[0]):
+    reference_cepstrum = sptk_freqt(mgc[t], 255, -alpha)
+    assert numpy.allclose(cepstra[t], reference_cepstrum)
+    assert numpy.allclose(energy[t], sptk_c2acr_energy(reference_cepstrum, 512))
+    assert numpy.allclose(b[t], sptk_mc2b(mgc[t], alpha))
+  assert numpy.allclose(b2mc(b, alpha), mgc)
+
+
+def test_post_filter():
+  """Tests the post-filter against the SPTK command chain, step by step.
+  """
+  mgc = make_mgc()
+  (pf_coef, fw_coef, co_coef, fl_coef) = (1.4, 0.42, 255, 512)
+
+  enhanced = post_filter_mgc(mgc, pf_coef, fw_coef, co_coef, fl_coef)
+
+  weight = numpy.array([1.0, 1.0] + [pf_coef] * (mgc.shape[1] - 2))
+  for t in range(mgc.shape[0]):
+    r0 = sptk_c2acr_energy(sptk_freqt(mgc[t], co_coef, -fw_coef), fl_coef)
+    p_r0 = sptk_c2acr_energy(sptk_freqt(mgc[t] * weight, co_coef, -fw_coef), fl_coef)
+    b = sptk_mc2b(mgc[t] * weight, fw_coef)
+    b[0] = numpy.log(r0 / p_r0) / 2 + b[0]
+    assert numpy.allclose(enhanced[t], sptk_b2mc(b, fw_coef))
+
+  ## the post-filter keeps the energy of each frame
+  assert numpy.allclose(c2acr_energy(freqt(enhanced, co_coef, -fw_coef), fl_coef),
+                        c2acr_energy(freqt(mgc, co_coef, -fw_coef), fl_coef))
+
+
+def test_pysptk():
+  """Tests against the SPTK library itself, where pysptk is installed.
+  """
+  pysptk = pytest.importorskip('pysptk')
+
+  mgc = make_mgc()
+  for t in range(mgc.shape[0]):
+    assert numpy.allclose(freqt(mgc[t:t+1], 255, -0.42)[0], pysptk.freqt(mgc[t], 255, -0.42))
+    assert numpy.allclose(mc2b(mgc[t:t+1], 0.42)[0], pysptk.mc2b(mgc[t], 0.42))
+    assert numpy.allclose(b2mc(mgc[t:t+1], 0.42)[0], pysptk.b2mc(mgc[t], 0.42))
+
+
+def main():
+  test_sptk_routines()
+  test_post_filter()
+  test_pysptk()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,66 @@
+"""Tests the banded MLPG against a dense solution of the same system.
+"""
+
+import sys
+sys.path.append('../src')
+
+import numpy
+from frontend.mlpg_banded import MLParameterGenerationBanded
+
+
+def _dense_window_matrix(win_coeff, frame_number):
+  win_length = len(win_coeff) // 2
+  win_mat = numpy.zeros((frame_number, frame_number))
+  for t in range(frame_number):
+    for (j, coeff) in enumerate(win_coeff):
+      if 0 <= t + j - win_length < frame_number:
+        win_mat[t, t + j - win_length] = coeff
+  return win_mat
+
+
+def _dense_generation(features, covariance, static_dimension, windows, boundary_var):
+  frame_number = features.shape[0]
+  gen_parameter = numpy.zeros((frame_number, static_dimension))
+  win_mats = [_dense_window_matrix(win_coeff, frame_number) for win_coeff in windows]
+  for d in range(static_dimension):
+    prec = numpy.zeros((frame_number, frame_number))
+    b = numpy.zeros(frame_number)
+    for (win_index, win_mat) in enumerate(win_mats):
+      mu = features[:, win_index * static_dimension + d]
+      var = covariance[:, win_index * static_dimension + d].copy()
+      if win_index > 0:
+        var[0] = boundary_var
+        var[-1] = boundary_var
+      prec += numpy.dot(win_mat.T * (1.0 / var), win_mat)
+      b += numpy.dot(win_mat.T, mu / var)
+    gen_parameter[:, d] = numpy.linalg.solve(prec, b)
+  return gen_parameter
+
+
+def test_banded_generation():
+  """Tests several stream sizes, including a single frame and a non-default window.
+  """
+  rng = numpy.random.RandomState(1234)
+  for (frame_number, static_dimension, delta_win, acc_win) in [(1, 1, [-0.5, 0.0, 0.5], [1.0, -2.0, 1.0]),
+                                                              (2, 3, [-0.5, 0.0, 0.5], [1.0, -2.0, 1.0]),
+                                                              (157, 60, [-0.5, 0.0, 0.5], [1.0, -2.0, 1.0]),
+                                                              (40, 5, [-0.2, -0.1, 0.0, 0.1, 0.2], [0.5, 0.0, -1.0, 0.0, 0.5])]:
+    features = rng.randn(frame_number, 3 * static_dimension)
+    covariance = numpy.tile(rng.uniform(0.01, 1.0, (1, 3 * static_dimension)), (frame_number, 1))
+
+    mlpg_algo = MLParameterGenerationBanded(delta_win=delta_win, acc_win=acc_win)
+    gen_parameter = mlpg_algo.generation(features, covariance, static_dimension)
+
+    static_win = [0.0] * (len(delta_win) // 2) + [1.0] + [0.0] * (len(delta_win) // 2)
+    reference = _dense_generation(features, covariance, static_dimension,
+                                  [static_win, delta_win, acc_win], mlpg_algo.boundary_var)
+    assert gen_parameter.shape == (frame_number, static_dimension)
+    assert numpy.allclose(gen_parameter, reference, rtol=1e-6, atol=1e-8)
+
+
+def main():
+  test_banded_generation()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,134 @@
+"""Tests saving networks as weights files and loading them back, as theano networks and for numpy inference.
+"""
+
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+import pytest
+from models.model_io import save_model_weights, read_model_weights, load_model
+from models.numpy_inference import NumpyInferenceNetwork, load_numpy_model
+
+N_IN = 6
+N_OUT = 4
+
+
+class _StubParam(object):
+  def __init__(self, name, value):
+    self.name = name
+    self.value = value
+
+  def get_value(self, borrow=False):
+    return self.value
+
+
+class _StubFeedForwardModel(object):
+  """The parameters and architecture of a DeepRecurrentNetwork with two tanh layers, without theano.
+  """
+  def __init__(self, rng):
+    self.architecture = {'n_in': N_IN, 'hidden_layer_size': [8, 5], 'n_out': N_OUT, 'L1_reg': 0.0, 'L2_reg': 0.0,
+                         'hidden_layer_type': ['TANH', 'TANH']}
+    self.params = []
+    for (n_in, n_out) in [(N_IN, 8), (8, 5), (5, N_OUT)]:
+      self.params += [_StubParam('W', rng.normal(size=(n_in, n_out)).astype(numpy.float32)),
+                      _StubParam('b', rng.normal(size=n_out).astype(numpy.float32))]
+
+
+def _randomise(dnn_model, rng):
+  for param in dnn_model.params:
+    value = param.get_value()
+    param.set_value(rng.normal(0.0, 0.5, size=value.shape).astype(value.dtype))
+
+
+def test_numpy_weights_file():
+  """Tests that a weights file holds the parameters in order and gives the same network for numpy inference.
+  """
+  out_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(0)
+    dnn_model = _StubFeedForwardModel(rng)
+    file_name = os.path.join(out_dir, 'model.weights')
+    save_model_weights(dnn_model, file_name)
+
+    (architecture, weights) = read_model_weights(file_name)
+    assert architecture == {'class': '_StubFeedForwardModel', 'arguments': dnn_model.architecture}
+    assert [name for (name, value) in weights] == [param.name for param in dnn_model.params]
+    for ((name, value), param) in zip(weights, dnn_model.params):
+      assert numpy.array_equal(value, param.get_value())
+
+    architecture['class'] = 'DeepRecurrentNetwork'
+    x = rng.normal(size=(30, N_IN)).astype(numpy.float32)
+    expected = x
+    for (layer_index, activation) in enumerate([numpy.tanh, numpy.tanh, lambda y: y]):
+      expected = activation(expected.dot(weights[2 * layer_index][1]) + weights[2 * layer_index + 1][1])
+    assert numpy.allclose(NumpyInferenceNetwork(architecture, weights).parameter_prediction(x), expected, atol=1e-5)
+  finally:
+    shutil.rmtree(out_dir)
+
+
+def test_deep_rnn_round_trip():
+  """Tests that a DeepRecurrentNetwork loaded from its weights file, or from a pickle, predicts as the saved one.
+  """
+  pytest.importorskip('theano')
+  from models.deep_rnn import DeepRecurrentNetwork
+
+  out_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(1)
+    dnn_model = DeepRecurrentNetwork(n_in=N_IN, hidden_layer_size=[8, 8], n_out=N_OUT, L1_reg=0.0, L2_reg=0.0,
+                                     hidden_layer_type=['TANH', 'LSTM'], dropout_rate=0.1)
+    _randomise(dnn_model, rng)
+    x = rng.normal(size=(30, N_IN)).astype(numpy.float32)
+    expected = dnn_model.parameter_prediction(x)
+
+    weights_file_name = os.path.join(out_dir, 'model.weights')
+    save_model_weights(dnn_model, weights_file_name)
+    pickle_file_name = os.path.join(out_dir, 'model.pickle')
+    with open(pickle_file_name, 'wb') as fid:
+      pickle.dump(dnn_model, fid)
+
+    for file_name in [weights_file_name, pickle_file_name]:
+      loaded_model = load_model(file_name)
+      assert type(loaded_model) == DeepRecurrentNetwork
+      assert numpy.allclose(loaded_model.parameter_prediction(x), expected, atol=1e-6), file_name
+      assert numpy.allclose(load_numpy_model(file_name).parameter_prediction(x), expected, atol=1e-5), file_name
+  finally:
+    shutil.rmtree(out_dir)
+
+
+def test_dnn_round_trip():
+  """Tests that a DNN loaded from its weights file predicts as the saved one.
+  """
+  theano = pytest.importorskip('theano')
+  from models.dnn import DNN
+
+  out_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(2)
+    dnn_model = DNN(numpy.random.RandomState(123), n_ins=N_IN, n_outs=N_OUT, l1_reg=0.0, l2_reg=0.0, hidden_layers_sizes=[8, 8])
+    _randomise(dnn_model, rng)
+    x = rng.normal(size=(30, N_IN)).astype(theano.config.floatX)
+    expected = dnn_model.parameter_prediction(theano.shared(x, borrow=True))
+
+    file_name = os.path.join(out_dir, 'model.weights')
+    save_model_weights(dnn_model, file_name)
+    loaded_model = load_model(file_name)
+    assert type(loaded_model) == DNN
+    assert numpy.allclose(loaded_model.parameter_prediction(theano.shared(x, borrow=True)), expected, atol=1e-6)
+    assert numpy.allclose(load_numpy_model(file_name).parameter_prediction(x), expected, atol=1e-5)
+  finally:
+    shutil.rmtree(out_dir)
+
+
+def main():
+  test_numpy_weights_file()
+  test_deep_rnn_round_trip()
+  test_dnn_round_trip()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,135 @@
+"""Tests the numpy forward pass of trained networks.
+"""
+
+import sys
+sys.path.append('../src')
+
+import numpy
+import pytest
+from models.numpy_inference import NumpyInferenceNetwork, LSTM_PARAMS, GRU_PARAMS
+
+
+def sigmoid(x):
+  return 1.0 / (1.0 + numpy.exp(-x))
+
+
+def random_weights(rng, names, n_in, n_h):
+  """Random parameters, shaped by the naming of layers/gating.py.
+  """
+  weights = []
+  for name in names:
+    if name.startswith('W_x'):
+      shape = (n_in, n_h)
+    elif name.startswith('W_h'):
+      shape = (n_h, n_h)
+    else:
+      shape = (n_h,)
+    weights.append((name, rng.normal(0.0, 0.5, size=shape).astype(numpy.float32)))
+  return weights
+
+
+def reference_lstm(x, p, reverse=False):
+  """Step by step, as layers.gating.VanillaLstm.
+  """
+  n_h = p['W_hi'].shape[0]
+  h = numpy.zeros(n_h)
+  c = numpy.zeros(n_h)
+  output = numpy.zeros((x.shape[0], n_h))
+  steps = range(x.shape[0] - 1, -1, -1) if reverse else range(x.shape[0])
+  for t in steps:
+    i = sigmoid(x[t].dot(p['W_xi']) + h.dot(p['W_hi']) + p['w_ci'] * c + p['b_i'])
+    f = sigmoid(x[t].dot(p['W_xf']) + h.dot(p['W_hf']) + p['w_cf'] * c + p['b_f'])
+    c = f * c + i * numpy.tanh(x[t].dot(p['W_xc']) + h.dot(p['W_hc']) + p['b_c'])
+    o = sigmoid(x[t].dot(p['W_xo']) + h.dot(p['W_ho']) + p['w_co'] * c + p['b_o'])
+    h = o * numpy.tanh(c)
+    output[t] = h
+  return output
+
+
+def reference_gru(x, p):
+  """Step by step, as layers.gating.GatedRecurrentUnit.
+  """
+  h = numpy.zeros(p['W_hz'].shape[0])
+  output = []
+  for t in range(x.shape[0]):
+    z = sigmoid(x[t].dot(p['W_xz']) + h.dot(p['W_hz']) + p['b_z'])
+    r = sigmoid(x[t].dot(p['W_xr']) + h.dot(p['W_hr']) + p['b_r'])
+    can_h = numpy.tanh(x[t].dot(p['W_xh']) + r * h.dot(p['W_hh']) + p['b_h'])
+    h = (1 - z) * h + z * can_h
+    output.append(h)
+  return numpy.array(output)
+
+
+def test_recurrent_network():
+  """Tests a TANH, BLSTM and GRU network with dropout against a step by step computation.
+  """
+  rng = numpy.random.RandomState(1)
+  n_in, n_h, n_out, dropout_rate = 5, 4, 3, 0.2
+  tanh_weights = [('W', rng.normal(size=(n_in, n_h)).astype(numpy.float32)), ('b', rng.normal(size=n_h).astype(numpy.float32))]
+  forward_weights = random_weights(rng, LSTM_PARAMS['LSTM'], n_h, n_h)
+  backward_weights = random_weights(rng, LSTM_PARAMS['LSTM'], n_h, n_h)
+  gru_weights = random_weights(rng, GRU_PARAMS, 2 * n_h, n_h)
+  output_weights = [('W', rng.normal(size=(n_h, n_out)).astype(numpy.float32)), ('b', rng.normal(size=n_out).astype(numpy.float32))]
+
+  architecture = {'class': 'DeepRecurrentNetwork',
+                  'arguments': {'n_in': n_in, 'hidden_layer_size': [n_h, n_h, n_h], 'n_out': n_out, 'hidden_layer_type': ['TANH', 'BLSTM', 'GRU'],
+                                'output_type': 'LINEAR', 'dropout_rate': dropout_rate}}
+  network = NumpyInferenceNetwork(architecture, tanh_weights + forward_weights + backward_weights + gru_weights + output_weights)
+
+  x = rng.normal(size=(20, n_in)).astype(numpy.float32)
+  predicted = network.parameter_prediction(x)
+
+  ## dropout scales the input of each hidden layer by 1-p at test time
+  h = numpy.tanh((1 - dropout_rate) * x.dot(tanh_weights[0][1]) + tanh_weights[1][1])
+  h = numpy.concatenate([reference_lstm((1 - dropout_rate) * h, dict(forward_weights)),
+                         reference_lstm((1 - dropout_rate) * h, dict(backward_weights), reverse=True)], axis=1)
+  h = reference_gru((1 - dropout_rate) * h, dict(gru_weights))
+  expected = h.dot(output_weights[0][1]) + output_weights[1][1]
+
+  assert predicted.dtype == numpy.float32
+  assert predicted.shape == (20, n_out)
+  assert numpy.allclose(predicted, expected, atol=1e-5)
+
+
+def test_parameter_order():
+  """Tests that weights which do not match the architecture are refused.
+  """
+  rng = numpy.random.RandomState(2)
+  architecture = {'class': 'DeepRecurrentNetwork',
+                  'arguments': {'n_in': 3, 'hidden_layer_size': [4], 'n_out': 2, 'hidden_layer_type': ['LSTM']}}
+  weights = random_weights(rng, GRU_PARAMS, 3, 4) + [('W', numpy.zeros((4, 2), numpy.float32)), ('b', numpy.zeros(2, numpy.float32))]
+  try:
+    NumpyInferenceNetwork(architecture, weights)
+  except ValueError:
+    return
+  assert False, 'GRU weights were accepted for an LSTM layer'
+
+
+def test_theano_network():
+  """Tests the numpy forward pass against models.deep_rnn.DeepRecurrentNetwork, where theano is installed.
+  """
+  pytest.importorskip('theano')
+  from models.deep_rnn import DeepRecurrentNetwork
+
+  rng = numpy.random.RandomState(3)
+  for hidden_layer_type in (['TANH', 'SIGMOID'], ['RELU', 'LSTM'], ['BLSTM', 'GRU'], ['SLSTM', 'BSLSTM'], ['LSTM_NPH', 'SGRU']):
+    dnn_model = DeepRecurrentNetwork(n_in=6, hidden_layer_size=[8, 8], n_out=4, L1_reg=0.0, L2_reg=0.0,
+                                     hidden_layer_type=hidden_layer_type, dropout_rate=0.1)
+    for param in dnn_model.params:
+      value = param.get_value()
+      param.set_value(rng.normal(0.0, 0.5, size=value.shape).astype(value.dtype))
+
+    x = rng.normal(size=(30, 6)).astype(numpy.float32)
+    expected = dnn_model.parameter_prediction(x)
+    predicted = NumpyInferenceNetwork.from_model(dnn_model).parameter_prediction(x)
+    assert numpy.allclose(predicted, expected, atol=1e-5), hidden_layer_type
+
+
+def main():
+  test_recurrent_network()
+  test_parameter_order()
+  test_theano_network()
+
+
+if __name__ == '__main__':
+  main()
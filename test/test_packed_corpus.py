@@ -0,0 +1,51 @@
+"""Tests packing training data into a single file and reading it back.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from io_funcs.packed_corpus import PackedCorpus, pack_corpus
+
+
+def test_packed_corpus():
+  """Tests that every utterance of a packed corpus reads back as the files it was packed from.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    io_funcs = BinaryIOCollection()
+    rng = numpy.random.RandomState(1234)
+    in_file_list = []
+    out_file_list = []
+    for utt_name, in_frame_number, out_frame_number in [('utt1', 30, 29), ('utt2', 0, 0), ('utt3', 12, 12)]:
+      in_file_list.append(os.path.join(data_dir, utt_name + '.lab'))
+      out_file_list.append(os.path.join(data_dir, utt_name + '.cmp'))
+      io_funcs.array_to_binary_file(rng.randn(in_frame_number, 7), in_file_list[-1])
+      io_funcs.array_to_binary_file(rng.randn(out_frame_number, 3), out_file_list[-1])
+
+    corpus_file = os.path.join(data_dir, 'packed', 'train.pack')
+    pack_corpus(in_file_list, out_file_list, 7, 3, corpus_file)
+
+    corpus = PackedCorpus(corpus_file)
+    assert len(corpus) == 3
+    assert 'utt2' in corpus and 'utt4' not in corpus
+    assert corpus.get_frame_numbers('utt1') == (30, 29)
+    for in_file_name, out_file_name in zip(in_file_list, out_file_list):
+      in_features, out_features = corpus.load_utterance(PackedCorpus.utterance_name(in_file_name))
+      assert numpy.array_equal(in_features, io_funcs.load_binary_file(in_file_name, 7))
+      assert numpy.array_equal(out_features, io_funcs.load_binary_file(out_file_name, 3))
+      assert not in_features.flags.writeable
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_packed_corpus()
+
+
+if __name__ == '__main__':
+  main()
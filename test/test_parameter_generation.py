@@ -0,0 +1,119 @@
+"""Tests ParameterGeneration.acoustic_decomposition in-process and with a pool of processes.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.parameter_generation import ParameterGeneration
+
+OUT_DIMENSION_DICT = {'mgc': 6, 'lf0': 3, 'vuv': 1, 'bap': 3}
+FILE_EXTENSION_DICT = {'mgc': '.mgc', 'lf0': '.lf0', 'vuv': '.vuv', 'bap': '.bap'}
+CMP_DIM = sum(OUT_DIMENSION_DICT.values())
+
+
+class _Config(object):
+  def __init__(self, label_align_dir):
+    self.silence_pattern = ['*-sil+*', '*-pau+*']
+    self.in_label_align_dir = label_align_dir
+
+
+def _make_data(data_dir, file_number):
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+
+  var_file_dict = {}
+  for feature_name in ['mgc', 'lf0', 'bap']:
+    var_file_dict[feature_name] = os.path.join(data_dir, feature_name + '.var')
+    io_funcs.array_to_binary_file(rng.uniform(0.1, 1.0, OUT_DIMENSION_DICT[feature_name]), var_file_dict[feature_name])
+
+  label_align_dir = os.path.join(data_dir, 'label_state_align')
+  os.mkdir(label_align_dir)
+  file_list = []
+  for i in range(file_number):
+    frame_number = 50 + 17 * i
+    features = rng.randn(frame_number, CMP_DIM)
+    features[:, 6] += 4.5
+    features[:, 9] = rng.uniform(0.0, 1.0, frame_number)
+    file_list.append(os.path.join(data_dir, 'utt_%d.cmp' % i))
+    io_funcs.array_to_binary_file(features, file_list[-1])
+
+    ## a silence at each end (the last one running past the end of the features) and a pause inside
+    with open(os.path.join(label_align_dir, 'utt_%d.lab' % i), 'w') as fid:
+      boundaries = [0, 8, 20, 23, 40, frame_number + 5]
+      phones = ['sil', 'a', 'pau', 'b', 'sil']
+      for (phone, start, end) in zip(phones, boundaries[:-1], boundaries[1:]):
+        fid.write('%d %d x^x-%s+x=x\n' % (start * 50000 + 20000, end * 50000 + 20000, phone))
+
+  return file_list, var_file_dict, _Config(label_align_dir)
+
+
+def _read_outputs(file_list):
+  outputs = {}
+  for file_name in file_list:
+    for feature_name in ['mgc', 'lf0', 'bap']:
+      out_file_name = os.path.splitext(file_name)[0] + FILE_EXTENSION_DICT[feature_name]
+      outputs[out_file_name] = numpy.fromfile(out_file_name, dtype=numpy.float32)
+  return outputs
+
+
+def _reference_masking(generator, file_name, cfg):
+  """Applies the original per-frame vuv and silence masking to the un-smoothed streams.
+  """
+  io_funcs = BinaryIOCollection()
+  features, frame_number = io_funcs.load_binary_file_frame(file_name, CMP_DIM)
+  lf0 = features[:, 6:9].copy()
+  for i in range(frame_number):
+    if features[i, 9] < 0.5 or lf0[i, 0] < numpy.log(20):
+      lf0[i, 0] = generator.inf_float
+
+  mgc = features[:, 0:6].copy()
+  file_id = os.path.splitext(os.path.basename(file_name))[0]
+  for line in open(os.path.join(cfg.in_label_align_dir, file_id + '.lab')).readlines():
+    temp_list = line.split()
+    start_time = int(int(temp_list[0]) * (10 ** -4) / 5)
+    end_time = int(int(temp_list[1]) * (10 ** -4) / 5)
+    if generator.check_silence_pattern(temp_list[2], cfg.silence_pattern):
+      lf0[start_time:end_time, :] = generator.inf_float
+      mgc[start_time:end_time, :] = 0.0
+  return mgc, lf0
+
+
+def test_acoustic_decomposition():
+  """Tests that the pool gives the same files as in-process generation, and the masking against per-frame loops.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    file_list, var_file_dict, cfg = _make_data(data_dir, 5)
+
+    for do_MLPG in [False, True]:
+      outputs = {}
+      for num_workers in [1, 3]:
+        generator = ParameterGeneration(enforce_silence=True, num_workers=num_workers)
+        generator.acoustic_decomposition(file_list, CMP_DIM, OUT_DIMENSION_DICT, FILE_EXTENSION_DICT,
+                                         var_file_dict, do_MLPG=do_MLPG, cfg=cfg)
+        outputs[num_workers] = _read_outputs(file_list)
+
+      for out_file_name in outputs[1]:
+        assert numpy.array_equal(outputs[1][out_file_name], outputs[3][out_file_name]), out_file_name
+
+      if not do_MLPG:
+        for file_name in file_list:
+          mgc, lf0 = _reference_masking(generator, file_name, cfg)
+          base_name = os.path.splitext(file_name)[0]
+          assert numpy.array_equal(outputs[1][base_name + '.mgc'], mgc.astype(numpy.float32).flatten())
+          assert numpy.array_equal(outputs[1][base_name + '.lf0'], lf0.astype(numpy.float32).flatten())
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_acoustic_decomposition()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,296 @@
+"""Tests the loading of training data by ListDataProvider.
+"""
+
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from utils.providers import ListDataProvider, PrefetchingDataProvider
+
+N_INS = 3
+N_OUTS = 2
+
+
+def _make_corpus(data_dir, frame_numbers):
+  """Utterances whose first input feature identifies the frame: 1000 * utterance + frame.
+  """
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+  x_file_list = []
+  y_file_list = []
+  for (utt_index, frame_number) in enumerate(frame_numbers):
+    in_features = rng.normal(size=(frame_number, N_INS))
+    in_features[:, 0] = 1000 * utt_index + numpy.arange(frame_number)
+    x_file_list.append(os.path.join(data_dir, 'utt_%d.lab' % utt_index))
+    y_file_list.append(os.path.join(data_dir, 'utt_%d.cmp' % utt_index))
+    io_funcs.array_to_binary_file(in_features, x_file_list[-1])
+    io_funcs.array_to_binary_file(in_features[:, 0:N_OUTS] * 2, y_file_list[-1])
+  return x_file_list, y_file_list
+
+
+def _make_provider(x_file_list, y_file_list, buffer_size, **kwargs):
+  ## the provider shuffles the lists it is given, so give it copies
+  data_provider = ListDataProvider(list(x_file_list), list(y_file_list), n_ins=N_INS, n_outs=N_OUTS,
+                                   buffer_size=buffer_size, **kwargs)
+  data_provider.share_data = False
+  return data_provider
+
+
+def _read_epoch(data_provider):
+  """The frame identifiers of the partitions of one epoch, after which the provider is reset.
+  """
+  partitions = []
+  while not data_provider.is_finish():
+    _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+    assert numpy.array_equal(temp_set_x[:, 0:N_OUTS] * 2, temp_set_y)
+    partitions.append(numpy.array(temp_set_x[:, 0]))
+  data_provider.reset()
+  return partitions
+
+
+def test_pool_with_remaining_frames():
+  """Tests a shuffle pool which, with the rest of a long utterance, does not fit in the next block.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    x_file_list, y_file_list = _make_corpus(data_dir, [70, 70, 70, 70])
+    data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_pool_size=90)
+    frames = numpy.concatenate(_read_epoch(data_provider))
+    assert sorted(frames) == sorted(1000 * utt_index + frame for utt_index in range(4) for frame in range(70))
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_every_frame_once():
+  """Tests that every frame is seen exactly once in each epoch, with and without a shuffle pool.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    frame_numbers = [35, 120, 7, 64, 90, 41, 150, 12]
+    x_file_list, y_file_list = _make_corpus(data_dir, frame_numbers)
+    expected = sorted(1000 * utt_index + frame for (utt_index, frame_number) in enumerate(frame_numbers) for frame in range(frame_number))
+    for shuffle_pool_size in [0, 30, 99]:
+      data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_pool_size=shuffle_pool_size)
+      for epoch in range(3):
+        partitions = _read_epoch(data_provider)
+        assert sorted(numpy.concatenate(partitions)) == expected
+        assert all(len(partition) <= 100 for partition in partitions)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_shuffle_seed():
+  """Tests that the frames of each epoch are shuffled by a generator seeded with shuffle_seed + epoch.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    x_file_list, y_file_list = _make_corpus(data_dir, [35, 120, 7, 64, 90])
+    orders = {}
+    for shuffle_seed in [5, 6]:
+      data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_seed=shuffle_seed, shuffle_pool_size=20)
+      ## a partition loaded before training starts does not count as an epoch
+      data_provider.load_one_partition()
+      data_provider.reset(new_epoch=False)
+      assert data_provider.epoch == 0
+      orders[shuffle_seed] = [numpy.concatenate(_read_epoch(data_provider)) for epoch in range(2)]
+
+    data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_seed=5, shuffle_pool_size=20)
+    assert numpy.array_equal(numpy.concatenate(_read_epoch(data_provider)), orders[5][0])
+    assert not numpy.array_equal(orders[5][0], orders[5][1])
+    assert numpy.array_equal(orders[5][1], orders[6][0])
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_float32_partitions():
+  """Tests that the partitions are float32 and hold the values of the files, as the float64 buffers did.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    frame_numbers = [35, 120, 7, 64]
+    x_file_list, y_file_list = _make_corpus(data_dir, frame_numbers)
+    io_funcs = BinaryIOCollection()
+    in_features = numpy.concatenate([io_funcs.load_binary_file(file_name, N_INS) for file_name in x_file_list])
+    out_features = numpy.concatenate([io_funcs.load_binary_file(file_name, N_OUTS) for file_name in y_file_list])
+
+    data_provider = _make_provider(x_file_list, y_file_list, 100)
+    data_provider.shuffle_by_index = True
+    start = 0
+    while not data_provider.is_finish():
+      _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+      assert temp_set_x.dtype == numpy.float32 and temp_set_y.dtype == numpy.float32
+      end = start + temp_set_x.shape[0]
+      assert numpy.array_equal(temp_set_x.astype(numpy.float64), in_features[start:end].astype(numpy.float64))
+      assert numpy.array_equal(temp_set_y.astype(numpy.float64), out_features[start:end].astype(numpy.float64))
+      assert sorted(data_provider.shuffle_index) == list(range(temp_set_x.shape[0]))
+      start = end
+    assert start == sum(frame_numbers)
+
+    data_provider = _make_provider(x_file_list, y_file_list, 1000, sequential=True)
+    data_provider.set_rnn_params(training_algo=1, batch_size=2)
+    _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+    ## each utterance is padded with zeros to the longest one of the batch
+    assert temp_set_x.dtype == numpy.float32 and temp_set_x.shape == (2, 120, N_INS)
+    assert numpy.array_equal(temp_set_x[0, 0:35], in_features[0:35]) and not temp_set_x[0, 35:].any()
+    assert numpy.array_equal(temp_set_x[1], in_features[35:155])
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def _read_length_batches(data_provider):
+  """The utterances of each batch of one epoch, from the frame identifiers of the first frames.
+  """
+  batches = []
+  while not data_provider.is_finish():
+    _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+    assert temp_set_x.dtype == numpy.float32
+    batches.append(tuple(int(utt_id) // 1000 for utt_id in temp_set_x[:, 0, 0]))
+  data_provider.reset()
+  return batches
+
+
+def test_length_batches():
+  """Tests that the batches of similar length keep within the frame budget and are drawn again every epoch.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    frame_numbers = numpy.random.RandomState(1).randint(5, 60, size=40)
+    x_file_list, y_file_list = _make_corpus(data_dir, frame_numbers)
+    epochs = {}
+    for shuffle_seed in [5, 6]:
+      data_provider = _make_provider(x_file_list, y_file_list, 10000, sequential=True, shuffle_seed=shuffle_seed)
+      data_provider.set_rnn_params(training_algo=4, batch_size=4, batch_frames=200, length_chunk_batches=3)
+      epochs[shuffle_seed] = [_read_length_batches(data_provider) for epoch in range(2)]
+
+    for batches in epochs[5] + epochs[6]:
+      assert sorted(sum(batches, ())) == list(range(40))
+      for batch in batches:
+        assert len(batch) == 1 or len(batch) * max(frame_numbers[list(batch)]) <= 200
+
+    ## the members of the batches change, and not only their order
+    assert set(map(frozenset, epochs[5][0])) != set(map(frozenset, epochs[5][1]))
+    assert epochs[5][1] == epochs[6][0]
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def _read_epoch_partitions(data_provider):
+  """The input, output and shuffle index of each partition of one epoch, after which the provider is reset.
+  """
+  partitions = []
+  while not data_provider.is_finish():
+    _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+    partitions.append((numpy.array(temp_set_x), numpy.array(temp_set_y), numpy.array(data_provider.shuffle_index)))
+  data_provider.reset()
+  return partitions
+
+
+def test_prefetching():
+  """Tests that prefetching gives the partitions of the wrapped provider in the same order, whatever the queue depth.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    x_file_list, y_file_list = _make_corpus(data_dir, [35, 120, 7, 64, 90, 41, 150, 12, 80])
+    partition_bytes = 100 * (N_INS + N_OUTS) * 4
+    for shuffle_by_index in [False, True]:
+      data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_pool_size=30)
+      data_provider.shuffle_by_index = shuffle_by_index
+      expected = [_read_epoch_partitions(data_provider) for epoch in range(2)]
+      assert len(expected[0]) > 4
+
+      for (queue_depth, memory_budget, expected_depth) in [(1, 0, 1), (3, 0, 3), (8, 2.5 * partition_bytes / 1048576.0, 2),
+                                                           (8, 0.5 * partition_bytes / 1048576.0, 1)]:
+        data_provider = _make_provider(x_file_list, y_file_list, 100, shuffle_pool_size=30)
+        data_provider.shuffle_by_index = shuffle_by_index
+        data_provider = PrefetchingDataProvider(data_provider, queue_depth=queue_depth, memory_budget=memory_budget)
+        assert data_provider.queue_depth == expected_depth
+        epochs = [_read_epoch_partitions(data_provider) for epoch in range(2)]
+        data_provider.stop()
+
+        for (partitions, expected_partitions) in zip(epochs, expected):
+          assert len(partitions) == len(expected_partitions)
+          for (partition, expected_partition) in zip(partitions, expected_partitions):
+            for (value, expected_value) in zip(partition, expected_partition):
+              assert numpy.array_equal(value, expected_value), (queue_depth, memory_budget)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def _read_partitions(data_provider, partition_number=None):
+  """The frame identifiers of the next partitions, up to the end of the epoch.
+  """
+  partitions = []
+  while not data_provider.is_finish() and (partition_number is None or len(partitions) < partition_number):
+    _, temp_set_x, temp_set_y = data_provider.load_one_partition()
+    partitions.append(numpy.array(temp_set_x[..., 0]))
+  return partitions
+
+
+def test_resume():
+  """Tests that a provider restored from get_state reads the rest of the epoch, and the next one, as if it had not stopped.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    frame_numbers = numpy.random.RandomState(2).randint(5, 150, size=30)
+    x_file_list, y_file_list = _make_corpus(data_dir, frame_numbers)
+
+    def make_block_provider():
+      return _make_provider(x_file_list, y_file_list, 200, shuffle_seed=3, shuffle_pool_size=60)
+
+    def make_length_provider():
+      data_provider = _make_provider(x_file_list, y_file_list, 10000, sequential=True, shuffle_seed=3)
+      data_provider.set_rnn_params(training_algo=4, batch_size=3, batch_frames=300, length_chunk_batches=2)
+      return data_provider
+
+    for make_provider in [make_block_provider, make_length_provider]:
+      data_provider = make_provider()
+      expected = _read_partitions(data_provider)
+      data_provider.reset()
+      expected_next = _read_partitions(data_provider)
+      assert len(expected) > 4
+
+      for (prefetch_before, prefetch_after) in [(False, False), (True, True), (False, True), (True, False)]:
+        for partition_number in [1, 4]:
+          data_provider = make_provider()
+          if prefetch_before:
+            data_provider = PrefetchingDataProvider(data_provider)
+          partitions = _read_partitions(data_provider, partition_number)
+          ## as it is written in a checkpoint
+          state = pickle.loads(pickle.dumps(data_provider.get_state()))
+          if prefetch_before:
+            data_provider.stop()
+
+          data_provider = make_provider()
+          if prefetch_after:
+            data_provider = PrefetchingDataProvider(data_provider)
+          data_provider.set_state(state)
+          partitions += _read_partitions(data_provider)
+          data_provider.reset()
+          next_partitions = _read_partitions(data_provider)
+          if prefetch_after:
+            data_provider.stop()
+
+          for (partition, expected_partition) in zip(partitions + next_partitions, expected + expected_next):
+            assert numpy.array_equal(partition, expected_partition)
+          assert (len(partitions), len(next_partitions)) == (len(expected), len(expected_next))
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_pool_with_remaining_frames()
+  test_every_frame_once()
+  test_shuffle_seed()
+  test_float32_partitions()
+  test_length_batches()
+  test_prefetching()
+  test_resume()
+
+
+if __name__ == '__main__':
+  main()
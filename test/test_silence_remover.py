@@ -0,0 +1,178 @@
+"""Tests silence removal against the per-frame index lists it used to build.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append('../src')
+
+import numpy
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.silence_remover import SilenceRemover, trim_silence
+
+SILENCE_PATTERN = ['*-sil+*', '*-pau+*']
+
+
+def _write_state_alignment(file_name, phones, rng):
+  """Five states per phone, with times in 100ns units which are not all multiples of the frame shift.
+  """
+  durations = []
+  with open(file_name, 'w') as fid:
+    time = 0
+    for phone in phones:
+      for state in range(2, 7):
+        duration = rng.randint(1, 6) * 50000 + rng.randint(0, 3) * 10000
+        fid.write('%d %d x^x-%s+x=x[%d]\n' % (time, time + duration, phone, state))
+        durations.append(duration)
+        time += duration
+  return durations
+
+
+def _reference_indices(file_name, remove_frame_features, subphone_feats, dur_data=None):
+  """The index list built one frame at a time, as before.
+  """
+  remover = SilenceRemover(1, silence_pattern=SILENCE_PATTERN)
+  indices = []
+  base_frame_index = 0
+  for (ph_count, line) in enumerate(open(file_name).readlines()):
+    temp_list = line.split()
+    full_label = temp_list[2]
+    if dur_data is not None:
+      frame_number = int(dur_data[ph_count])
+    else:
+      frame_number = int((int(temp_list[1]) - int(temp_list[0])) / 50000)
+    silence = remover.check_silence_pattern(full_label)
+    if remove_frame_features:
+      if silence == 0:
+        for frame_index in range(frame_number):
+          indices.append(base_frame_index + frame_index)
+      base_frame_index += frame_number
+    elif subphone_feats == 'state_only' or (subphone_feats == 'none' and int(full_label[-2]) - 1 == 5):
+      if silence == 0:
+        indices.append(base_frame_index)
+      base_frame_index += 1
+  return indices
+
+
+def test_load_alignment():
+  """Tests the non-silence masks of state and phone alignments.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(0)
+    file_name = os.path.join(data_dir, 'utt.lab')
+    _write_state_alignment(file_name, ['sil', 'a', 'b', 'pau', 'c', 'sil'], rng)
+
+    for (remove_frame_features, subphone_feats) in [(True, 'none'), (False, 'state_only'), (False, 'none')]:
+      remover = SilenceRemover(1, silence_pattern=SILENCE_PATTERN, remove_frame_features=remove_frame_features, subphone_feats=subphone_feats)
+      nonsilence_mask = remover.load_alignment(file_name)
+      assert list(numpy.nonzero(nonsilence_mask)[0]) == _reference_indices(file_name, remove_frame_features, subphone_feats)
+
+    io_funcs = BinaryIOCollection()
+    dur_data = rng.randint(1, 10, size=30).astype(numpy.float32)
+    dur_file_name = os.path.join(data_dir, 'utt.dur')
+    io_funcs.array_to_binary_file(dur_data, dur_file_name)
+    remover = SilenceRemover(1, silence_pattern=SILENCE_PATTERN, label_type='phone_align')
+    for dur in [None, dur_file_name]:
+      nonsilence_mask = remover.load_phone_alignment(file_name, dur)
+      expected = _reference_indices(file_name, True, 'none', dur_data if dur else None)
+      assert list(numpy.nonzero(nonsilence_mask)[0]) == expected
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_remove_silence():
+  """Tests that the non-silent frames are kept, when the labels are longer or shorter than the data.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(1)
+    io_funcs = BinaryIOCollection()
+    align_file_name = os.path.join(data_dir, 'utt.lab')
+    _write_state_alignment(align_file_name, ['sil', 'a', 'pau', 'b', 'sil'], rng)
+    indices = _reference_indices(align_file_name, True, 'none')
+    label_frame_number = sum(int((int(line.split()[1]) - int(line.split()[0])) / 50000) for line in open(align_file_name))
+
+    remover = SilenceRemover(3, silence_pattern=SILENCE_PATTERN)
+    for frame_number in [label_frame_number - 4, label_frame_number + 2]:
+      data = rng.normal(size=(frame_number, 3)).astype(numpy.float32)
+      in_file_name = os.path.join(data_dir, 'utt.cmp')
+      out_file_name = os.path.join(data_dir, 'utt.nosil.cmp')
+      io_funcs.array_to_binary_file(data, in_file_name)
+      remover.remove_silence([in_file_name], [align_file_name], [out_file_name])
+
+      expected = data[[ix for ix in indices if ix < frame_number], ]
+      assert numpy.array_equal(io_funcs.load_binary_file(out_file_name, 3), expected)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_remove_silence_pool():
+  """Tests that a pool of processes gives the same files as threads, and that a failed file does not stop the others.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(3)
+    io_funcs = BinaryIOCollection()
+    (in_list, align_list) = ([], [])
+    for i in range(7):
+      align_list.append(os.path.join(data_dir, 'utt_%d.lab' % i))
+      _write_state_alignment(align_list[-1], ['sil', 'a', 'pau', 'b', 'sil'], rng)
+      in_list.append(os.path.join(data_dir, 'utt_%d.cmp' % i))
+      io_funcs.array_to_binary_file(rng.normal(size=(200, 3)), in_list[-1])
+
+    outputs = {}
+    for num_workers in [1, 3]:
+      out_list = [os.path.join(data_dir, 'utt_%d.%d.cmp' % (i, num_workers)) for i in range(7)]
+      SilenceRemover(3, silence_pattern=SILENCE_PATTERN, num_workers=num_workers).remove_silence(in_list, align_list, out_list)
+      outputs[num_workers] = [numpy.fromfile(out_file_name, dtype=numpy.float32) for out_file_name in out_list]
+    for (thread_output, process_output) in zip(outputs[1], outputs[3]):
+      assert numpy.array_equal(thread_output, process_output)
+
+    align_list[2] = os.path.join(data_dir, 'missing.lab')
+    out_list = [os.path.join(data_dir, 'utt_%d.failed.cmp' % i) for i in range(7)]
+    try:
+      SilenceRemover(3, silence_pattern=SILENCE_PATTERN, num_workers=3).remove_silence(in_list, align_list, out_list)
+    except OSError:
+      assert [os.path.isfile(out_file_name) for out_file_name in out_list] == [True, True, False, True, True, True, True]
+      return
+    assert False, 'the missing alignment was not reported'
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def test_trim_silence():
+  """Tests trimming by the silence feature of binary labels.
+  """
+  data_dir = tempfile.mkdtemp()
+  try:
+    rng = numpy.random.RandomState(2)
+    io_funcs = BinaryIOCollection()
+    label = rng.normal(size=(40, 4)).astype(numpy.float32)
+    label[:, 2] = (rng.uniform(size=40) < 0.3)
+    data = rng.normal(size=(40, 3)).astype(numpy.float32)
+    (label_file, in_file, out_file) = [os.path.join(data_dir, name) for name in ['utt.lab', 'utt.cmp', 'utt.trim.cmp']]
+    io_funcs.array_to_binary_file(label, label_file)
+    io_funcs.array_to_binary_file(data, in_file)
+
+    trim_silence([in_file], [out_file], 3, [label_file], 4, 2)
+    assert numpy.array_equal(io_funcs.load_binary_file(out_file, 3), data[label[:, 2] == 0])
+
+    trim_silence([in_file], [out_file], 3, [label_file], 4, 2, percent_to_keep=50)
+    silence_indices = numpy.nonzero(label[:, 2] == 1)[0]
+    expected = numpy.vstack([data[label[:, 2] == 0], data[silence_indices[::2]]])
+    assert numpy.array_equal(io_funcs.load_binary_file(out_file, 3), expected)
+  finally:
+    shutil.rmtree(data_dir)
+
+
+def main():
+  test_load_alignment()
+  test_remove_silence()
+  test_remove_silence_pool()
+  test_trim_silence()
+
+
+if __name__ == '__main__':
+  main()